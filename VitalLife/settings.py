@@ -97,6 +97,23 @@ DATABASES = {
 }
 
 
+# Cache
+# https://docs.djangoproject.com/en/4.2/topics/cache/
+# Guarda los sellos de versión de las respuestas condicionales y los fragmentos
+# de los paneles. Los avanzan también procesos distintos del servidor web (el
+# trabajador de procesar_tareas y los comandos de cron), así que el backend debe
+# ser compartido, y en memoria: un 304 o un panel en caché no deben consultar
+# la base. Redis (paquete `redis`) también da el INCR atómico que usa
+# paneladmin.versiones.incrementar.
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': 'redis://127.0.0.1:6379/1',
+    }
+}
+
+
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
 
@@ -137,9 +154,55 @@ STATICFILES_DIRS = [STATIC_DIR]
 MEDIA_URL = '/media/'
 MEDIA_ROOT = MEDIA_DIR
 
+# Entrega de archivos privados (antecedentes y recetas), ver paneladmin.media_protegida.
+# 'python' sirve para desarrollo; en producción conviene delegar al servidor web:
+# - 'nginx' con una location interna, por ejemplo:
+#       location /media-protegida/ { internal; alias /ruta/a/media/; }
+#   y bloqueando el acceso directo a /media/antecedentes/ y /media/recetas/.
+# - 'apache' con mod_xsendfile habilitado (XSendFile On; XSendFilePath /ruta/a/media).
+VITALLIFE_ENVIO_ARCHIVOS = 'python'
+VITALLIFE_RUTA_INTERNA_MEDIA = '/media-protegida/'
+
+# Los archivos de las vistas marcadas con @acepta_subidas se validan (tamaño por
+# campo y firma del formato) mientras se suben, ver paneladmin.subidas. En esas
+# vistas, las peticiones más grandes que el límite se rechazan sin leer el
+# cuerpo; conviene fijar el mismo tope en el servidor web para esas rutas
+# (client_max_body_size en nginx), no para todo el sitio: la importación de
+# usuarios recibe CSV más grandes.
+FILE_UPLOAD_HANDLERS = [
+    'paneladmin.subidas.SubidaValidadaHandler',
+    'django.core.files.uploadhandler.MemoryFileUploadHandler',
+    'django.core.files.uploadhandler.TemporaryFileUploadHandler',
+]
+VITALLIFE_LIMITE_PETICION_SUBIDA = 12 * 1024 * 1024
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/4.2/ref/settings/#default-auto-field
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 AUTH_USER_MODEL = 'usuario.Usuario'
+
+
+# Eventos en tiempo real (Server-Sent Events) para la disponibilidad de horarios.
+# El broker en memoria sirve para un solo proceso ASGI; con varios procesos se
+# debe apuntar a una implementación sobre un pub/sub compartido.
+VITALLIFE_BROKER_EVENTOS = 'paneladmin.eventos.BrokerEnMemoria'
+
+# Correo saliente. Las notificaciones pasan por la bandeja de salida
+# (paneladmin.notificaciones) y se envían desde la cola de tareas.
+# En desarrollo se puede usar 'django.core.mail.backends.filebased.EmailBackend'
+# (con EMAIL_FILE_PATH) y en producción 'django.core.mail.backends.smtp.EmailBackend'.
+EMAIL_BACKEND = 'django.core.mail.backends.console.EmailBackend'
+DEFAULT_FROM_EMAIL = 'VitalLife <no-responder@vitallife.cl>'
+VITALLIFE_TRANSPORTE_NOTIFICACIONES = 'paneladmin.notificaciones.TransporteCorreo'
+
+# Las citas cerradas más antiguas que este horizonte se mueven a las tablas de
+# archivo (`python manage.py archivar_citas`, ver paneladmin.archivo_citas).
+VITALLIFE_HORIZONTE_ARCHIVO_DIAS = 365
+
+# Importación masiva de usuarios desde CSV (paneladmin.importacion_usuarios).
+# Los archivos subidos desde el panel se guardan fuera de MEDIA_ROOT porque
+# contienen datos personales. None usa todos los núcleos para cifrar contraseñas.
+VITALLIFE_DIRECTORIO_IMPORTACIONES = BASE_DIR / 'importaciones'
+VITALLIFE_PROCESOS_IMPORTACION = None
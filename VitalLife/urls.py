@@ -1,4 +1,6 @@
-from django.urls import path, include
+import re
+
+from django.urls import path, include, re_path
 from django.contrib import admin
 from django.contrib.auth import views as auth_views
 from django.conf import settings
@@ -7,6 +9,7 @@ from django.conf.urls.static import static
 # Importamos las vistas desde la app 'usuario'
 from usuario import views as usuario_views
 from paneladmin import views as paneladmin_views
+from paneladmin import media_protegida
 
 urlpatterns = [
     path('admin/', admin.site.urls),
@@ -17,6 +20,19 @@ urlpatterns = [
 
     path('logout/', auth_views.LogoutView.as_view(next_page='inicio'), name='logout'),
     path('panel-admin/', include('paneladmin.urls')),
+    # API JSON versionada para la aplicación móvil.
+    path('api/v1/', include('usuario.api_urls')),
+    # Miniaturas generadas bajo demanda la primera vez que se solicitan.
+    path('miniaturas/<str:tamano>/<str:formato>/<path:nombre>', paneladmin_views.miniatura_view, name='miniatura'),
+    # Antecedentes y recetas: siempre pasan por el control de acceso, también en
+    # producción (debe declararse antes que la ruta de MEDIA_URL de desarrollo).
+    re_path(
+        r'^%s(?P<nombre>(?:%s)/.+)$' % (
+            re.escape(settings.MEDIA_URL.lstrip('/')), '|'.join(media_protegida.CARPETAS_PROTEGIDAS)
+        ),
+        paneladmin_views.media_protegida_view,
+        name='media_protegida',
+    ),
 ]
 
 if settings.DEBUG:
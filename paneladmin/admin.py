@@ -1,5 +1,41 @@
 from django.contrib import admin
-from .models import Especialidad
+from .models import EliminacionUsuario, Especialidad, Notificacion, RevisionFichaMedica, Tarea
 
 # Register your models here.
 admin.site.register(Especialidad)
+
+
+@admin.register(Tarea)
+class TareaAdmin(admin.ModelAdmin):
+    list_display = ('nombre', 'estado', 'prioridad', 'intentos', 'ejecutar_desde', 'fecha_fin')
+    list_filter = ('estado', 'nombre')
+    readonly_fields = ('fecha_creacion', 'fecha_inicio', 'fecha_fin', 'trabajador', 'ultimo_error')
+
+
+@admin.register(Notificacion)
+class NotificacionAdmin(admin.ModelAdmin):
+    list_display = ('asunto', 'destinatario', 'estado', 'intentos', 'fecha_creacion', 'enviada_en')
+    list_filter = ('estado',)
+    search_fields = ('destinatario', 'clave')
+    readonly_fields = ('clave', 'fecha_creacion', 'reclamada_en', 'enviada_en', 'ultimo_error')
+
+
+@admin.register(EliminacionUsuario)
+class EliminacionUsuarioAdmin(admin.ModelAdmin):
+    list_display = ('descripcion', 'estado', 'etapa', 'filas_eliminadas', 'fecha_solicitud', 'fecha_fin')
+    list_filter = ('estado',)
+    readonly_fields = ('usuario', 'descripcion', 'solicitada_por', 'estado', 'etapa', 'filas_eliminadas', 'fecha_solicitud', 'fecha_fin')
+
+
+
+@admin.register(RevisionFichaMedica)
+class RevisionFichaMedicaAdmin(admin.ModelAdmin):
+    # El historial es de solo inserción: se consulta, no se edita.
+    list_display = ('ficha', 'numero', 'fecha', 'autor')
+    readonly_fields = ('ficha', 'numero', 'fecha', 'autor', 'cambios', 'instantanea')
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
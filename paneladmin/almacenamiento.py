@@ -0,0 +1,183 @@
+"""
+Almacenamiento de archivos subidos con deduplicación por contenido.
+
+Cada archivo se guarda una sola vez en `<carpeta>/<aa>/<sha256><ext>`, donde
+<carpeta> es el primer segmento del upload_to del campo (fotos_perfil,
+antecedentes, especialidades, recetas). Así las carpetas privadas nunca
+comparten archivos con las públicas.
+
+El hash se calcula mientras el archivo se copia a una carpeta temporal dentro de
+MEDIA_ROOT, y luego se mueve (rename) a su ruta final; si el contenido ya
+existía, la copia temporal se descarta. La tabla ArchivoMedia lleva la cuenta
+de referencias: las señales la bajan cuando una fila se elimina o reemplaza su
+archivo, y el archivo se borra al quedar sin referencias.
+
+Comandos relacionados:
+- `manage.py deduplicar_media`: migra los archivos existentes a este esquema.
+- `manage.py recolectar_media`: recalcula referencias y borra huérfanos.
+"""
+import hashlib
+import os
+import re
+import uuid
+from collections import Counter
+
+from django.apps import apps
+from django.core.files.storage import FileSystemStorage
+from django.db import transaction
+from django.db.models import F
+from django.utils.deconstruct import deconstructible
+
+# Carpeta temporal (dentro de MEDIA_ROOT, para que el rename no copie datos).
+CARPETA_TEMPORAL = '.subidas'
+
+TAMANO_BLOQUE = 64 * 1024
+
+PATRON_NOMBRE = re.compile(r'^[^/]+/[0-9a-f]{2}/[0-9a-f]{64}(\.[a-z0-9]+)?$')
+
+# Campos que usan este almacenamiento (modelo -> campos de archivo).
+CAMPOS_DEDUPLICADOS = {
+    'usuario.Usuario': ('foto_perfil', 'antecedentes_medicos'),
+    'paneladmin.Especialidad': ('imagen',),
+    'paneladmin.Receta': ('archivo',),
+    'paneladmin.RecetaArchivada': ('archivo',),
+}
+
+
+def modelos_deduplicados():
+    """Pares (modelo, campos) de CAMPOS_DEDUPLICADOS."""
+    return [(apps.get_model(etiqueta), campos) for etiqueta, campos in CAMPOS_DEDUPLICADOS.items()]
+
+
+def carpetas_deduplicadas():
+    """Primer segmento del upload_to de cada campo (p. ej. 'recetas')."""
+    return sorted({
+        modelo._meta.get_field(campo).upload_to.split('/', 1)[0]
+        for modelo, campos in modelos_deduplicados()
+        for campo in campos
+    })
+
+
+def contar_referencias():
+    """Cuántas filas apuntan a cada archivo, según los datos actuales."""
+    referencias = Counter()
+    for modelo, campos in modelos_deduplicados():
+        for campo in campos:
+            nombres = modelo.objects.exclude(**{campo: ''}).exclude(**{f'{campo}__isnull': True})
+            referencias.update(nombres.values_list(campo, flat=True).iterator())
+    return referencias
+
+
+def hash_archivo(ruta):
+    digest = hashlib.sha256()
+    with open(ruta, 'rb') as archivo:
+        for bloque in iter(lambda: archivo.read(TAMANO_BLOQUE), b''):
+            digest.update(bloque)
+    return digest.hexdigest()
+
+
+def nombre_direccionado(nombre_original, sha256):
+    """Ruta final para un contenido, conservando la carpeta y la extensión originales."""
+    carpeta = nombre_original.replace('\\', '/').split('/', 1)[0]
+    extension = os.path.splitext(nombre_original)[1].lower()
+    return f'{carpeta}/{sha256[:2]}/{sha256}{extension}'
+
+
+def es_nombre_direccionado(nombre):
+    return bool(nombre) and PATRON_NOMBRE.match(nombre) is not None
+
+
+@deconstructible
+class AlmacenamientoDeduplicado(FileSystemStorage):
+
+    def get_available_name(self, name, max_length=None):
+        # La ruta la decide _save según el contenido; nunca agregamos sufijos '_xxxx'.
+        return name
+
+    def _volcar(self, content):
+        """Copia el contenido a un temporal calculando su hash en la misma pasada."""
+        carpeta_temporal = self.path(CARPETA_TEMPORAL)
+        os.makedirs(carpeta_temporal, exist_ok=True)
+        ruta_temporal = os.path.join(carpeta_temporal, uuid.uuid4().hex)
+
+        digest = hashlib.sha256()
+        tamano = 0
+        if hasattr(content, 'seek'):
+            content.seek(0)
+        with open(ruta_temporal, 'wb') as destino:
+            for bloque in content.chunks(TAMANO_BLOQUE):
+                if isinstance(bloque, str):
+                    bloque = bloque.encode()
+                digest.update(bloque)
+                destino.write(bloque)
+                tamano += len(bloque)
+        return ruta_temporal, digest.hexdigest(), tamano
+
+    def _save(self, name, content):
+        if getattr(content, 'sha256', None) and hasattr(content, 'temporary_file_path'):
+            # Ya viene escrito en CARPETA_TEMPORAL y hasheado (paneladmin.subidas).
+            content.file.close()
+            return self.guardar_temporal(name, content.temporary_file_path(), content.sha256, content.size)
+        ruta_temporal, sha256, tamano = self._volcar(content)
+        try:
+            return self.guardar_temporal(name, ruta_temporal, sha256, tamano)
+        finally:
+            if os.path.exists(ruta_temporal):
+                os.remove(ruta_temporal)
+
+    def guardar_temporal(self, name, ruta_temporal, sha256, tamano):
+        """
+        Mueve un archivo ya hasheado a su ruta direccionada (o lo descarta si el
+        contenido ya existe) y suma una referencia.
+        """
+        from .models import ArchivoMedia
+
+        nombre = nombre_direccionado(name, sha256)
+        ruta_final = self.path(nombre)
+        with transaction.atomic():
+            archivo, _ = ArchivoMedia.objects.select_for_update().get_or_create(
+                nombre=nombre, defaults={'sha256': sha256, 'tamano': tamano}
+            )
+            if not os.path.exists(ruta_final):
+                os.makedirs(os.path.dirname(ruta_final), exist_ok=True)
+                os.replace(ruta_temporal, ruta_final)
+                if self.file_permissions_mode is not None:
+                    os.chmod(ruta_final, self.file_permissions_mode)
+            ArchivoMedia.objects.filter(pk=archivo.pk).update(referencias=F('referencias') + 1)
+        return nombre
+
+    def liberar(self, name, cantidad=1):
+        """
+        Resta `cantidad` referencias. El archivo se borra recién cuando nadie lo
+        usa. Los archivos antiguos (sin registro en ArchivoMedia) se dejan al
+        recolector, porque no sabemos cuántas filas los comparten.
+        """
+        from .models import ArchivoMedia
+
+        if not name:
+            return
+        with transaction.atomic():
+            archivo = ArchivoMedia.objects.select_for_update().filter(nombre=name).first()
+            if archivo is None:
+                return
+            if archivo.referencias > cantidad:
+                ArchivoMedia.objects.filter(pk=archivo.pk).update(referencias=F('referencias') - cantidad)
+                return
+            archivo.delete()
+        transaction.on_commit(lambda: self._borrar_archivo(name))
+
+    def _borrar_archivo(self, name):
+        from . import miniaturas
+        from .models import ArchivoMedia
+
+        # Si entretanto alguien volvió a subir el mismo contenido, el archivo se conserva.
+        if ArchivoMedia.objects.filter(nombre=name).exists():
+            return
+        super().delete(name)
+        miniaturas.eliminar_derivados(name)
+
+    def delete(self, name):
+        self.liberar(name)
+
+
+almacenamiento_deduplicado = AlmacenamientoDeduplicado()
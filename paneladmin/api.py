@@ -0,0 +1,155 @@
+"""
+Serializadores compactos de la API JSON v1 para la aplicación móvil (las vistas
+están en usuario.views, bajo /api/v1/).
+
+Cada recurso se describe con un diccionario campo público -> Campo: las
+columnas que hay que leer de la base y cómo armar el valor a partir de la fila
+(un diccionario de .values() o un registro del catálogo en caché). Con
+?campos=id,fecha_hora el cliente recibe solo esos campos y las consultas leen
+solo esas columnas; sin el parámetro recibe todos.
+"""
+from operator import attrgetter, itemgetter
+from typing import Callable, NamedTuple
+
+from django.utils import timezone
+
+from . import archivo_citas
+from .almacenamiento import almacenamiento_deduplicado
+
+TAMANO_PAGINA = archivo_citas.TAMANO_PAGINA
+
+TAMANO_MAXIMO = 100
+
+
+class Campo(NamedTuple):
+    columnas: tuple
+    valor: Callable
+
+
+def _columna(nombre):
+    return Campo((nombre,), itemgetter(nombre))
+
+
+def _fecha(nombre):
+    return Campo((nombre,), lambda fila: timezone.localtime(fila[nombre]).isoformat())
+
+
+def _nombre_completo(prefijo):
+    nombre, apellido = f'{prefijo}__nombre', f'{prefijo}__apellido'
+    return Campo((nombre, apellido), lambda fila: f"{fila[nombre]} {fila[apellido]}")
+
+
+def _archivo(fila):
+    return almacenamiento_deduplicado.url(fila['archivo']) if fila['archivo'] else None
+
+
+# Registros del catálogo (catalogo.EspecialidadResumen / MedicoResumen): ya están en memoria.
+ESPECIALIDAD = {
+    'id': Campo((), attrgetter('id')),
+    'nombre': Campo((), attrgetter('nombre')),
+    'descripcion': Campo((), attrgetter('descripcion')),
+    'imagen': Campo((), lambda especialidad: especialidad.imagen_url or None),
+}
+
+MEDICO = {
+    'id': Campo((), attrgetter('id')),
+    'nombre': Campo((), attrgetter('nombre')),
+    'apellido': Campo((), attrgetter('apellido')),
+    'foto': Campo((), lambda medico: medico.foto_url or None),
+}
+
+# Horarios libres tal como los arma usuario.views._calcular_horarios_disponibles.
+HORARIO = {
+    'medico_id': Campo((), lambda horario: horario['medico'].id),
+    'medico_nombre': Campo((), lambda horario: horario['medico'].get_full_name()),
+    'fecha_hora': Campo((), lambda horario: timezone.localtime(horario['fecha_hora']).isoformat()),
+}
+
+# Citas, diagnósticos y recetas: filas de .values() de las tablas activas o de archivo.
+CITA = {
+    'id': _columna('id'),
+    'fecha_hora': _fecha('fecha_hora'),
+    'estado': _columna('estado'),
+    'motivo': _columna('motivo'),
+    'medico_id': _columna('medico_id'),
+    'medico': _nombre_completo('medico'),
+    'especialidad_id': _columna('especialidad_id'),
+    'especialidad': Campo(('especialidad__nombre',), itemgetter('especialidad__nombre')),
+}
+
+DIAGNOSTICO = {
+    'titulo': _columna('titulo'),
+    'descripcion': _columna('descripcion'),
+    'fecha_creacion': _fecha('fecha_creacion'),
+}
+
+RECETA = {
+    'id': _columna('id'),
+    'titulo': _columna('titulo'),
+    'indicaciones': _columna('indicaciones'),
+    'archivo': Campo(('archivo',), _archivo),
+    'fecha_creacion': _fecha('fecha_creacion'),
+}
+
+# El detalle de una cita puede incluir su diagnóstico y sus recetas (una consulta cada uno).
+DETALLE_CITA = {**CITA, 'diagnostico': Campo((), None), 'recetas': Campo((), None)}
+
+
+def elegir_campos(texto, serializador):
+    """Campos pedidos en ?campos=a,b (todos si no vienen). ValueError si alguno no existe."""
+    if not texto:
+        return list(serializador)
+    campos = list(dict.fromkeys(campo.strip() for campo in texto.split(',') if campo.strip()))
+    desconocidos = [campo for campo in campos if campo not in serializador]
+    if desconocidos:
+        raise ValueError(f"Campos desconocidos: {', '.join(desconocidos)}.")
+    return campos
+
+
+def elegir_tamano(texto):
+    """Tamaño de página pedido en ?tamano=, acotado a TAMANO_MAXIMO. ValueError si no es un número."""
+    if not texto:
+        return TAMANO_PAGINA
+    if not texto.isdigit():
+        raise ValueError("El tamaño de página debe ser un número.")
+    return min(max(int(texto), 1), TAMANO_MAXIMO)
+
+
+def columnas(serializador, campos):
+    return list(dict.fromkeys(columna for campo in campos for columna in serializador[campo].columnas))
+
+
+def serializar(filas, serializador, campos):
+    return [{campo: serializador[campo].valor(fila) for campo in campos} for fila in filas]
+
+
+def pagina_citas(paciente, campos, cursor=None, tamano=TAMANO_PAGINA):
+    """Una página del historial del paciente, ya serializada. Devuelve (citas, cursor siguiente o None)."""
+    citas, siguiente = archivo_citas.pagina_historial(
+        cursor, tamano, valores=columnas(CITA, campos), paciente=paciente,
+    )
+    return serializar(citas, CITA, campos), siguiente
+
+
+def detalle_cita(paciente, cita_id, campos):
+    """La cita del paciente (activa o archivada) con los campos pedidos, o None si no es suya."""
+    from .models import Cita, Diagnostico, Receta, CitaArchivada, DiagnosticoArchivado, RecetaArchivada
+
+    campos_cita = [campo for campo in campos if campo in CITA]
+    for modelo, modelo_diagnostico, modelo_receta in (
+        (Cita, Diagnostico, Receta), (CitaArchivada, DiagnosticoArchivado, RecetaArchivada),
+    ):
+        fila = modelo.objects.filter(id=cita_id, paciente=paciente).values(*columnas(CITA, campos_cita) or ['id']).first()
+        if fila is not None:
+            break
+    else:
+        return None
+
+    datos = serializar([fila], CITA, campos_cita)[0]
+    if 'diagnostico' in campos:
+        diagnostico = modelo_diagnostico.objects.filter(cita_id=cita_id).values(*columnas(DIAGNOSTICO, DIAGNOSTICO)).first()
+        datos['diagnostico'] = serializar([diagnostico], DIAGNOSTICO, DIAGNOSTICO)[0] if diagnostico else None
+    if 'recetas' in campos:
+        recetas = modelo_receta.objects.filter(cita_id=cita_id).order_by('fecha_creacion', 'id').values(*columnas(RECETA, RECETA))
+        datos['recetas'] = serializar(recetas, RECETA, RECETA)
+    return datos
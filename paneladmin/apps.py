@@ -1,6 +1,13 @@
 from django.apps import AppConfig
+from django.utils.module_loading import autodiscover_modules
 
 
 class PaneladminConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'paneladmin'
+
+    def ready(self):
+        # Registra los receptores de señales (eventos de horarios, etc.)
+        from . import signals  # noqa: F401
+        # Registra las tareas de la cola en segundo plano (módulos <app>/tareas.py).
+        autodiscover_modules('tareas')
@@ -0,0 +1,191 @@
+"""
+Archivo del historial de citas: separa las citas viejas de las activas.
+
+Las citas cerradas (COMPLETADA, CANCELADA o NO_ASISTIO) anteriores al horizonte
+(VITALLIFE_HORIZONTE_ARCHIVO_DIAS) se mueven, con su diagnóstico y sus recetas,
+a CitaArchivada, DiagnosticoArchivado y RecetaArchivada. Así la tabla de citas
+solo guarda lo reciente y lo agendado, y las consultas de agenda, disponibilidad
+y panel no crecen con los años de historial.
+
+- `python manage.py archivar_citas` (pensado para cron, p. ej. una vez por noche).
+- Cada lote se mueve en su propia transacción: la cita está en una tabla o en la
+  otra, nunca en ambas ni en ninguna. Se puede cortar y volver a ejecutar.
+- Los borrados no pasan por las señales: son citas pasadas (no liberan horarios
+  ni cambian sellos de disponibilidad) y los archivos de las recetas siguen en uso
+  por RecetaArchivada, por lo que su conteo de referencias no cambia.
+
+Las vistas de historial leen ambas tablas con pagina_historial() y obtener_cita().
+"""
+from datetime import datetime, timedelta, timezone as dt_timezone
+from itertools import chain
+from operator import attrgetter, itemgetter
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .cola import encolar
+
+TAMANO_LOTE = 500
+
+TAMANO_PAGINA = 20
+
+EPOCA = datetime(1970, 1, 1, tzinfo=dt_timezone.utc)
+
+# Por debajo de esto se archivarían citas que aún se editan o que cuentan en los
+# reportes de ocupación (últimos 30 días).
+HORIZONTE_MINIMO_DIAS = 60
+
+
+def horizonte_dias():
+    return getattr(settings, 'VITALLIFE_HORIZONTE_ARCHIVO_DIAS', 365)
+
+
+def _archivables(dias):
+    from .models import Cita
+
+    limite = timezone.now() - timedelta(days=dias)
+    return Cita.objects.filter(
+        estado__in=[Cita.EstadoCita.COMPLETADA, Cita.EstadoCita.CANCELADA, Cita.EstadoCita.NO_ASISTIO],
+        fecha_hora__lt=limite,
+    )
+
+
+def pendientes(dias=None):
+    """Cuántas citas se archivarían con el horizonte indicado."""
+    return _archivables(dias or horizonte_dias()).count()
+
+
+def _mover_lote(ids):
+    from .models import (
+        Cita, Diagnostico, Receta, RecordatorioCita, CitaArchivada, DiagnosticoArchivado, RecetaArchivada,
+    )
+
+    citas = list(Cita.objects.select_for_update().filter(id__in=ids).values(
+        'id', 'paciente_id', 'medico_id', 'especialidad_id', 'fecha_hora', 'motivo', 'estado',
+    ))
+    if not citas:
+        return 0
+    ids = [cita['id'] for cita in citas]
+    diagnosticos = Diagnostico.objects.filter(cita_id__in=ids).values(
+        'id', 'cita_id', 'titulo', 'descripcion', 'fecha_creacion',
+    )
+    recetas = Receta.objects.filter(cita_id__in=ids).values(
+        'id', 'cita_id', 'titulo', 'archivo', 'indicaciones', 'fecha_creacion',
+    )
+
+    CitaArchivada.objects.bulk_create([CitaArchivada(**cita) for cita in citas])
+    DiagnosticoArchivado.objects.bulk_create([DiagnosticoArchivado(**fila) for fila in diagnosticos])
+    RecetaArchivada.objects.bulk_create([RecetaArchivada(**fila) for fila in recetas])
+
+    # Borrado directo (sin señales ni carga de modelos), hijos primero.
+    for consulta in (
+        RecordatorioCita.objects.filter(cita_id__in=ids),
+        Diagnostico.objects.filter(cita_id__in=ids),
+        Receta.objects.filter(cita_id__in=ids),
+        Cita.objects.filter(id__in=ids),
+    ):
+        consulta._raw_delete(consulta.db)
+    return len(ids)
+
+
+def archivar(dias=None, lote=TAMANO_LOTE):
+    """Mueve al archivo las citas cerradas más antiguas que `dias`. Devuelve cuántas."""
+    dias = dias or horizonte_dias()
+    if dias < HORIZONTE_MINIMO_DIAS:
+        raise ValueError(f"El horizonte de archivo debe ser de al menos {HORIZONTE_MINIMO_DIAS} días.")
+
+    archivables = _archivables(dias).order_by('fecha_hora', 'id')
+    total = 0
+    while True:
+        with transaction.atomic():
+            ids = list(archivables.values_list('id', flat=True)[:lote])
+            if not ids:
+                break
+            total += _mover_lote(ids)
+        if len(ids) < lote:
+            break
+
+    if total:
+        # Las consultas por especialidad suman ambas tablas, pero el caché quedó
+        # calculado con la distribución anterior.
+        encolar('paneladmin.tareas.precalcular_reportes', unica=True)
+    return total
+
+
+def codificar_cursor(fecha_hora, cita_id):
+    """Cursor opaco (fecha_hora, id) para seguir el historial después de esa cita."""
+    return f'{(fecha_hora - EPOCA) // timedelta(microseconds=1)}_{cita_id}'
+
+
+def decodificar_cursor(cursor):
+    """(fecha_hora, id) del cursor; ValueError si no es válido."""
+    microsegundos, cita_id = cursor.split('_')
+    fecha_hora = EPOCA + timedelta(microseconds=int(microsegundos))
+    return fecha_hora, int(cita_id)
+
+
+def pagina_historial(cursor=None, tamano=TAMANO_PAGINA, valores=None, **filtros):
+    """
+    Una página del historial (citas activas y archivadas), de la más reciente
+    a la más antigua, con paginación por cursor sobre (fecha_hora, id).
+    Devuelve (citas, cursor de la página siguiente o None).
+
+    Cada tabla se lee con una sola consulta (médico y especialidad por JOIN);
+    diagnóstico y recetas no se cargan. La tabla de archivo solo se consulta
+    si la página puede llegar a fechas anteriores a HORIZONTE_MINIMO_DIAS. Con `valores`
+    (columnas para .values(), p. ej. 'medico__nombre') las citas son
+    diccionarios con solo esas columnas, además de id y fecha_hora.
+    """
+    from .models import Cita, CitaArchivada
+
+    despues = Q()
+    if cursor:
+        fecha_hora, cita_id = decodificar_cursor(cursor)
+        despues = Q(fecha_hora__lt=fecha_hora) | Q(fecha_hora=fecha_hora, id__lt=cita_id)
+
+    def leer(modelo):
+        consulta = modelo.objects.filter(despues, **filtros)
+        if valores:
+            consulta = consulta.values(*dict.fromkeys(('id', 'fecha_hora', *valores)))
+        else:
+            consulta = consulta.select_related('medico', 'especialidad')
+        return list(consulta.order_by('-fecha_hora', '-id')[:tamano + 1])
+
+    clave = itemgetter('fecha_hora', 'id') if valores else attrgetter('fecha_hora', 'id')
+    citas = leer(Cita)
+    # Todo lo archivado es anterior a HORIZONTE_MINIMO_DIAS: archivar() no acepta
+    # horizontes menores y el límite solo avanza. No sirve el horizonte configurado,
+    # porque `archivar_citas --dias` pudo usar uno más corto.
+    limite_archivo = timezone.now() - timedelta(days=HORIZONTE_MINIMO_DIAS)
+    if len(citas) <= tamano or clave(citas[-1])[0] < limite_archivo:
+        citas = sorted(chain(citas, leer(CitaArchivada)), key=clave, reverse=True)
+
+    if len(citas) <= tamano:
+        return citas, None
+    citas = citas[:tamano]
+    return citas, codificar_cursor(*clave(citas[-1]))
+
+
+def existe_relacion(medico, paciente):
+    """True si el médico tiene o tuvo alguna cita con el paciente, activa o archivada."""
+    from .models import Cita, CitaArchivada
+
+    return (
+        Cita.objects.filter(medico=medico, paciente=paciente).exists()
+        or CitaArchivada.objects.filter(medico=medico, paciente=paciente).exists()
+    )
+
+
+def obtener_cita(cita_id, **filtros):
+    """La cita con ese id, activa o archivada, o None."""
+    from .models import Cita, CitaArchivada
+
+    for modelo in (Cita, CitaArchivada):
+        cita = modelo.objects.select_related('medico', 'especialidad', 'diagnostico').prefetch_related(
+            'recetas'
+        ).filter(id=cita_id, **filtros).first()
+        if cita is not None:
+            return cita
+    return None
@@ -0,0 +1,116 @@
+"""
+Caché del catálogo de especialidades y del plantel de médicos por especialidad.
+
+El flujo de reserva del paciente lee estos datos en cada paso, pero cambian muy
+de vez en cuando. Se guardan como registros inmutables y compactos en dos capas:
+
+1. Memoria del proceso: sin costo de red ni de deserialización.
+2. Caché compartida (CACHES['default']): para que un proceso nuevo no tenga
+   que ir a la base de datos.
+
+Ambas capas quedan asociadas al sello de versión del catálogo
+(versiones.CLAVE_CATALOGO), que las señales de Especialidad y Usuario avanzan
+en cada escritura relevante; al cambiar el sello, las entradas viejas dejan de
+usarse sin tener que borrarlas una a una.
+"""
+from typing import NamedTuple
+
+from django.core.cache import cache
+
+from . import versiones
+
+# Tiempo que una versión del catálogo permanece en la caché compartida.
+DURACION_CACHE = 60 * 60 * 24
+
+# Capa en memoria del proceso: clave -> (versión, valor).
+_memoria = {}
+
+
+class EspecialidadResumen(NamedTuple):
+    id: int
+    nombre: str
+    descripcion: str
+    imagen: str
+    imagen_url: str
+
+
+class MedicoResumen(NamedTuple):
+    id: int
+    nombre: str
+    apellido: str
+    foto: str
+    foto_url: str
+
+    def get_full_name(self):
+        return f"{self.nombre} {self.apellido}"
+
+    def get_short_name(self):
+        return self.nombre
+
+
+def _obtener(clave, version, cargar):
+    en_memoria = _memoria.get(clave)
+    if en_memoria is not None and en_memoria[0] == version:
+        return en_memoria[1]
+
+    clave_compartida = f'catalogo:{clave}:{version}'
+    valor = cache.get(clave_compartida)
+    if valor is None:
+        valor = cargar()
+        cache.set(clave_compartida, valor, DURACION_CACHE)
+    _memoria[clave] = (version, valor)
+    return valor
+
+
+def _cargar_especialidades():
+    from .models import Especialidad
+
+    return tuple(
+        EspecialidadResumen(
+            id=especialidad.id,
+            nombre=especialidad.nombre,
+            descripcion=especialidad.descripcion,
+            imagen=especialidad.imagen.name,
+            imagen_url=especialidad.imagen.url if especialidad.imagen else '',
+        )
+        for especialidad in Especialidad.objects.only('id', 'nombre', 'descripcion', 'imagen').order_by('nombre')
+    )
+
+
+def _cargar_medicos(especialidad_id):
+    from usuario.models import Usuario
+
+    # Sin los desactivados: un médico con la eliminación pendiente ya no se ofrece.
+    medicos = Usuario.objects.filter(
+        role=Usuario.Role.MEDICO, especialidad_id=especialidad_id, is_active=True,
+    ).only('id', 'nombre', 'apellido', 'foto_perfil').order_by('nombre', 'apellido')
+    return tuple(
+        MedicoResumen(
+            id=medico.id,
+            nombre=medico.nombre,
+            apellido=medico.apellido,
+            foto=medico.foto_perfil.name or '',
+            foto_url=medico.foto_perfil.url if medico.foto_perfil else '',
+        )
+        for medico in medicos
+    )
+
+
+def obtener_especialidades():
+    """Todas las especialidades, ordenadas por nombre."""
+    version, = versiones.obtener(versiones.CLAVE_CATALOGO)
+    return _obtener('especialidades', version, _cargar_especialidades)
+
+
+def obtener_especialidad(especialidad_id):
+    """La especialidad indicada, o None si no existe."""
+    for especialidad in obtener_especialidades():
+        if especialidad.id == especialidad_id:
+            return especialidad
+    return None
+
+
+def obtener_medicos(especialidad_id):
+    """Plantel de médicos de una especialidad."""
+    version, = versiones.obtener(versiones.CLAVE_CATALOGO)
+    return _obtener(f'medicos:{especialidad_id}', version, lambda: _cargar_medicos(especialidad_id))
@@ -0,0 +1,61 @@
+"""
+Cierre de citas pasadas: RESERVADA -> COMPLETADA una vez terminado el horario.
+
+Se hace con UPDATEs por lotes sobre el índice (estado, fecha_hora), sin cargar
+modelos ni disparar señales. Es idempotente (solo toca citas RESERVADAS; las
+marcadas como NO_ASISTIO o CANCELADA no cambian) y se puede cortar y volver a
+ejecutar: cada lote se confirma por separado.
+
+Como no pasan por las señales, aquí mismo se avanzan los sellos de versión de
+los días y pacientes afectados y se encola el recálculo de reportes.
+"""
+from datetime import timedelta
+
+from django.db import transaction
+from django.utils import timezone
+
+from . import versiones
+from .cola import encolar
+
+# Duración de un bloque de atención: la cita se cierra cuando termina.
+DURACION_CITA = timedelta(hours=1)
+
+TAMANO_LOTE = 1000
+
+
+def completar_vencidas(ahora=None, lote=TAMANO_LOTE):
+    """Marca como COMPLETADAS las citas reservadas cuyo horario ya terminó. Devuelve cuántas."""
+    from .models import Cita
+
+    limite = (ahora or timezone.now()) - DURACION_CITA
+    vencidas = Cita.objects.filter(
+        estado=Cita.EstadoCita.RESERVADA, fecha_hora__lte=limite
+    ).order_by('fecha_hora', 'id')
+
+    total = 0
+    while True:
+        with transaction.atomic():
+            filas = list(vencidas.values_list('id', 'medico_id', 'especialidad_id', 'fecha_hora', 'paciente_id')[:lote])
+            if not filas:
+                break
+            actualizadas = Cita.objects.filter(
+                id__in=[fila[0] for fila in filas], estado=Cita.EstadoCita.RESERVADA
+            ).update(estado=Cita.EstadoCita.COMPLETADA)
+            claves = versiones.claves_citas(fila[1:4] for fila in filas)
+            claves |= {versiones.clave_paciente(fila[4]) for fila in filas}
+            transaction.on_commit(lambda claves=claves: versiones.incrementar(*claves))
+        total += actualizadas
+        if len(filas) < lote:
+            break
+
+    if total:
+        encolar('paneladmin.tareas.precalcular_reportes', unica=True)
+    return total
+
+
+def pendientes(ahora=None):
+    """Cuántas citas están esperando cierre."""
+    from .models import Cita
+
+    limite = (ahora or timezone.now()) - DURACION_CITA
+    return Cita.objects.filter(estado=Cita.EstadoCita.RESERVADA, fecha_hora__lte=limite).count()
@@ -0,0 +1,182 @@
+"""
+Cola de tareas en segundo plano sobre la base de datos (sin Redis ni otro broker).
+
+Uso:
+
+    from paneladmin.cola import tarea, encolar
+
+    @tarea(prioridad=Tarea.Prioridad.ALTA)
+    def enviar_confirmacion_cita(cita_id):
+        ...
+
+    encolar(enviar_confirmacion_cita, cita_id=cita.id)
+
+- Las tareas se registran con @tarea en los módulos `<app>/tareas.py`, que se
+  importan al iniciar Django (PaneladminConfig.ready).
+- encolar() inserta la fila en la transacción en curso: si la petición hace
+  rollback, la tarea tampoco existe, y si hace commit, ya quedó guardada.
+- `python manage.py procesar_tareas --procesos N` ejecuta las tareas. Cada
+  trabajador reclama una tarea con un UPDATE condicional, de modo que dos
+  procesos nunca ejecutan la misma (en MySQL/PostgreSQL además se usa
+  SKIP LOCKED para no esperar filas bloqueadas).
+- Si una tarea falla se reintenta con espera exponencial hasta max_intentos.
+"""
+import hashlib
+import json
+import logging
+import os
+import random
+import socket
+import traceback
+from datetime import timedelta
+
+from django.db import connection, transaction
+from django.db.models import F
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+# nombre -> función registrada con @tarea.
+REGISTRO = {}
+
+# Espera entre reintentos: BASE_REINTENTO * 2^(intento - 1), con tope.
+BASE_REINTENTO = timedelta(seconds=30)
+MAXIMO_REINTENTO = timedelta(hours=1)
+
+# Una tarea EN_CURSO por más tiempo se considera abandonada (trabajador caído).
+TIEMPO_MAXIMO_EJECUCION = timedelta(minutes=15)
+
+
+def tarea(funcion=None, *, nombre=None, prioridad=None, max_intentos=5):
+    """Registra una función como tarea. Los argumentos deben ser serializables a JSON."""
+    def registrar(funcion):
+        from .models import Tarea
+
+        funcion.nombre_tarea = nombre or f'{funcion.__module__}.{funcion.__name__}'
+        funcion.prioridad = Tarea.Prioridad.NORMAL if prioridad is None else prioridad
+        funcion.max_intentos = max_intentos
+        funcion.encolar = lambda *args, **kwargs: encolar(funcion, *args, **kwargs)
+        REGISTRO[funcion.nombre_tarea] = funcion
+        return funcion
+
+    return registrar(funcion) if funcion is not None else registrar
+
+
+def _clave(nombre, argumentos):
+    firma = json.dumps(argumentos, sort_keys=True, default=str)
+    return f'{nombre}:{hashlib.md5(firma.encode()).hexdigest()}'
+
+
+def encolar(funcion, *args, prioridad=None, retraso=None, unica=False, **kwargs):
+    """
+    Agrega una tarea a la cola. Con unica=True no se agrega si ya hay una
+    pendiente con el mismo nombre y argumentos (útil para recálculos); a lo
+    sumo se adelanta la existente.
+    """
+    from .models import Tarea
+
+    nombre = funcion if isinstance(funcion, str) else funcion.nombre_tarea
+    registrada = REGISTRO.get(nombre)
+    argumentos = {'args': list(args), 'kwargs': kwargs}
+    clave = _clave(nombre, argumentos)
+
+    ejecutar_desde = timezone.now() + (retraso or timedelta())
+    if unica:
+        pendientes = Tarea.objects.filter(clave=clave, estado=Tarea.Estado.PENDIENTE)
+        if pendientes.exists():
+            # Si la pendiente estaba programada para más tarde, se adelanta.
+            pendientes.filter(ejecutar_desde__gt=ejecutar_desde).update(ejecutar_desde=ejecutar_desde)
+            return None
+    if prioridad is None:
+        prioridad = registrada.prioridad if registrada else Tarea.Prioridad.NORMAL
+    return Tarea.objects.create(
+        nombre=nombre,
+        argumentos=argumentos,
+        clave=clave,
+        prioridad=prioridad,
+        max_intentos=registrada.max_intentos if registrada else 5,
+        ejecutar_desde=ejecutar_desde,
+    )
+
+
+def identificador_trabajador():
+    return f'{socket.gethostname()}:{os.getpid()}'
+
+
+def recuperar_abandonadas():
+    """Devuelve a la cola las tareas de trabajadores que murieron a mitad de ejecución."""
+    from .models import Tarea
+
+    limite = timezone.now() - TIEMPO_MAXIMO_EJECUCION
+    return Tarea.objects.filter(estado=Tarea.Estado.EN_CURSO, fecha_inicio__lt=limite).update(
+        estado=Tarea.Estado.PENDIENTE, trabajador=''
+    )
+
+
+def reclamar_siguiente(trabajador, nombres=None):
+    """Marca como EN_CURSO la siguiente tarea lista y la devuelve, o None si no hay."""
+    from .models import Tarea
+
+    ahora = timezone.now()
+    candidatas = Tarea.objects.filter(estado=Tarea.Estado.PENDIENTE, ejecutar_desde__lte=ahora)
+    if nombres:
+        candidatas = candidatas.filter(nombre__in=nombres)
+    candidatas = candidatas.order_by('-prioridad', 'ejecutar_desde', 'id')
+
+    with transaction.atomic():
+        if connection.features.has_select_for_update_skip_locked:
+            candidatas = candidatas.select_for_update(skip_locked=True)
+        for tarea_id in candidatas.values_list('id', flat=True)[:5]:
+            # UPDATE condicional: si otro trabajador la tomó antes, afecta 0 filas.
+            tomada = Tarea.objects.filter(id=tarea_id, estado=Tarea.Estado.PENDIENTE).update(
+                estado=Tarea.Estado.EN_CURSO,
+                trabajador=trabajador,
+                fecha_inicio=ahora,
+                intentos=F('intentos') + 1,
+            )
+            if tomada:
+                return Tarea.objects.get(id=tarea_id)
+    return None
+
+
+def espera_reintento(intento):
+    espera = min(BASE_REINTENTO * (2 ** (intento - 1)), MAXIMO_REINTENTO)
+    # Un poco de azar para que los reintentos de muchas tareas no coincidan.
+    return espera * random.uniform(0.8, 1.2)
+
+
+def ejecutar(tarea_db):
+    """Ejecuta una tarea ya reclamada y registra el resultado. Devuelve True si terminó bien."""
+    from .models import Tarea
+
+    funcion = REGISTRO.get(tarea_db.nombre)
+    try:
+        if funcion is None:
+            raise LookupError(f"No hay ninguna tarea registrada con el nombre '{tarea_db.nombre}'.")
+        funcion(*tarea_db.argumentos.get('args', []), **tarea_db.argumentos.get('kwargs', {}))
+    except Exception:
+        error = traceback.format_exc()
+        logger.exception("Falló la tarea %s (intento %s)", tarea_db.nombre, tarea_db.intentos)
+        cambios = {'ultimo_error': error, 'trabajador': ''}
+        if tarea_db.intentos >= tarea_db.max_intentos or funcion is None:
+            cambios.update(estado=Tarea.Estado.FALLIDA, fecha_fin=timezone.now())
+        else:
+            cambios.update(
+                estado=Tarea.Estado.PENDIENTE,
+                ejecutar_desde=timezone.now() + espera_reintento(tarea_db.intentos),
+            )
+        Tarea.objects.filter(id=tarea_db.id).update(**cambios)
+        return False
+
+    Tarea.objects.filter(id=tarea_db.id).update(
+        estado=Tarea.Estado.COMPLETADA, fecha_fin=timezone.now(), trabajador='', ultimo_error=''
+    )
+    return True
+
+
+def purgar_completadas(dias=7):
+    """Borra el historial de tareas completadas más antiguo que `dias`."""
+    from .models import Tarea
+
+    limite = timezone.now() - timedelta(days=dias)
+    return Tarea.objects.filter(estado=Tarea.Estado.COMPLETADA, fecha_fin__lt=limite).delete()[0]
@@ -0,0 +1,179 @@
+"""
+Eliminación de usuarios en segundo plano.
+
+Un usuario con años de historial tiene miles de citas, diagnósticos y recetas;
+borrarlo con usuario.delete() en la petición obliga al Collector de Django a
+cargar y borrar todo de una vez. En su lugar:
+
+1. solicitar() (en la petición) desactiva al usuario, cancela sus citas futuras
+   para liberar esos horarios (avisando a los pacientes si era médico) y encola
+   la tarea `purgar_usuario`.
+2. purgar() borra sus filas por etapas (ETAPAS), en lotes de TAMANO_LOTE con
+   una transacción por lote y sin cargar modelos, y registra el avance en
+   EliminacionUsuario. Si se le acaba el tiempo, la tarea se vuelve a encolar y
+   sigue donde quedó.
+3. Al final borra el usuario. Los archivos de recetas, foto y antecedentes se
+   liberan en el almacenamiento deduplicado, que los borra si ya nadie los usa.
+"""
+import time
+from collections import Counter
+from typing import NamedTuple
+
+from django.db import transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from . import estadisticas, versiones
+from .almacenamiento import almacenamiento_deduplicado, modelos_deduplicados
+from .cola import encolar
+
+TAMANO_LOTE = 500
+
+# Segundos de trabajo por ejecución de la tarea, muy por debajo del tiempo que
+# la cola espera antes de dar una tarea por abandonada.
+TIEMPO_POR_EJECUCION = 60
+
+
+class Etapa(NamedTuple):
+    nombre: str
+    modelo: str
+    campo: str
+    # (modelo, campo que apunta a la fila principal), en orden de borrado.
+    dependientes: tuple = ()
+
+
+DEPENDIENTES_CITA = (('RecordatorioCita', 'cita_id'), ('Diagnostico', 'cita_id'), ('Receta', 'cita_id'))
+DEPENDIENTES_CITA_ARCHIVADA = (('DiagnosticoArchivado', 'cita_id'), ('RecetaArchivada', 'cita_id'))
+
+ETAPAS = (
+    Etapa('Citas como paciente', 'Cita', 'paciente_id', DEPENDIENTES_CITA),
+    Etapa('Citas como médico', 'Cita', 'medico_id', DEPENDIENTES_CITA),
+    Etapa('Citas archivadas como paciente', 'CitaArchivada', 'paciente_id', DEPENDIENTES_CITA_ARCHIVADA),
+    Etapa('Citas archivadas como médico', 'CitaArchivada', 'medico_id', DEPENDIENTES_CITA_ARCHIVADA),
+    Etapa('Pacientes del médico', 'RelacionMedicoPaciente', 'medico_id'),
+    Etapa('Médicos del paciente', 'RelacionMedicoPaciente', 'paciente_id'),
+    Etapa('Horarios bloqueados', 'HorarioBloqueado', 'medico_id'),
+    Etapa('Disponibilidades', 'Disponibilidad', 'medico_id'),
+    Etapa('Ficha médica', 'FichaMedica', 'paciente_id', (('RevisionFichaMedica', 'ficha_id'),)),
+    Etapa('Claves de idempotencia', 'SolicitudIdempotente', 'usuario_id'),
+    Etapa('Horarios retenidos como paciente', 'ReservaTemporal', 'paciente_id'),
+    Etapa('Horarios retenidos como médico', 'ReservaTemporal', 'medico_id'),
+)
+
+
+def _modelo(nombre):
+    from django.apps import apps
+
+    return apps.get_model('paneladmin', nombre)
+
+
+def solicitar(usuario, solicitada_por=None):
+    """Desactiva al usuario y encola el borrado de sus datos. Devuelve la EliminacionUsuario."""
+    from .models import Cita, EliminacionUsuario
+    from . import notificaciones
+
+    with transaction.atomic():
+        eliminacion = EliminacionUsuario.objects.filter(
+            usuario=usuario, estado__in=[EliminacionUsuario.Estado.PENDIENTE, EliminacionUsuario.Estado.EN_CURSO]
+        ).first()
+        if eliminacion is not None:
+            return eliminacion
+
+        usuario.is_active = False
+        usuario.save(update_fields=['is_active'])
+
+        # Pocas filas: se guardan una a una para que las señales liberen los horarios.
+        futuras = Cita.objects.filter(
+            Q(paciente=usuario) | Q(medico=usuario),
+            estado=Cita.EstadoCita.RESERVADA, fecha_hora__gt=timezone.now(),
+        )
+        for cita in futuras.select_related('paciente', 'medico', 'especialidad'):
+            cita.estado = Cita.EstadoCita.CANCELADA
+            cita.save(update_fields=['estado'])
+            if cita.medico_id == usuario.id:
+                notificaciones.registrar_cita_cancelada(cita, por_administracion=True)
+
+        eliminacion = EliminacionUsuario.objects.create(
+            usuario=usuario,
+            descripcion=f"{usuario.get_full_name()} <{usuario.email}>",
+            solicitada_por=solicitada_por,
+        )
+        encolar('paneladmin.tareas.purgar_usuario', eliminacion.id)
+    return eliminacion
+
+
+def _borrar_lote(etapa, usuario_id, lote):
+    """Borra un lote de la etapa y sus dependientes. Devuelve (filas de la etapa, filas totales)."""
+    campos_archivos = dict(modelos_deduplicados())
+    modelo = _modelo(etapa.modelo)
+    ids = list(modelo.objects.filter(**{etapa.campo: usuario_id}).order_by('pk').values_list('pk', flat=True)[:lote])
+    if not ids:
+        return 0, 0
+
+    archivos = Counter()
+    total = 0
+    if etapa.modelo in ('Cita', 'CitaArchivada'):
+        # Cambian los contadores de la otra parte de cada cita y el historial de
+        # sus pacientes en la API; las citas activas, además, liberan su horario.
+        filas = list(modelo.objects.filter(pk__in=ids).values_list('paciente_id', 'medico_id', 'especialidad_id', 'fecha_hora'))
+        estadisticas.invalidar(*{usuario_id for fila in filas for usuario_id in fila[:2]})
+        claves = {versiones.clave_paciente(fila[0]) for fila in filas}
+        if etapa.modelo == 'Cita':
+            claves |= versiones.claves_citas(fila[1:] for fila in filas)
+        transaction.on_commit(lambda: versiones.incrementar(*claves))
+    # Borrado directo (sin señales ni carga de modelos), dependientes primero.
+    consultas = [(_modelo(nombre), {f'{campo}__in': ids}) for nombre, campo in etapa.dependientes]
+    consultas.append((modelo, {'pk__in': ids}))
+    for modelo_consulta, filtro in consultas:
+        consulta = modelo_consulta.objects.filter(**filtro)
+        for campo in campos_archivos.get(modelo_consulta, ()):
+            archivos.update(nombre for nombre in consulta.values_list(campo, flat=True) if nombre)
+        total += consulta._raw_delete(consulta.db)
+
+    for nombre, cantidad in archivos.items():
+        almacenamiento_deduplicado.liberar(nombre, cantidad)
+    return len(ids), total
+
+
+def purgar(eliminacion_id, lote=TAMANO_LOTE, tiempo=TIEMPO_POR_EJECUCION):
+    """
+    Avanza en el borrado durante a lo sumo `tiempo` segundos. Devuelve True si
+    terminó y False si quedan filas por borrar.
+    """
+    from usuario.models import Usuario
+    from .models import EliminacionUsuario
+
+    eliminacion = EliminacionUsuario.objects.get(id=eliminacion_id)
+    if eliminacion.estado == EliminacionUsuario.Estado.COMPLETADA:
+        return True
+    usuario_id = eliminacion.usuario_id
+    EliminacionUsuario.objects.filter(id=eliminacion_id).update(estado=EliminacionUsuario.Estado.EN_CURSO)
+
+    limite = time.monotonic() + tiempo
+    if usuario_id is not None:
+        for etapa in ETAPAS:
+            while True:
+                if time.monotonic() > limite:
+                    return False
+                with transaction.atomic():
+                    filas, total = _borrar_lote(etapa, usuario_id, lote)
+                    if total:
+                        EliminacionUsuario.objects.filter(id=eliminacion_id).update(
+                            etapa=etapa.nombre, filas_eliminadas=F('filas_eliminadas') + total
+                        )
+                if filas < lote:
+                    break
+
+        with transaction.atomic():
+            # Ya sin dependencias: el Collector solo borra la fila y sus permisos,
+            # y las señales liberan la foto y los antecedentes.
+            usuario = Usuario.objects.filter(id=usuario_id).first()
+            if usuario is not None:
+                usuario.delete()
+
+    EliminacionUsuario.objects.filter(id=eliminacion_id).update(
+        estado=EliminacionUsuario.Estado.COMPLETADA, etapa='', fecha_fin=timezone.now(),
+        filas_eliminadas=F('filas_eliminadas') + (1 if usuario_id is not None else 0),
+    )
+    encolar('paneladmin.tareas.precalcular_reportes', unica=True)
+    return True
@@ -0,0 +1,156 @@
+"""
+Contadores de los paneles por usuario (EstadisticasUsuario), para no agregar
+citas en cada carga:
+
+- Como paciente: citas pasadas (sin contar canceladas ni inasistencias, activas
+  y archivadas), citas próximas y la próxima cita.
+- Como médico: pacientes distintos (filas de RelacionMedicoPaciente), citas
+  del mes y cancelaciones del mes.
+
+Los caminos que escriben citas llaman a invalidar() con los usuarios
+afectados: las señales de Cita, la importación de citas y la purga de
+usuarios. El cierre de citas vencidas y el archivo no cambian ningún contador.
+
+obtener() devuelve la fila y la recalcula (una consulta por tabla) si está
+desactualizada o pasó su 'valido_hasta'. `python manage.py
+reconciliar_estadisticas` (cron) recalcula las pendientes para que las
+lecturas casi nunca paguen ese costo, y con --todas revisa todas las filas.
+"""
+from datetime import datetime
+
+from django.db import transaction
+from django.db.models import Count, F, Q
+from django.utils import timezone
+
+from . import versiones
+
+TAMANO_LOTE = 500
+
+
+def _limites_mes(ahora):
+    inicio = timezone.localtime(ahora).replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+    siguiente = inicio.date().replace(year=inicio.year + inicio.month // 12, month=inicio.month % 12 + 1)
+    fin = timezone.make_aware(datetime.combine(siguiente, datetime.min.time()))
+    return inicio, fin
+
+
+def _calcular(usuario, ahora):
+    from usuario.models import Usuario
+    from .models import Cita, CitaArchivada, RelacionMedicoPaciente
+
+    no_asistidas = [Cita.EstadoCita.CANCELADA, Cita.EstadoCita.NO_ASISTIO]
+    pasada = Q(fecha_hora__lt=ahora) & ~Q(estado__in=no_asistidas)
+    proxima = Q(fecha_hora__gte=ahora, estado=Cita.EstadoCita.RESERVADA)
+
+    citas = Cita.objects.filter(paciente_id=usuario.pk)
+    conteos = citas.aggregate(pasadas=Count('id', filter=pasada), proximas=Count('id', filter=proxima))
+    archivadas = CitaArchivada.objects.filter(pasada, paciente_id=usuario.pk).count()
+    siguiente = citas.filter(proxima).order_by('fecha_hora').values_list('id', 'fecha_hora').first()
+
+    inicio_mes, fin_mes = _limites_mes(ahora)
+    datos = {
+        'citas_pasadas': conteos['pasadas'] + archivadas,
+        'citas_proximas': conteos['proximas'],
+        'proxima_cita_id': siguiente[0] if siguiente else None,
+        'pacientes_distintos': 0,
+        'citas_mes': 0,
+        'cancelaciones_mes': 0,
+        # Cuando empieza la próxima cita cambian los conteos de pasadas y próximas.
+        'valido_hasta': min(siguiente[1], fin_mes) if siguiente else fin_mes,
+    }
+
+    if usuario.role == Usuario.Role.MEDICO:
+        datos['pacientes_distintos'] = RelacionMedicoPaciente.objects.filter(medico_id=usuario.pk).count()
+        # El horizonte del archivo es mayor que un mes: basta con la tabla activa.
+        cancelada = Q(estado=Cita.EstadoCita.CANCELADA)
+        mes = Cita.objects.filter(medico_id=usuario.pk, fecha_hora__gte=inicio_mes, fecha_hora__lt=fin_mes).aggregate(
+            citas=Count('id', filter=~cancelada), cancelaciones=Count('id', filter=cancelada),
+        )
+        datos['citas_mes'] = mes['citas']
+        datos['cancelaciones_mes'] = mes['cancelaciones']
+    return datos
+
+
+def recalcular(usuario, ahora=None):
+    """Recalcula y guarda los contadores del usuario. Devuelve la EstadisticasUsuario."""
+    from .models import EstadisticasUsuario
+
+    ahora = ahora or timezone.now()
+    fila, _ = EstadisticasUsuario.objects.get_or_create(
+        usuario_id=usuario.pk, defaults={'valido_hasta': ahora, 'fecha_calculo': ahora, 'desactualizada': True},
+    )
+    datos = _calcular(usuario, ahora)
+    # Si alguien la invalidó mientras calculábamos, queda desactualizada para la próxima lectura.
+    guardada = EstadisticasUsuario.objects.filter(usuario_id=usuario.pk, version=fila.version).update(
+        desactualizada=False, fecha_calculo=ahora, **datos,
+    )
+    for campo, valor in datos.items():
+        setattr(fila, campo, valor)
+    fila.desactualizada = not guardada
+    fila.fecha_calculo = ahora
+    return fila
+
+
+def obtener(usuario):
+    """Estadísticas del usuario, recalculadas solo si hace falta."""
+    from .models import EstadisticasUsuario
+
+    fila = EstadisticasUsuario.objects.select_related(
+        'proxima_cita__medico', 'proxima_cita__especialidad'
+    ).filter(usuario_id=usuario.pk).first()
+    ahora = timezone.now()
+    if fila is None or fila.desactualizada or fila.valido_hasta <= ahora:
+        fila = recalcular(usuario, ahora)
+    return fila
+
+
+def invalidar(*usuario_ids):
+    """
+    Marca como desactualizadas las estadísticas de esos usuarios al confirmar la
+    transacción y avanza su sello de versión (la caché de los paneles de inicio).
+    """
+    from .models import EstadisticasUsuario
+
+    ids = {usuario_id for usuario_id in usuario_ids if usuario_id is not None}
+    if not ids:
+        return
+
+    def marcar():
+        EstadisticasUsuario.objects.filter(usuario_id__in=ids).update(desactualizada=True, version=F('version') + 1)
+        versiones.incrementar(*(versiones.clave_usuario(usuario_id) for usuario_id in ids))
+
+    transaction.on_commit(marcar)
+
+
+def reconciliar(todas=False, lote=TAMANO_LOTE):
+    """
+    Recalcula las filas desactualizadas o vencidas (todas con `todas`).
+    Devuelve (revisadas, corregidas): corregidas son las que tenían otros valores.
+    """
+    from usuario.models import Usuario
+    from .models import EstadisticasUsuario
+
+    ahora = timezone.now()
+    filas = EstadisticasUsuario.objects.all()
+    if not todas:
+        filas = filas.filter(Q(desactualizada=True) | Q(valido_hasta__lte=ahora))
+    campos = ('citas_pasadas', 'citas_proximas', 'proxima_cita_id', 'pacientes_distintos', 'citas_mes', 'cancelaciones_mes')
+
+    revisadas = corregidas = 0
+    ultimo = 0
+    while True:
+        anteriores = {
+            fila['usuario_id']: fila
+            for fila in filas.filter(usuario_id__gt=ultimo).order_by('usuario_id').values('usuario_id', *campos)[:lote]
+        }
+        if not anteriores:
+            break
+        for usuario in Usuario.objects.filter(id__in=anteriores).only('id', 'role'):
+            fila = recalcular(usuario, ahora)
+            revisadas += 1
+            if any(getattr(fila, campo) != anteriores[usuario.id][campo] for campo in campos):
+                corregidas += 1
+        ultimo = max(anteriores)
+        if len(anteriores) < lote:
+            break
+    return revisadas, corregidas
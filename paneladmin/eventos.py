@@ -0,0 +1,109 @@
+"""
+Canal de eventos en tiempo real para la disponibilidad de horarios.
+
+Las vistas que cambian el estado de un horario (agendar, cancelar, bloquear,
+desbloquear) publican eventos 'slot_tomado' / 'slot_liberado' en un canal por
+especialidad y fecha. Los clientes de seleccionar_horario.html los reciben por
+Server-Sent Events (ver usuario.views.eventos_horario_view) y actualizan la
+lista de horarios sin recargar la página.
+
+El broker por defecto vive en memoria del proceso: sirve para desarrollo,
+pruebas y despliegues ASGI de un solo proceso. Para varios procesos basta con
+implementar la misma interfaz (suscribir/cancelar/publicar) sobre un pub/sub
+compartido y apuntar VITALLIFE_BROKER_EVENTOS a esa clase.
+"""
+import asyncio
+import threading
+from collections import defaultdict
+from functools import lru_cache
+
+from django.conf import settings
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+SLOT_TOMADO = 'slot_tomado'
+SLOT_LIBERADO = 'slot_liberado'
+
+
+def canal_horarios(especialidad_id, fecha):
+    """Nombre del canal para los horarios de una especialidad en una fecha."""
+    return f"horarios:{especialidad_id}:{fecha.isoformat()}"
+
+
+class Suscripcion:
+    """
+    Cola asociada a una conexión SSE. Debe crearse dentro del event loop que
+    la va a consumir, ya que los eventos se entregan con call_soon_threadsafe.
+    """
+    def __init__(self, max_eventos=100):
+        self.loop = asyncio.get_running_loop()
+        self.cola = asyncio.Queue(maxsize=max_eventos)
+
+    def entregar(self, evento):
+        # Si el cliente no alcanza a consumir, descartamos el evento más antiguo.
+        if self.cola.full():
+            self.cola.get_nowait()
+        self.cola.put_nowait(evento)
+
+    async def siguiente(self):
+        return await self.cola.get()
+
+
+class BrokerEnMemoria:
+    """
+    Broker pub/sub en memoria del proceso. Es seguro publicar desde los hilos
+    de las vistas síncronas: la entrega se agenda en el loop de cada suscriptor.
+    """
+    def __init__(self):
+        self._suscriptores = defaultdict(set)
+        self._lock = threading.Lock()
+
+    def suscribir(self, canal):
+        suscripcion = Suscripcion()
+        with self._lock:
+            self._suscriptores[canal].add(suscripcion)
+        return suscripcion
+
+    def cancelar(self, canal, suscripcion):
+        with self._lock:
+            suscriptores = self._suscriptores.get(canal)
+            if suscriptores is None:
+                return
+            suscriptores.discard(suscripcion)
+            if not suscriptores:
+                del self._suscriptores[canal]
+
+    def publicar(self, canal, evento):
+        with self._lock:
+            suscriptores = list(self._suscriptores.get(canal, ()))
+        for suscripcion in suscriptores:
+            try:
+                suscripcion.loop.call_soon_threadsafe(suscripcion.entregar, evento)
+            except RuntimeError:
+                # El loop del suscriptor ya se cerró; se limpiará al cancelar.
+                pass
+        return len(suscriptores)
+
+
+@lru_cache(maxsize=None)
+def obtener_broker():
+    ruta = getattr(settings, 'VITALLIFE_BROKER_EVENTOS', 'paneladmin.eventos.BrokerEnMemoria')
+    return import_string(ruta)()
+
+
+def publicar_cambio_horario(tipo, medico, especialidad_id, fecha_hora):
+    """
+    Publica un cambio de estado de un horario. Se llama desde las señales una
+    vez confirmada la transacción, para no anunciar cambios que se revierten.
+    """
+    if especialidad_id is None:
+        return
+    fecha_hora_local = timezone.localtime(fecha_hora)
+    evento = {
+        'tipo': tipo,
+        'medico_id': medico.id,
+        'medico_nombre': medico.get_full_name(),
+        'especialidad_id': especialidad_id,
+        'fecha_hora': fecha_hora_local.isoformat(),
+    }
+    obtener_broker().publicar(canal_horarios(especialidad_id, fecha_hora_local.date()), evento)
@@ -1,8 +1,9 @@
 from django import forms
 from .models import Especialidad
+from .subidas import FormularioConSubidas
 from usuario.models import Usuario
 
-class EspecialidadForm(forms.ModelForm):
+class EspecialidadForm(FormularioConSubidas, forms.ModelForm):
     class Meta:
         model = Especialidad
         fields = ['nombre', 'descripcion', 'imagen']
@@ -29,4 +30,18 @@ class AdminUsuarioEditForm(forms.ModelForm):
             if isinstance(field.widget, forms.CheckboxInput):
                 field.widget.attrs.update({'class': 'form-check-input'})
             else:
-                field.widget.attrs.update({'class': 'form-control'})
\ No newline at end of file
+                field.widget.attrs.update({'class': 'form-control'})
+
+class ImportarUsuariosForm(forms.Form):
+    """Subida del CSV para la importación masiva (paneladmin.importacion_usuarios)."""
+    archivo_csv = forms.FileField(
+        label="Archivo CSV",
+        help_text="Columnas: nombre, apellido, email y, opcionalmente, rut, fecha_nacimiento, telefono, rol, especialidad y password.",
+        widget=forms.ClearableFileInput(attrs={'class': 'form-control', 'accept': '.csv,text/csv'}),
+    )
+
+    def clean_archivo_csv(self):
+        archivo = self.cleaned_data['archivo_csv']
+        if not archivo.name.lower().endswith('.csv'):
+            raise forms.ValidationError("El archivo debe tener extensión .csv.")
+        return archivo
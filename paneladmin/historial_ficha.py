@@ -0,0 +1,99 @@
+"""
+Historial de la ficha médica.
+
+Cada vez que se guarda una FichaMedica con cambios se agrega una
+RevisionFichaMedica (nunca se modifican ni se borran) con solo los campos
+que cambiaron y su valor nuevo. Las señales (paneladmin.signals) la registran;
+quien guarda puede indicar el autor con `ficha._autor = usuario`.
+
+- La revisión 1 y luego una de cada INTERVALO_INSTANTANEA guardan además el
+  estado completo. estado_en() parte de la última instantánea anterior a la
+  fecha y aplica a lo sumo INTERVALO_INSTANTANEA - 1 revisiones.
+- tendencia() lee solo las revisiones que cambiaron peso o altura, sin
+  reconstruir estados.
+"""
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+CAMPOS = ('altura_cm', 'peso_kg', 'tipo_sangre', 'alergias', 'enfermedades_cronicas')
+
+CAMPOS_TENDENCIA = ('peso_kg', 'altura_cm')
+
+INTERVALO_INSTANTANEA = 20
+
+
+def valores(ficha):
+    """Valores actuales de los campos versionados."""
+    # Desde __dict__ para no disparar consultas sobre campos diferidos (.only()).
+    return {campo: ficha.__dict__.get(campo) for campo in CAMPOS}
+
+
+def _normalizar(ficha, datos):
+    # Lo que llega del formulario (p. ej. '70.5') y lo que viene de la base
+    # (Decimal('70.50')) se comparan ya convertidos al tipo del campo.
+    return {campo: ficha._meta.get_field(campo).to_python(valor) for campo, valor in datos.items()}
+
+
+def registrar(ficha, anteriores=None, autor=None):
+    """
+    Agrega la revisión con los campos que cambiaron respecto de `anteriores`
+    (None para una ficha nueva). Devuelve la revisión o None si no hubo cambios.
+    """
+    from .models import RevisionFichaMedica
+
+    actuales = _normalizar(ficha, valores(ficha))
+    if anteriores is None:
+        cambios = {campo: valor for campo, valor in actuales.items() if valor not in (None, '')}
+    else:
+        anteriores = _normalizar(ficha, anteriores)
+        cambios = {campo: valor for campo, valor in actuales.items() if valor != anteriores[campo]}
+    if not cambios and anteriores is not None:
+        return None
+
+    with transaction.atomic():
+        ultima = (
+            RevisionFichaMedica.objects.select_for_update().filter(ficha_id=ficha.pk)
+            .order_by('-numero').values_list('numero', flat=True).first()
+        ) or 0
+        numero = ultima + 1
+        return RevisionFichaMedica.objects.create(
+            ficha_id=ficha.pk,
+            numero=numero,
+            fecha=ficha.ultima_actualizacion or timezone.now(),
+            autor=autor,
+            cambios=cambios,
+            instantanea=actuales if numero % INTERVALO_INSTANTANEA == 1 else None,
+        )
+
+
+def estado_en(paciente_id, fecha):
+    """Campos de la ficha del paciente tal como estaban en `fecha`, o None si aún no existía."""
+    from .models import FichaMedica, RevisionFichaMedica
+
+    revisiones = RevisionFichaMedica.objects.filter(ficha_id=paciente_id, fecha__lte=fecha)
+    base = revisiones.filter(instantanea__isnull=False).order_by('-numero').values('numero', 'instantanea').first()
+    if base is None:
+        return None
+
+    estado = dict(base['instantanea'])
+    for cambios in revisiones.filter(numero__gt=base['numero']).order_by('numero').values_list('cambios', flat=True):
+        estado.update(cambios)
+    return _normalizar(FichaMedica, estado)
+
+
+def tendencia(paciente_id, campos=CAMPOS_TENDENCIA):
+    """{campo: [(fecha, valor), ...]} con cada cambio de los campos, del más antiguo al más reciente."""
+    from .models import FichaMedica, RevisionFichaMedica
+
+    filtro = Q()
+    for campo in campos:
+        filtro |= Q(cambios__has_key=campo)
+    puntos = {campo: [] for campo in campos}
+    for fecha, cambios in (
+        RevisionFichaMedica.objects.filter(filtro, ficha_id=paciente_id).order_by('numero').values_list('fecha', 'cambios')
+    ):
+        for campo in campos:
+            if cambios.get(campo) is not None:
+                puntos[campo].append((fecha, FichaMedica._meta.get_field(campo).to_python(cambios[campo])))
+    return puntos
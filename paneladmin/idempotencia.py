@@ -0,0 +1,153 @@
+"""
+Claves de idempotencia para los POST que agendan o cancelan citas.
+
+La aplicación móvil reintenta las solicitudes cuando la red falla, sin saber si
+la primera llegó. Con el encabezado `Idempotency-Key` (o el campo
+`idempotency_key` de un formulario), el decorador idempotente():
+
+1. Reserva la clave del usuario en SolicitudIdempotente (un INSERT sobre la
+   restricción única usuario+clave) antes de ejecutar la vista.
+2. Guarda la respuesta. Un reintento con la misma clave la recibe tal cual con
+   una sola lectura por esa restricción, sin volver a pasar por Cita.
+3. Si la vista falla (excepción o 5xx) libera la clave para que se pueda reintentar.
+
+Mientras la primera solicitud se procesa, los reintentos reciben 409 con
+Retry-After. Si sigue sin respuesta pasado TIEMPO_PROCESAMIENTO, el proceso
+murió a mitad de camino y el siguiente reintento la reemplaza. La misma clave
+con otros datos recibe 422. Las claves duran
+DURACION; `python manage.py limpiar_idempotencia` (cron) borra las vencidas
+por el índice de expira_en.
+"""
+import hashlib
+from datetime import timedelta
+from functools import wraps
+
+from django.db import IntegrityError, transaction
+from django.db.models import Q
+from django.http import HttpResponse, JsonResponse
+from django.utils import timezone
+
+DURACION = timedelta(hours=24)
+
+# Más que el timeout del servidor de aplicaciones: ninguna petición viva tarda tanto.
+TIEMPO_PROCESAMIENTO = timedelta(minutes=2)
+
+LARGO_MAXIMO = 64
+
+TAMANO_LOTE = 1000
+
+# Campos que cambian entre reintentos sin cambiar la solicitud.
+CAMPOS_IGNORADOS = {'csrfmiddlewaretoken', 'idempotency_key'}
+
+
+def clave_solicitud(request):
+    return (request.META.get('HTTP_IDEMPOTENCY_KEY') or request.POST.get('idempotency_key') or '').strip()
+
+
+def _huella(request):
+    datos = sorted(
+        (campo, valor) for campo in request.POST if campo not in CAMPOS_IGNORADOS
+        for valor in request.POST.getlist(campo)
+    )
+    return hashlib.sha256(repr((request.path, datos)).encode()).hexdigest()
+
+
+def _reservar(usuario, clave, ruta, huella):
+    """Crea la reserva de la clave. Devuelve (reserva, None) o (None, registro existente)."""
+    from .models import SolicitudIdempotente
+
+    ahora = timezone.now()
+    reemplazable = Q(expira_en__lte=ahora) | Q(estado_http__isnull=True, fecha_creacion__lte=ahora - TIEMPO_PROCESAMIENTO)
+    for _ in range(2):
+        try:
+            with transaction.atomic():
+                return SolicitudIdempotente.objects.create(
+                    usuario=usuario, clave=clave, ruta=ruta, huella=huella, expira_en=ahora + DURACION,
+                ), None
+        except IntegrityError:
+            existentes = SolicitudIdempotente.objects.filter(usuario=usuario, clave=clave)
+            existente = existentes.exclude(reemplazable).first()
+            if existente is not None:
+                return None, existente
+            # Vencida, abandonada sin respuesta (el proceso murió) o recién borrada
+            # por la limpieza: se reemplaza.
+            existentes.filter(reemplazable).delete()
+    return None, None
+
+
+def _repetir(registro):
+    if registro.estado_http is None:
+        respuesta = JsonResponse(
+            {'status': 'error', 'message': 'La solicitud original todavía se está procesando.'}, status=409,
+        )
+        respuesta['Retry-After'] = '1'
+        return respuesta
+    respuesta = HttpResponse(registro.cuerpo, status=registro.estado_http, content_type=registro.tipo_contenido)
+    if registro.ubicacion:
+        respuesta['Location'] = registro.ubicacion
+    respuesta['Idempotent-Replayed'] = 'true'
+    return respuesta
+
+
+def idempotente(view_func):
+    """Decorador para vistas POST de usuarios autenticados (ver el docstring del módulo)."""
+    @wraps(view_func)
+    def _wrapped_view(request, *args, **kwargs):
+        from .models import SolicitudIdempotente
+
+        clave = clave_solicitud(request) if request.method == 'POST' else ''
+        if not clave or not request.user.is_authenticated:
+            return view_func(request, *args, **kwargs)
+        if len(clave) > LARGO_MAXIMO:
+            return JsonResponse(
+                {'status': 'error', 'message': f'La clave de idempotencia admite hasta {LARGO_MAXIMO} caracteres.'},
+                status=400,
+            )
+
+        huella = _huella(request)
+        reserva, existente = _reservar(request.user, clave, request.path, huella)
+        if existente is not None:
+            if existente.huella != huella:
+                return JsonResponse(
+                    {'status': 'error', 'message': 'La clave de idempotencia ya se usó con otra solicitud.'},
+                    status=422,
+                )
+            return _repetir(existente)
+        if reserva is None:
+            # Otra solicitud reemplazó la clave vencida entremedio.
+            return _repetir(SolicitudIdempotente(estado_http=None))
+
+        try:
+            respuesta = view_func(request, *args, **kwargs)
+        except BaseException:
+            SolicitudIdempotente.objects.filter(pk=reserva.pk).delete()
+            raise
+        if respuesta.status_code >= 500 or respuesta.streaming:
+            SolicitudIdempotente.objects.filter(pk=reserva.pk).delete()
+            return respuesta
+
+        SolicitudIdempotente.objects.filter(pk=reserva.pk).update(
+            estado_http=respuesta.status_code,
+            tipo_contenido=respuesta.get('Content-Type', ''),
+            cuerpo=respuesta.content.decode(respuesta.charset),
+            ubicacion=respuesta.get('Location', ''),
+        )
+        return respuesta
+    return _wrapped_view
+
+
+def limpiar_vencidas(lote=TAMANO_LOTE):
+    """Borra las claves vencidas por lotes, en el orden del índice de expira_en. Devuelve cuántas."""
+    from .models import SolicitudIdempotente
+
+    total = 0
+    while True:
+        with transaction.atomic():
+            ids = list(SolicitudIdempotente.objects.filter(
+                expira_en__lte=timezone.now()
+            ).order_by('expira_en').values_list('id', flat=True)[:lote])
+            if ids:
+                consulta = SolicitudIdempotente.objects.filter(id__in=ids)
+                total += consulta._raw_delete(consulta.db)
+        if len(ids) < lote:
+            return total
@@ -0,0 +1,307 @@
+"""
+Importación masiva de citas (pasadas y futuras) desde el sistema anterior.
+
+Columnas del CSV (encabezado en la primera fila; separador coma o punto y coma):
+
+    paciente, medico              correo o RUT de usuarios ya registrados
+    fecha_hora                    AAAA-MM-DD HH:MM (hora local) o ISO 8601
+    especialidad                  opcional; por defecto, la del médico
+    estado                        opcional; COMPLETADA si ya pasó, si no RESERVADA
+    motivo                        opcional
+    diagnostico_titulo,
+    diagnostico_descripcion       opcionales; crean el Diagnostico de la cita
+
+El archivo se lee en streaming, sin cargarlo completo:
+
+- Médicos, pacientes y especialidades se resuelven con mapas en memoria
+  cargados una sola vez, sin consultas por fila.
+- Los choques con unique_together('medico', 'fecha_hora') se detectan antes de
+  insertar: contra las filas ya aceptadas del propio archivo (un conjunto de
+  claves médico+instante) y, por lote, contra las citas existentes y
+  archivadas. Un bulk_create nunca falla por una fila repetida.
+- Cada lote se escribe con bulk_create en su propia transacción, de modo que
+  los bloqueos duran poco y lo ya confirmado no se pierde si el proceso se corta.
+
+Las filas rechazadas se copian al archivo de rechazos con el número de fila y
+el motivo. Volver a importar el mismo archivo es seguro: las citas ya cargadas
+se rechazan como "ya importada".
+"""
+import csv
+from datetime import datetime
+from itertools import islice
+from typing import NamedTuple
+
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+
+from usuario.validadores import limpiar_rut
+from . import estadisticas, pacientes_medico, versiones
+from .cola import encolar
+
+TAMANO_LOTE = 5000
+
+FORMATOS_FECHA_HORA = ('%Y-%m-%d %H:%M', '%Y-%m-%d %H:%M:%S', '%d-%m-%Y %H:%M', '%d/%m/%Y %H:%M')
+
+COLUMNAS_OBLIGATORIAS = ('paciente', 'medico', 'fecha_hora')
+
+
+class Resumen(NamedTuple):
+    leidas: int
+    creadas: int
+    diagnosticos: int
+    rechazadas: int
+
+
+class FilaRechazada(Exception):
+    pass
+
+
+def _clave_horario(medico_id, fecha_hora):
+    # Un entero en vez de una tupla: con millones de filas el conjunto ocupa bastante menos.
+    # Antes de 1970 el instante es negativo y el OR pisaría los bits del médico; esas
+    # fechas (raras) usan una tupla, que nunca choca con las claves enteras.
+    instante = int(fecha_hora.timestamp())
+    if instante < 0:
+        return (medico_id, instante)
+    return (medico_id << 34) | instante
+
+
+def _fecha_hora(valor):
+    for formato in FORMATOS_FECHA_HORA:
+        try:
+            fecha_hora = datetime.strptime(valor, formato)
+            break
+        except ValueError:
+            continue
+    else:
+        try:
+            fecha_hora = datetime.fromisoformat(valor)
+        except ValueError:
+            raise FilaRechazada("Fecha y hora inválidas (use AAAA-MM-DD HH:MM).")
+    if timezone.is_naive(fecha_hora):
+        fecha_hora = timezone.make_aware(fecha_hora)
+    return fecha_hora
+
+
+class ImportadorCitas:
+
+    def __init__(self, rechazos, lote=TAMANO_LOTE, simular=False):
+        from usuario.models import Usuario
+        from .models import Cita, Especialidad
+
+        self.lote = lote
+        self.simular = simular
+        self.rechazos = rechazos
+        self.escritor_rechazos = None
+        self.estados = {valor for valor, _ in Cita.EstadoCita.choices}
+
+        # Mapas de búsqueda: correo y RUT -> (id, rol, especialidad del médico).
+        self.usuarios = {}
+        consulta = Usuario.objects.values_list('id', 'email', 'rut', 'role', 'especialidad_id')
+        for id, email, rut, rol, especialidad_id in consulta.iterator(chunk_size=10000):
+            datos = (id, rol, especialidad_id)
+            self.usuarios[email.lower()] = datos
+            if rut:
+                self.usuarios[limpiar_rut(rut)] = datos
+        self.especialidades = {nombre.lower(): id for id, nombre in Especialidad.objects.values_list('id', 'nombre')}
+
+        # Horarios ya tomados por filas aceptadas de este archivo.
+        self.ocupados = set()
+        self.sellos = set()
+
+    def _usuario(self, valor, columna):
+        datos = self.usuarios.get(valor.lower()) or self.usuarios.get(limpiar_rut(valor))
+        if datos is None:
+            raise FilaRechazada(f"No existe el usuario de la columna '{columna}': {valor}.")
+        return datos
+
+    def _cita(self, fila):
+        """Valida y resuelve una fila. Devuelve (Cita, Diagnostico o None), sin guardar."""
+        from usuario.models import Usuario
+        from .models import Cita, Diagnostico
+
+        faltantes = [columna for columna in COLUMNAS_OBLIGATORIAS if not fila.get(columna)]
+        if faltantes:
+            raise FilaRechazada(f"Faltan datos obligatorios: {', '.join(faltantes)}.")
+
+        paciente_id, _, _ = self._usuario(fila['paciente'], 'paciente')
+        medico_id, rol, especialidad_medico = self._usuario(fila['medico'], 'medico')
+        if rol != Usuario.Role.MEDICO:
+            raise FilaRechazada(f"El usuario {fila['medico']} no es médico.")
+
+        if fila.get('especialidad'):
+            especialidad_id = self.especialidades.get(fila['especialidad'].lower())
+            if especialidad_id is None:
+                raise FilaRechazada(f"No existe la especialidad {fila['especialidad']}.")
+        else:
+            especialidad_id = especialidad_medico
+            if especialidad_id is None:
+                raise FilaRechazada("El médico no tiene especialidad; indíquela en la columna 'especialidad'.")
+
+        fecha_hora = _fecha_hora(fila['fecha_hora'])
+        estado = fila.get('estado', '').upper()
+        if not estado:
+            estado = Cita.EstadoCita.COMPLETADA if fecha_hora < timezone.now() else Cita.EstadoCita.RESERVADA
+        elif estado not in self.estados:
+            raise FilaRechazada(f"Estado inválido: {estado}.")
+
+        cita = Cita(
+            paciente_id=paciente_id, medico_id=medico_id, especialidad_id=especialidad_id,
+            fecha_hora=fecha_hora, motivo=fila.get('motivo', ''), estado=estado,
+        )
+        diagnostico = None
+        if fila.get('diagnostico_titulo'):
+            diagnostico = Diagnostico(
+                titulo=fila['diagnostico_titulo'][:200],
+                descripcion=fila.get('diagnostico_descripcion') or fila['diagnostico_titulo'],
+            )
+        return cita, diagnostico
+
+    def _rechazar(self, numero, fila, motivo):
+        if self.escritor_rechazos is None:
+            self.escritor_rechazos = csv.writer(self.rechazos)
+            self.escritor_rechazos.writerow(['fila', 'motivo_rechazo', *self.encabezado])
+        self.escritor_rechazos.writerow([numero, motivo, *(fila.get(columna, '') for columna in self.encabezado)])
+
+    def _ocupados_en_base(self, aceptadas):
+        """Horarios del lote que ya están tomados en la base: {clave: paciente_id}."""
+        from .models import Cita, CitaArchivada
+
+        medicos = {cita.medico_id for _, _, cita, _ in aceptadas}
+        fechas = {cita.fecha_hora for _, _, cita, _ in aceptadas}
+        ocupados = {}
+        for modelo in (Cita, CitaArchivada):
+            existentes = modelo.objects.filter(medico_id__in=medicos, fecha_hora__in=fechas).values_list(
+                'medico_id', 'fecha_hora', 'paciente_id'
+            )
+            for medico_id, fecha_hora, paciente_id in existentes:
+                ocupados[_clave_horario(medico_id, fecha_hora)] = paciente_id
+        return ocupados
+
+    def _guardar(self, aceptadas):
+        """
+        Inserta el lote (citas y diagnósticos en una sola transacción).
+        Devuelve (citas creadas, diagnósticos creados, [(numero, fila, motivo)]).
+        """
+        from .models import Cita, Diagnostico
+
+        with transaction.atomic():
+            rechazadas = []
+            try:
+                with transaction.atomic():
+                    Cita.objects.bulk_create([cita for _, _, cita, _ in aceptadas])
+            except IntegrityError:
+                # Alguien reservó uno de estos horarios entre la revisión y el INSERT.
+                for numero, fila, cita, _ in aceptadas:
+                    try:
+                        with transaction.atomic():
+                            cita.save(force_insert=True)
+                    except IntegrityError as error:
+                        # No siempre es el horario (p. ej. una FK borrada mientras tanto): se informa el error real.
+                        rechazadas.append((numero, fila, f"No se pudo guardar la cita: {error}"))
+
+            numeros_rechazados = {numero for numero, _, _ in rechazadas}
+            guardadas = [
+                (cita, diagnostico) for numero, _, cita, diagnostico in aceptadas if numero not in numeros_rechazados
+            ]
+            if any(cita.pk is None for cita, _ in guardadas):
+                # El backend no devuelve los ids de un INSERT múltiple (MySQL): se buscan por la clave única.
+                ids = {
+                    _clave_horario(medico_id, fecha_hora): id
+                    for id, medico_id, fecha_hora in Cita.objects.filter(
+                        medico_id__in={cita.medico_id for cita, _ in guardadas},
+                        fecha_hora__in={cita.fecha_hora for cita, _ in guardadas},
+                    ).values_list('id', 'medico_id', 'fecha_hora')
+                }
+                for cita, _ in guardadas:
+                    cita.pk = ids[_clave_horario(cita.medico_id, cita.fecha_hora)]
+
+            diagnosticos = []
+            for cita, diagnostico in guardadas:
+                if diagnostico is not None:
+                    diagnostico.cita_id = cita.pk
+                    diagnosticos.append(diagnostico)
+            Diagnostico.objects.bulk_create(diagnosticos)
+
+        ahora = timezone.now()
+        futuras = [(c.medico_id, c.especialidad_id, c.fecha_hora) for c, _ in guardadas if c.fecha_hora > ahora]
+        self.sellos |= versiones.claves_citas(futuras)
+        self.sellos |= {versiones.clave_paciente(cita.paciente_id) for cita, _ in guardadas}
+        pacientes_medico.actualizar_despues(*{(cita.medico_id, cita.paciente_id) for cita, _ in guardadas})
+        estadisticas.invalidar(*{usuario_id for cita, _ in guardadas for usuario_id in (cita.paciente_id, cita.medico_id)})
+        return len(guardadas), len(diagnosticos), rechazadas
+
+    def _procesar_lote(self, bloque):
+        aceptadas = []
+        rechazadas = 0
+        for numero, fila in bloque:
+            try:
+                cita, diagnostico = self._cita(fila)
+            except FilaRechazada as error:
+                self._rechazar(numero, fila, str(error))
+                rechazadas += 1
+                continue
+            clave = _clave_horario(cita.medico_id, cita.fecha_hora)
+            if clave in self.ocupados:
+                self._rechazar(numero, fila, "Choca con otra fila del archivo (mismo médico y hora).")
+                rechazadas += 1
+                continue
+            self.ocupados.add(clave)
+            aceptadas.append((numero, fila, cita, diagnostico))
+
+        if aceptadas:
+            en_base = self._ocupados_en_base(aceptadas)
+            libres = []
+            for aceptada in aceptadas:
+                _, fila, cita, _ = aceptada
+                paciente_existente = en_base.get(_clave_horario(cita.medico_id, cita.fecha_hora))
+                if paciente_existente is None:
+                    libres.append(aceptada)
+                    continue
+                motivo = (
+                    "Ya importada (misma cita)." if paciente_existente == cita.paciente_id
+                    else "El médico ya tiene una cita a esa hora."
+                )
+                self._rechazar(aceptada[0], fila, motivo)
+                rechazadas += 1
+            aceptadas = libres
+
+        if self.simular or not aceptadas:
+            return len(aceptadas) if self.simular else 0, 0, rechazadas
+
+        creadas, diagnosticos, rechazos_insercion = self._guardar(aceptadas)
+        for numero, fila, motivo in rechazos_insercion:
+            self._rechazar(numero, fila, motivo)
+        return creadas, diagnosticos, rechazadas + len(rechazos_insercion)
+
+    def procesar(self, archivo, al_avanzar=None):
+        muestra = archivo.readline()
+        dialecto = csv.Sniffer().sniff(muestra, delimiters=',;')
+        self.encabezado = [columna.strip().lower() for columna in next(csv.reader([muestra], dialecto))]
+        faltantes = [columna for columna in COLUMNAS_OBLIGATORIAS if columna not in self.encabezado]
+        if faltantes:
+            raise ValueError(f"Faltan columnas obligatorias en el encabezado: {', '.join(faltantes)}.")
+
+        lector = csv.DictReader(archivo, fieldnames=self.encabezado, dialect=dialecto)
+        filas = (
+            (numero, {clave: (valor or '').strip() for clave, valor in fila.items() if clave})
+            for numero, fila in enumerate(lector, start=2)
+        )
+        leidas = creadas = diagnosticos = rechazadas = 0
+        while True:
+            bloque = list(islice(filas, self.lote))
+            if not bloque:
+                break
+            resultado = self._procesar_lote(bloque)
+            leidas += len(bloque)
+            creadas += resultado[0]
+            diagnosticos += resultado[1]
+            rechazadas += resultado[2]
+            if al_avanzar:
+                al_avanzar(Resumen(leidas, creadas, diagnosticos, rechazadas))
+
+        if creadas and not self.simular:
+            if self.sellos:
+                versiones.incrementar(*self.sellos)
+            encolar('paneladmin.tareas.precalcular_reportes', unica=True)
+        return Resumen(leidas, creadas, diagnosticos, rechazadas)
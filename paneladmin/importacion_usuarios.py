@@ -0,0 +1,313 @@
+"""
+Importación masiva de médicos y pacientes desde un CSV.
+
+Columnas (la primera fila es el encabezado; separador coma o punto y coma):
+
+    nombre, apellido, email                      obligatorias
+    rut, fecha_nacimiento, telefono              opcionales, con las mismas
+                                                 validaciones que el registro
+    rol                                          USUARIO (por defecto) o MEDICO
+    especialidad                                 nombre; obligatoria para MEDICO
+    password                                     opcional; sin ella la cuenta
+                                                 queda sin contraseña utilizable
+
+El archivo se procesa por lotes de TAMANO_LOTE filas:
+
+1. Se validan las filas en el proceso principal (un par de consultas por lote
+   para detectar correos y RUT ya registrados).
+2. Las contraseñas se cifran en un pool de procesos: el hash (PBKDF2) es lo que
+   domina el costo y no libera el GIL.
+3. Los usuarios válidos se insertan con bulk_create y, en la misma transacción,
+   se avanza ImportacionUsuarios.filas_procesadas. Si el proceso se corta, se
+   reanuda desde la última fila confirmada.
+
+Las filas rechazadas se escriben, con su número y el motivo, en un CSV de
+errores junto al archivo importado, una vez confirmado el avance del lote.
+"""
+import csv
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date, datetime
+from itertools import islice
+from typing import NamedTuple
+
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.password_validation import validate_password
+from django.core.exceptions import ValidationError
+from django.core.validators import validate_email
+from django.db import IntegrityError, connections, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from usuario.models import Usuario
+from usuario.validadores import normalizar_rut, validar_mayor_de_edad, validar_rut, validar_telefono
+from . import versiones
+
+TAMANO_LOTE = 1000
+
+# Segundos de trabajo por ejecución de la tarea `importar_usuarios`.
+TIEMPO_POR_EJECUCION = 5 * 60
+
+COLUMNAS_OBLIGATORIAS = ('nombre', 'apellido', 'email')
+
+FORMATOS_FECHA = ('%Y-%m-%d', '%d-%m-%Y', '%d/%m/%Y')
+
+ROLES = {
+    '': Usuario.Role.USUARIO,
+    'USUARIO': Usuario.Role.USUARIO,
+    'PACIENTE': Usuario.Role.USUARIO,
+    'MEDICO': Usuario.Role.MEDICO,
+    'MÉDICO': Usuario.Role.MEDICO,
+}
+
+
+class ErrorFila(NamedTuple):
+    fila: int
+    email: str
+    error: str
+
+
+def directorio_importaciones():
+    return getattr(settings, 'VITALLIFE_DIRECTORIO_IMPORTACIONES', os.path.join(settings.BASE_DIR, 'importaciones'))
+
+
+def procesos_por_defecto():
+    return getattr(settings, 'VITALLIFE_PROCESOS_IMPORTACION', None) or os.cpu_count() or 1
+
+
+def _inicializar_proceso():
+    # Con 'spawn' o 'forkserver' el proceso hijo parte sin Django configurado.
+    import django
+    from django.apps import apps
+
+    if not apps.ready:
+        django.setup()
+
+
+def leer_filas(archivo, desde=0):
+    """Itera (número de fila en el archivo, fila) saltándose las `desde` primeras filas de datos."""
+    muestra = archivo.readline()
+    dialecto = csv.Sniffer().sniff(muestra, delimiters=',;')
+    encabezado = [columna.strip().lower() for columna in next(csv.reader([muestra], dialecto))]
+    faltantes = [columna for columna in COLUMNAS_OBLIGATORIAS if columna not in encabezado]
+    if faltantes:
+        raise ValueError(f"Faltan columnas obligatorias en el encabezado: {', '.join(faltantes)}.")
+
+    lector = csv.DictReader(archivo, fieldnames=encabezado, dialect=dialecto)
+    # La fila 1 es el encabezado.
+    for numero, fila in islice(enumerate(lector, start=2), desde, None):
+        yield numero, {clave: (valor or '').strip() for clave, valor in fila.items() if clave}
+
+
+def _fecha(valor):
+    for formato in FORMATOS_FECHA:
+        try:
+            return datetime.strptime(valor, formato).date()
+        except ValueError:
+            continue
+    raise ValidationError("Fecha de nacimiento inválida (use AAAA-MM-DD o DD-MM-AAAA).")
+
+
+class Validador:
+    """Valida filas del CSV y arma los Usuario (todavía sin contraseña cifrada)."""
+
+    def __init__(self):
+        from .models import Especialidad
+
+        self.especialidades = {nombre.lower(): id for id, nombre in Especialidad.objects.values_list('id', 'nombre')}
+        self.emails = set()
+        self.ruts = set()
+        self.hoy = date.today()
+
+    def _usuario(self, fila):
+        faltantes = [columna for columna in COLUMNAS_OBLIGATORIAS if not fila.get(columna)]
+        if faltantes:
+            raise ValidationError(f"Faltan datos obligatorios: {', '.join(faltantes)}.")
+
+        email = Usuario.objects.normalize_email(fila['email'])
+        validate_email(email)
+        if email.lower() in self.emails:
+            raise ValidationError("El correo está repetido en el archivo.")
+
+        rut = fila.get('rut', '')
+        if rut:
+            validar_rut(rut)
+            rut = normalizar_rut(rut)
+            if rut in self.ruts:
+                raise ValidationError("El RUT está repetido en el archivo.")
+
+        telefono = fila.get('telefono', '')
+        if telefono:
+            validar_telefono(telefono)
+
+        fecha_nacimiento = None
+        if fila.get('fecha_nacimiento'):
+            fecha_nacimiento = _fecha(fila['fecha_nacimiento'])
+            validar_mayor_de_edad(fecha_nacimiento, self.hoy)
+
+        rol = ROLES.get(fila.get('rol', '').upper())
+        if rol is None:
+            raise ValidationError("Rol inválido (use USUARIO o MEDICO).")
+        especialidad_id = None
+        if rol == Usuario.Role.MEDICO:
+            especialidad_id = self.especialidades.get(fila.get('especialidad', '').lower())
+            if especialidad_id is None:
+                raise ValidationError("Los médicos necesitan una especialidad existente.")
+
+        usuario = Usuario(
+            email=email, nombre=fila['nombre'], apellido=fila['apellido'], rut=rut or None,
+            telefono=telefono, fecha_nacimiento=fecha_nacimiento, role=rol, especialidad_id=especialidad_id,
+        )
+        if fila.get('password'):
+            validate_password(fila['password'], usuario)
+        return usuario
+
+    def validar_lote(self, filas):
+        """Devuelve ([(numero, usuario, password)], [ErrorFila])."""
+        validos, errores = [], []
+        for numero, fila in filas:
+            try:
+                usuario = self._usuario(fila)
+            except ValidationError as error:
+                errores.append(ErrorFila(numero, fila.get('email', ''), ' '.join(error.messages)))
+                continue
+            self.emails.add(usuario.email.lower())
+            if usuario.rut:
+                self.ruts.add(usuario.rut)
+            validos.append((numero, usuario, fila.get('password', '')))
+
+        # Ya registrados en la base (dos consultas por lote).
+        emails = set(Usuario.objects.filter(email__in=[u.email for _, u, _ in validos]).values_list('email', flat=True))
+        ruts = set(Usuario.objects.filter(rut__in=[u.rut for _, u, _ in validos if u.rut]).values_list('rut', flat=True))
+        nuevos = []
+        for numero, usuario, password in validos:
+            if usuario.email in emails:
+                errores.append(ErrorFila(numero, usuario.email, "Ya existe un usuario con este correo."))
+            elif usuario.rut in ruts:
+                errores.append(ErrorFila(numero, usuario.email, "Ya existe un usuario con este RUT."))
+            else:
+                nuevos.append((numero, usuario, password))
+        return nuevos, errores
+
+
+def cifrar_contrasenas(passwords, pool=None, procesos=1):
+    """Hash de cada contraseña; las vacías quedan como contraseña no utilizable."""
+    con_valor = [password for password in passwords if password]
+    if pool is not None and con_valor:
+        # Unos cuatro trozos por proceso: reparte bien sin un viaje por contraseña.
+        cifradas = iter(pool.map(make_password, con_valor, chunksize=max(1, len(con_valor) // (procesos * 4))))
+    else:
+        cifradas = iter(map(make_password, con_valor))
+    return [next(cifradas) if password else make_password(None) for password in passwords]
+
+
+def _insertar(nuevos):
+    """bulk_create del lote; si alguien registró un correo o RUT entremedio, fila por fila."""
+    usuarios = [usuario for _, usuario, _ in nuevos]
+    try:
+        with transaction.atomic():
+            Usuario.objects.bulk_create(usuarios)
+        return len(usuarios), []
+    except IntegrityError:
+        pass
+
+    creados, errores = 0, []
+    for numero, usuario, _ in nuevos:
+        try:
+            with transaction.atomic():
+                usuario.save(force_insert=True)
+            creados += 1
+        except IntegrityError:
+            errores.append(ErrorFila(numero, usuario.email, "Ya existe un usuario con este correo o RUT."))
+    return creados, errores
+
+
+def _escribir_errores(ruta, errores):
+    nuevo = not os.path.exists(ruta)
+    with open(ruta, 'a', newline='', encoding='utf-8') as salida:
+        escritor = csv.writer(salida)
+        if nuevo:
+            escritor.writerow(['fila', 'email', 'error'])
+        escritor.writerows(sorted(errores))
+
+
+def crear(ruta, nombre_archivo=None, solicitada_por=None):
+    from .models import ImportacionUsuarios
+
+    importacion = ImportacionUsuarios.objects.create(
+        nombre_archivo=nombre_archivo or os.path.basename(ruta), ruta=ruta, solicitada_por=solicitada_por,
+    )
+    base, _ = os.path.splitext(ruta)
+    importacion.ruta_errores = f'{base}.errores.csv'
+    importacion.save(update_fields=['ruta_errores'])
+    return importacion
+
+
+def procesar(importacion_id, procesos=None, lote=TAMANO_LOTE, tiempo=None, al_avanzar=None):
+    """
+    Procesa la importación desde su última fila confirmada. Con `tiempo` (en
+    segundos) se detiene al completar el lote en que se cumple y devuelve False;
+    devuelve True al terminar el archivo.
+    """
+    from .models import ImportacionUsuarios
+
+    importacion = ImportacionUsuarios.objects.get(id=importacion_id)
+    if importacion.estado == ImportacionUsuarios.Estado.COMPLETADA:
+        return True
+    ImportacionUsuarios.objects.filter(id=importacion_id).update(estado=ImportacionUsuarios.Estado.EN_CURSO)
+
+    procesos = procesos or procesos_por_defecto()
+    limite = time.monotonic() + tiempo if tiempo else None
+    validador = Validador()
+    pool = None
+    if procesos > 1:
+        # Los procesos hijos no usan la base; no deben heredar las conexiones.
+        connections.close_all()
+        pool = ProcessPoolExecutor(max_workers=procesos, initializer=_inicializar_proceso)
+    try:
+        with open(importacion.ruta, newline='', encoding='utf-8-sig') as archivo:
+            filas = leer_filas(archivo, importacion.filas_procesadas)
+            while True:
+                bloque = list(islice(filas, lote))
+                if not bloque:
+                    break
+                nuevos, errores = validador.validar_lote(bloque)
+                cifradas = cifrar_contrasenas([password for _, _, password in nuevos], pool, procesos)
+                for (_, usuario, _), cifrada in zip(nuevos, cifradas):
+                    usuario.password = cifrada
+
+                with transaction.atomic():
+                    creados, errores_insercion = _insertar(nuevos)
+                    errores += errores_insercion
+                    if errores:
+                        # Recién confirmado el avance: si el proceso se corta antes, el lote
+                        # se vuelve a procesar y sus filas no deben quedar dos veces.
+                        transaction.on_commit(
+                            lambda errores=errores: _escribir_errores(importacion.ruta_errores, errores)
+                        )
+                    ImportacionUsuarios.objects.filter(id=importacion_id).update(
+                        filas_procesadas=F('filas_procesadas') + len(bloque),
+                        creados=F('creados') + creados,
+                        con_errores=F('con_errores') + len(errores),
+                    )
+                    if any(usuario.role == Usuario.Role.MEDICO for _, usuario, _ in nuevos):
+                        transaction.on_commit(lambda: versiones.incrementar(versiones.CLAVE_CATALOGO))
+                if al_avanzar:
+                    al_avanzar(ImportacionUsuarios.objects.get(id=importacion_id))
+                if limite and time.monotonic() > limite:
+                    return False
+    except (OSError, UnicodeDecodeError, ValueError, csv.Error) as error:
+        ImportacionUsuarios.objects.filter(id=importacion_id).update(
+            estado=ImportacionUsuarios.Estado.FALLIDA, ultimo_error=str(error), fecha_fin=timezone.now(),
+        )
+        raise
+    finally:
+        if pool is not None:
+            pool.shutdown()
+
+    ImportacionUsuarios.objects.filter(id=importacion_id).update(
+        estado=ImportacionUsuarios.Estado.COMPLETADA, fecha_fin=timezone.now(),
+    )
+    return True
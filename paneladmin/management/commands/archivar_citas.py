@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from paneladmin import archivo_citas
+
+
+class Command(BaseCommand):
+    help = (
+        "Mueve al archivo histórico las citas cerradas más antiguas que el horizonte "
+        "(VITALLIFE_HORIZONTE_ARCHIVO_DIAS). Pensado para cron; se puede interrumpir y volver a ejecutar."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dias', type=int, default=None,
+            help="Antigüedad mínima en días (por defecto, VITALLIFE_HORIZONTE_ARCHIVO_DIAS).",
+        )
+        parser.add_argument('--lote', type=int, default=archivo_citas.TAMANO_LOTE, help="Citas por transacción.")
+        parser.add_argument('--dry-run', action='store_true', help="Solo informa cuántas se archivarían.")
+
+    def handle(self, *args, **options):
+        dias = options['dias'] or archivo_citas.horizonte_dias()
+        if dias < archivo_citas.HORIZONTE_MINIMO_DIAS:
+            raise CommandError(f"El horizonte debe ser de al menos {archivo_citas.HORIZONTE_MINIMO_DIAS} días.")
+        if options['dry_run']:
+            self.stdout.write(f"[simulación] Citas por archivar: {archivo_citas.pendientes(dias)}.")
+            return
+        total = archivo_citas.archivar(dias, lote=options['lote'])
+        self.stdout.write(self.style.SUCCESS(f"Citas archivadas: {total}."))
@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+
+from paneladmin import cierre_citas
+
+
+class Command(BaseCommand):
+    help = (
+        "Marca como completadas las citas reservadas cuyo horario ya terminó. "
+        "Pensado para cron (p. ej. cada hora); se puede interrumpir y volver a ejecutar."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lote', type=int, default=cierre_citas.TAMANO_LOTE, help="Citas por UPDATE.")
+        parser.add_argument('--dry-run', action='store_true', help="Solo informa cuántas se cerrarían.")
+
+    def handle(self, *args, **options):
+        if options['dry_run']:
+            self.stdout.write(f"[simulación] Citas por completar: {cierre_citas.pendientes()}.")
+            return
+        total = cierre_citas.completar_vencidas(lote=options['lote'])
+        self.stdout.write(self.style.SUCCESS(f"Citas completadas: {total}."))
@@ -0,0 +1,79 @@
+import os
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import F
+
+from paneladmin.almacenamiento import (
+    almacenamiento_deduplicado, es_nombre_direccionado, hash_archivo, modelos_deduplicados, nombre_direccionado,
+)
+from paneladmin.models import ArchivoMedia
+
+
+class Command(BaseCommand):
+    help = (
+        "Migra los archivos subidos existentes al almacenamiento direccionado por contenido: "
+        "los duplicados pasan a compartir un único archivo."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help="Solo informa lo que haría.")
+
+    def handle(self, *args, **options):
+        dry_run = options['dry_run']
+        migrados = duplicados = faltantes = 0
+        bytes_liberados = 0
+
+        for modelo, campos in modelos_deduplicados():
+            for campo in campos:
+                nombres = (
+                    modelo.objects.exclude(**{campo: ''}).exclude(**{f'{campo}__isnull': True})
+                    .values_list(campo, flat=True).distinct()
+                )
+                for nombre in list(nombres):
+                    if es_nombre_direccionado(nombre):
+                        continue
+                    ruta = almacenamiento_deduplicado.path(nombre)
+                    if not os.path.exists(ruta):
+                        faltantes += 1
+                        self.stderr.write(f"No existe en disco: {nombre}")
+                        continue
+
+                    tamano = os.path.getsize(ruta)
+                    nuevo = nombre_direccionado(nombre, hash_archivo(ruta))
+                    ruta_nueva = almacenamiento_deduplicado.path(nuevo)
+                    ya_existia = os.path.exists(ruta_nueva)
+                    if ya_existia:
+                        duplicados += 1
+                        bytes_liberados += tamano
+                    migrados += 1
+                    self.stdout.write(f"{modelo.__name__}.{campo}: {nombre} -> {nuevo}{' (duplicado)' if ya_existia else ''}")
+                    if dry_run:
+                        continue
+
+                    # Primero dejamos el archivo en su ruta nueva (enlace duro si se puede),
+                    # luego apuntamos las filas y recién al final borramos la ruta antigua.
+                    if not ya_existia:
+                        os.makedirs(os.path.dirname(ruta_nueva), exist_ok=True)
+                        try:
+                            os.link(ruta, ruta_nueva)
+                        except OSError:
+                            with open(ruta, 'rb') as origen, open(ruta_nueva, 'wb') as destino:
+                                for bloque in iter(lambda: origen.read(64 * 1024), b''):
+                                    destino.write(bloque)
+                    with transaction.atomic():
+                        filas = modelo.objects.filter(**{campo: nombre}).update(**{campo: nuevo})
+                        archivo, _ = ArchivoMedia.objects.select_for_update().get_or_create(
+                            nombre=nuevo, defaults={'sha256': os.path.basename(nuevo).split('.')[0], 'tamano': tamano}
+                        )
+                        ArchivoMedia.objects.filter(pk=archivo.pk).update(referencias=F('referencias') + filas)
+                    os.remove(ruta)
+
+        resumen = (
+            f"Archivos migrados: {migrados}. Duplicados unificados: {duplicados} "
+            f"({bytes_liberados / (1024 * 1024):.1f} MB). Faltantes: {faltantes}."
+        )
+        if dry_run:
+            resumen = "[simulación] " + resumen
+        self.stdout.write(self.style.SUCCESS(resumen))
+        self.stdout.write("Ejecuta 'manage.py recolectar_media' para borrar los archivos que quedaron sin uso.")
@@ -0,0 +1,29 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from paneladmin import notificaciones
+
+
+class Command(BaseCommand):
+    help = (
+        "Envía los correos pendientes de la bandeja de salida. Normalmente lo hace "
+        "la cola de tareas; este comando sirve para cron o para vaciarla a mano."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lote', type=int, default=notificaciones.TAMANO_LOTE, help="Correos por lote.")
+        parser.add_argument(
+            '--continuo', action='store_true',
+            help="Sigue revisando la bandeja cada --intervalo segundos en vez de terminar.",
+        )
+        parser.add_argument('--intervalo', type=float, default=5.0)
+
+    def handle(self, *args, **options):
+        while True:
+            enviadas, fallidas = notificaciones.despachar_pendientes(options['lote'])
+            if enviadas or fallidas or not options['continuo']:
+                self.stdout.write(f"Enviadas: {enviadas}. Con error (se reintentarán): {fallidas}.")
+            if not options['continuo']:
+                return
+            time.sleep(options['intervalo'])
@@ -0,0 +1,36 @@
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+
+from paneladmin import recordatorios
+
+
+class Command(BaseCommand):
+    help = (
+        "Genera los recordatorios de citas (24 h y 2 h antes) y los deja en la bandeja "
+        "de salida. Pensado para ejecutarse desde cron cada 5 a 10 minutos."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--tolerancia', type=int, default=int(recordatorios.TOLERANCIA.total_seconds() // 60),
+            help="Minutos de atraso con que todavía se envía un recordatorio.",
+        )
+        parser.add_argument('--tramo', type=int, default=recordatorios.TAMANO_TRAMO, help="Citas por tramo.")
+        parser.add_argument(
+            '--continuo', action='store_true',
+            help="Repite la pasada cada --intervalo minutos en vez de terminar.",
+        )
+        parser.add_argument('--intervalo', type=float, default=5.0)
+
+    def handle(self, *args, **options):
+        while True:
+            generados = recordatorios.generar(
+                tolerancia=timedelta(minutes=options['tolerancia']), tamano=options['tramo']
+            )
+            resumen = ", ".join(f"{tipo}: {cantidad}" for tipo, cantidad in generados.items())
+            self.stdout.write(f"Recordatorios generados ({resumen}).")
+            if not options['continuo']:
+                return
+            time.sleep(options['intervalo'] * 60)
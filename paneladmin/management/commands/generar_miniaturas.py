@@ -0,0 +1,55 @@
+from django.core.management.base import BaseCommand
+from django.core.files.storage import default_storage
+from PIL import Image, UnidentifiedImageError
+
+from paneladmin import miniaturas
+from paneladmin.models import Especialidad
+from usuario.models import Usuario
+
+
+class Command(BaseCommand):
+    help = "Genera las miniaturas y versiones WebP de fotos de perfil e imágenes de especialidades."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--formatos', nargs='+', default=['webp'], choices=list(miniaturas.FORMATOS),
+            help="Formatos a generar (por defecto solo webp).",
+        )
+        parser.add_argument(
+            '--todas', action='store_true',
+            help="Regenera también los derivados que ya existen.",
+        )
+
+    def handle(self, *args, **options):
+        nombres = set(
+            Usuario.objects.exclude(foto_perfil='').exclude(foto_perfil__isnull=True)
+            .values_list('foto_perfil', flat=True)
+        )
+        nombres.update(Especialidad.objects.exclude(imagen='').values_list('imagen', flat=True))
+
+        generados = omitidos = errores = 0
+        for nombre in sorted(nombres):
+            pendientes = [
+                (tamano, formato)
+                for tamano in miniaturas.TAMANOS
+                for formato in options['formatos']
+                if options['todas'] or not default_storage.exists(miniaturas.ruta_derivado(nombre, tamano, formato))
+            ]
+            if not pendientes:
+                omitidos += 1
+                continue
+            try:
+                # Abrimos el original una sola vez para todos los derivados pendientes.
+                with default_storage.open(nombre, 'rb') as original:
+                    imagen = Image.open(original)
+                    imagen.load()
+                for tamano, formato in pendientes:
+                    miniaturas.generar_derivado(nombre, tamano, formato, imagen=imagen)
+                generados += 1
+            except (OSError, UnidentifiedImageError) as e:
+                errores += 1
+                self.stderr.write(f"{nombre}: {e}")
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Imágenes procesadas: {generados}. Ya al día: {omitidos}. Con errores: {errores}."
+        ))
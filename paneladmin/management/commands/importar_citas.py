@@ -0,0 +1,50 @@
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+
+from paneladmin import importacion_citas
+
+
+class Command(BaseCommand):
+    help = (
+        "Importa citas (con su diagnóstico) desde un CSV del sistema anterior. "
+        "Las filas con datos inválidos o choques de horario van al archivo de rechazos."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('archivo', help="Ruta del CSV a importar.")
+        parser.add_argument('--rechazos', help="Archivo de rechazos (por defecto, <archivo>.rechazos.csv).")
+        parser.add_argument('--lote', type=int, default=importacion_citas.TAMANO_LOTE, help="Filas por transacción.")
+        parser.add_argument('--dry-run', action='store_true', help="Valida y detecta choques sin escribir en la base.")
+
+    def handle(self, *args, **options):
+        ruta = options['archivo']
+        if not os.path.isfile(ruta):
+            raise CommandError(f"No existe el archivo {ruta}.")
+        ruta_rechazos = options['rechazos'] or f'{os.path.splitext(ruta)[0]}.rechazos.csv'
+        prefijo = "[simulación] " if options['dry_run'] else ""
+
+        def al_avanzar(resumen):
+            self.stdout.write(
+                f"  {prefijo}{resumen.leidas} filas: {resumen.creadas} citas, "
+                f"{resumen.diagnosticos} diagnósticos, {resumen.rechazadas} rechazadas."
+            )
+
+        try:
+            with open(ruta, newline='', encoding='utf-8-sig') as archivo, \
+                    open(ruta_rechazos, 'w', newline='', encoding='utf-8') as rechazos:
+                importador = importacion_citas.ImportadorCitas(
+                    rechazos, lote=options['lote'], simular=options['dry_run']
+                )
+                resumen = importador.procesar(archivo, al_avanzar=al_avanzar)
+        except (UnicodeDecodeError, ValueError) as error:
+            raise CommandError(f"No se pudo leer el archivo: {error}")
+
+        self.stdout.write(self.style.SUCCESS(
+            f"{prefijo}Citas {'por importar' if options['dry_run'] else 'importadas'}: {resumen.creadas} "
+            f"({resumen.diagnosticos} con diagnóstico). Filas rechazadas: {resumen.rechazadas}."
+        ))
+        if resumen.rechazadas:
+            self.stdout.write(f"Detalle en {ruta_rechazos}.")
+        else:
+            os.remove(ruta_rechazos)
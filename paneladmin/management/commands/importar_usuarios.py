@@ -0,0 +1,57 @@
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+
+from paneladmin import importacion_usuarios
+from paneladmin.models import ImportacionUsuarios
+
+
+class Command(BaseCommand):
+    help = (
+        "Importa médicos y pacientes desde un CSV (ver paneladmin.importacion_usuarios). "
+        "Si se interrumpe, se retoma con --reanudar <id>."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('archivo', nargs='?', help="Ruta del CSV a importar.")
+        parser.add_argument('--reanudar', type=int, metavar='ID', help="Retoma una importación anterior.")
+        parser.add_argument(
+            '--procesos', type=int, default=None,
+            help="Procesos para cifrar contraseñas (por defecto, VITALLIFE_PROCESOS_IMPORTACION o los núcleos).",
+        )
+        parser.add_argument('--lote', type=int, default=importacion_usuarios.TAMANO_LOTE, help="Filas por lote.")
+
+    def handle(self, *args, **options):
+        if options['reanudar']:
+            try:
+                importacion = ImportacionUsuarios.objects.get(id=options['reanudar'])
+            except ImportacionUsuarios.DoesNotExist:
+                raise CommandError(f"No existe la importación {options['reanudar']}.")
+            self.stdout.write(f"Reanudando '{importacion.nombre_archivo}' desde la fila de datos {importacion.filas_procesadas + 1}.")
+        elif options['archivo']:
+            ruta = os.path.abspath(options['archivo'])
+            if not os.path.isfile(ruta):
+                raise CommandError(f"No existe el archivo {ruta}.")
+            importacion = importacion_usuarios.crear(ruta)
+            self.stdout.write(f"Importación {importacion.id} creada (para retomarla: --reanudar {importacion.id}).")
+        else:
+            raise CommandError("Indica el archivo a importar o --reanudar <id>.")
+
+        def al_avanzar(actual):
+            self.stdout.write(
+                f"  {actual.filas_procesadas} filas: {actual.creados} creados, {actual.con_errores} con errores."
+            )
+
+        try:
+            importacion_usuarios.procesar(
+                importacion.id, procesos=options['procesos'], lote=options['lote'], al_avanzar=al_avanzar,
+            )
+        except (OSError, ValueError) as error:
+            raise CommandError(f"No se pudo leer el archivo: {error}")
+
+        importacion.refresh_from_db()
+        self.stdout.write(self.style.SUCCESS(
+            f"Importación terminada: {importacion.creados} usuarios creados, {importacion.con_errores} filas con errores."
+        ))
+        if importacion.con_errores:
+            self.stdout.write(f"Detalle de los errores en {importacion.ruta_errores}.")
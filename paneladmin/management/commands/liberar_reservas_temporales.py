@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from paneladmin import reservas_temporales
+
+
+class Command(BaseCommand):
+    help = (
+        "Libera las retenciones de horarios vencidas que no recogió su tarea programada. "
+        "Pensado para cron (p. ej. cada 5 minutos)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lote', type=int, default=reservas_temporales.TAMANO_LOTE, help="Filas por transacción.")
+
+    def handle(self, *args, **options):
+        total = reservas_temporales.limpiar_vencidas(lote=options['lote'])
+        self.stdout.write(self.style.SUCCESS(f"Retenciones vencidas liberadas: {total}."))
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from paneladmin import idempotencia
+
+
+class Command(BaseCommand):
+    help = (
+        "Borra las claves de idempotencia vencidas (SolicitudIdempotente). "
+        "Pensado para cron (p. ej. una vez por hora)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lote', type=int, default=idempotencia.TAMANO_LOTE, help="Filas por transacción.")
+
+    def handle(self, *args, **options):
+        total = idempotencia.limpiar_vencidas(lote=options['lote'])
+        self.stdout.write(self.style.SUCCESS(f"Claves de idempotencia borradas: {total}."))
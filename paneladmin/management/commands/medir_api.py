@@ -0,0 +1,96 @@
+import gzip
+import statistics
+import time
+from datetime import date, timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Count
+from django.test import Client
+from django.urls import reverse
+
+from paneladmin import catalogo
+from paneladmin.models import Cita
+from usuario.models import Usuario
+
+
+def _host():
+    # El cliente de pruebas tiene que pasar la validación de ALLOWED_HOSTS.
+    for host in settings.ALLOWED_HOSTS:
+        if host not in ('*', '') and not host.startswith('.'):
+            return host
+    return 'localhost'
+
+
+def _medir(cliente, url, repeticiones, **encabezados):
+    tiempos = []
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        respuesta = cliente.get(url, **encabezados)
+        tiempos.append(time.perf_counter() - inicio)
+    if respuesta.status_code not in (200, 304):
+        raise CommandError(f"{url} respondió {respuesta.status_code}.")
+    return respuesta, statistics.median(tiempos) * 1000
+
+
+class Command(BaseCommand):
+    help = (
+        "Compara la API JSON v1 con las páginas HTML equivalentes: tamaño de la respuesta "
+        "(tal como viaja y sin comprimir) y latencia mediana, más la revalidación con ETag."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--email', help="Paciente con el que se mide (por defecto, el que tiene más citas).")
+        parser.add_argument('--repeticiones', type=int, default=20)
+
+    def _paciente(self, email):
+        if email:
+            paciente = Usuario.objects.filter(email=email).first()
+        else:
+            fila = Cita.objects.values('paciente_id').annotate(total=Count('id')).order_by('-total').first()
+            paciente = Usuario.objects.filter(id=fila['paciente_id']).first() if fila else None
+        if paciente is None:
+            raise CommandError("No hay un paciente con citas para medir.")
+        return paciente
+
+    def _pares(self, paciente):
+        """(nombre, url de la API, url HTML equivalente)."""
+        pares = [('especialidades', reverse('api_v1:especialidades'), reverse('usuario:seleccionar_especialidad'))]
+        especialidades = catalogo.obtener_especialidades()
+        if especialidades:
+            especialidad_id = especialidades[0].id
+            # Próximo día hábil: los fines de semana no hay horarios.
+            fecha = date.today() + timedelta(days=1)
+            while fecha.weekday() >= 5:
+                fecha += timedelta(days=1)
+            consulta = f'?fecha={fecha.isoformat()}'
+            pares.append((
+                'horarios',
+                reverse('api_v1:horarios', args=[especialidad_id]) + consulta,
+                reverse('usuario:seleccionar_horario', args=[especialidad_id]) + consulta,
+            ))
+        pares.append(('historial de citas', reverse('api_v1:citas'), reverse('usuario:perfil')))
+        cita = Cita.objects.filter(paciente=paciente).order_by('-fecha_hora').values_list('id', flat=True).first()
+        if cita is not None:
+            pares.append(('detalle de cita', reverse('api_v1:cita', args=[cita]), reverse('usuario:detalle_cita', args=[cita])))
+        return pares
+
+    def handle(self, *args, **options):
+        paciente = self._paciente(options['email'])
+        repeticiones = options['repeticiones']
+        cliente = Client(SERVER_NAME=_host())
+        cliente.force_login(paciente)
+        self.stdout.write(f"Paciente: {paciente.email}, {repeticiones} repeticiones por URL.\n")
+        self.stdout.write(f"{'recurso':<20} {'formato':<6} {'bytes':>9} {'sin gzip':>9} {'ms':>8} {'304 ms':>8}")
+
+        for nombre, url_api, url_html in self._pares(paciente):
+            html, ms_html = _medir(cliente, url_html, repeticiones)
+            self.stdout.write(f"{nombre:<20} {'HTML':<6} {len(html.content):>9} {len(html.content):>9} {ms_html:>8.1f} {'-':>8}")
+
+            respuesta, ms_api = _medir(cliente, url_api, repeticiones, HTTP_ACCEPT_ENCODING='gzip')
+            contenido = respuesta.content
+            sin_gzip = gzip.decompress(contenido) if respuesta.get('Content-Encoding') == 'gzip' else contenido
+            _, ms_304 = _medir(cliente, url_api, repeticiones, HTTP_IF_NONE_MATCH=respuesta['ETag'])
+            self.stdout.write(
+                f"{'':<20} {'API':<6} {len(contenido):>9} {len(sin_gzip):>9} {ms_api:>8.1f} {ms_304:>8.1f}"
+            )
@@ -0,0 +1,87 @@
+import csv
+import os
+import random
+import tempfile
+import time
+
+from django.core.management.base import BaseCommand
+
+from paneladmin import importacion_usuarios
+from paneladmin.models import ImportacionUsuarios
+from usuario.models import Usuario
+from usuario.validadores import digito_verificador
+
+# Los usuarios de la medición se reconocen (y se borran) por este dominio.
+DOMINIO = 'medicion.vitallife.invalid'
+
+
+def _generar_csv(ruta, filas, semilla):
+    azar = random.Random(semilla)
+    with open(ruta, 'w', newline='', encoding='utf-8') as archivo:
+        escritor = csv.writer(archivo)
+        escritor.writerow(['nombre', 'apellido', 'email', 'rut', 'fecha_nacimiento', 'telefono', 'password'])
+        for i in range(filas):
+            # Cuerpos de RUT altos para no chocar con datos reales.
+            cuerpo = str(90_000_000 + semilla * 1_000_000 + i)
+            escritor.writerow([
+                f'Paciente{i}', 'Medición', f'paciente{semilla}-{i}@{DOMINIO}',
+                f'{cuerpo}-{digito_verificador(cuerpo)}',
+                f'{azar.randint(1940, 2000)}-{azar.randint(1, 12):02d}-{azar.randint(1, 28):02d}',
+                f'9{azar.randint(10_000_000, 99_999_999)}', f'Clave-{azar.getrandbits(48):x}',
+            ])
+
+
+class Command(BaseCommand):
+    help = (
+        "Mide el rendimiento de la importación masiva de usuarios contra el alta uno a uno "
+        "(create_user). Crea usuarios de prueba y los borra al terminar."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--filas', type=int, default=2000, help="Filas del CSV sintético.")
+        parser.add_argument('--muestra', type=int, default=50, help="Altas uno a uno para la línea base.")
+        parser.add_argument(
+            '--procesos', type=int, nargs='+', default=None,
+            help="Cantidades de procesos a medir (por defecto, 1 y los núcleos disponibles).",
+        )
+        parser.add_argument('--lote', type=int, default=importacion_usuarios.TAMANO_LOTE)
+
+    def _limpiar(self):
+        Usuario.objects.filter(email__endswith=f'@{DOMINIO}').delete()
+
+    def _informar(self, nombre, filas, segundos):
+        self.stdout.write(f"{nombre:<32} {filas:>7} filas {segundos:>8.2f} s {filas / segundos:>9.1f} filas/s")
+
+    def handle(self, *args, **options):
+        procesos = options['procesos'] or sorted({1, importacion_usuarios.procesos_por_defecto()})
+        self._limpiar()
+        directorio = tempfile.mkdtemp(prefix='medicion_importacion_')
+        try:
+            ruta = os.path.join(directorio, 'base.csv')
+            _generar_csv(ruta, options['muestra'], semilla=0)
+            with open(ruta, newline='', encoding='utf-8') as archivo:
+                filas = [fila for _, fila in importacion_usuarios.leer_filas(archivo)]
+            inicio = time.perf_counter()
+            for fila in filas:
+                Usuario.objects.create_user(
+                    fila['email'], fila['nombre'], fila['apellido'], password=fila['password'],
+                    rut=fila['rut'], telefono=fila['telefono'], fecha_nacimiento=fila['fecha_nacimiento'],
+                )
+            self._informar("create_user (uno a uno)", len(filas), time.perf_counter() - inicio)
+
+            for semilla, cantidad in enumerate(procesos, start=1):
+                ruta = os.path.join(directorio, f'importacion_{cantidad}.csv')
+                _generar_csv(ruta, options['filas'], semilla=semilla)
+                importacion = importacion_usuarios.crear(ruta)
+                inicio = time.perf_counter()
+                importacion_usuarios.procesar(importacion.id, procesos=cantidad, lote=options['lote'])
+                segundos = time.perf_counter() - inicio
+                importacion.refresh_from_db()
+                self._informar(f"importación, {cantidad} proceso(s)", importacion.creados, segundos)
+                importacion.delete()
+        finally:
+            self._limpiar()
+            ImportacionUsuarios.objects.filter(ruta__startswith=directorio).delete()
+            for nombre in os.listdir(directorio):
+                os.remove(os.path.join(directorio, nombre))
+            os.rmdir(directorio)
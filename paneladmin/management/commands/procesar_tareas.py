@@ -0,0 +1,110 @@
+import multiprocessing
+import signal
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections, connections
+
+from paneladmin import cola
+
+# Cada cuánto, en segundos, un trabajador devuelve a la cola las tareas de otro
+# que murió a mitad de ejecución (cola.recuperar_abandonadas), sin esperar a que
+# se reinicie el comando.
+INTERVALO_RECUPERACION = 60
+
+
+class Trabajador:
+    """Bucle de un proceso trabajador: reclama y ejecuta tareas hasta que se le pida parar."""
+
+    def __init__(self, intervalo, nombres=None, una_vez=False):
+        self.intervalo = intervalo
+        self.nombres = nombres
+        self.una_vez = una_vez
+        self.detener = False
+
+    def pedir_detencion(self, *args):
+        self.detener = True
+
+    def ejecutar(self):
+        signal.signal(signal.SIGTERM, self.pedir_detencion)
+        signal.signal(signal.SIGINT, self.pedir_detencion)
+        identificador = cola.identificador_trabajador()
+        procesadas = 0
+        proxima_recuperacion = time.monotonic() + INTERVALO_RECUPERACION
+        while not self.detener:
+            close_old_connections()
+            if time.monotonic() >= proxima_recuperacion:
+                cola.recuperar_abandonadas()
+                proxima_recuperacion = time.monotonic() + INTERVALO_RECUPERACION
+            tarea = cola.reclamar_siguiente(identificador, self.nombres)
+            if tarea is None:
+                if self.una_vez:
+                    break
+                time.sleep(self.intervalo)
+                continue
+            cola.ejecutar(tarea)
+            procesadas += 1
+        return procesadas
+
+
+def _proceso_trabajador(intervalo, nombres, una_vez):
+    Trabajador(intervalo, nombres, una_vez).ejecutar()
+
+
+class Command(BaseCommand):
+    help = "Ejecuta las tareas en segundo plano de la cola (paneladmin.cola)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--procesos', type=int, default=1, help="Cantidad de procesos trabajadores.")
+        parser.add_argument(
+            '--intervalo', type=float, default=2.0,
+            help="Segundos de espera cuando no hay tareas pendientes.",
+        )
+        parser.add_argument('--tareas', nargs='+', help="Solo procesa las tareas con estos nombres.")
+        parser.add_argument(
+            '--una-vez', action='store_true',
+            help="Procesa lo pendiente y termina (útil en cron o en despliegues).",
+        )
+        parser.add_argument(
+            '--purgar-dias', type=int, default=7,
+            help="Días que se conserva el historial de tareas completadas.",
+        )
+
+    def handle(self, *args, **options):
+        recuperadas = cola.recuperar_abandonadas()
+        if recuperadas:
+            self.stdout.write(f"Tareas abandonadas devueltas a la cola: {recuperadas}.")
+        purgadas = cola.purgar_completadas(options['purgar_dias'])
+        if purgadas:
+            self.stdout.write(f"Tareas completadas purgadas: {purgadas}.")
+
+        argumentos = (options['intervalo'], options['tareas'], options['una_vez'])
+        if options['procesos'] <= 1:
+            procesadas = Trabajador(*argumentos).ejecutar()
+            self.stdout.write(self.style.SUCCESS(f"Tareas procesadas: {procesadas}."))
+            return
+
+        # Cada proceso abre su propia conexión; no se deben heredar las del padre.
+        connections.close_all()
+        procesos = [
+            multiprocessing.Process(target=_proceso_trabajador, args=argumentos, name=f'trabajador-{i}')
+            for i in range(options['procesos'])
+        ]
+        for proceso in procesos:
+            proceso.start()
+        self.stdout.write(f"{len(procesos)} trabajadores iniciados.")
+
+        def reenviar(signum, frame):
+            for proceso in procesos:
+                if proceso.is_alive():
+                    proceso.terminate()
+
+        signal.signal(signal.SIGTERM, reenviar)
+        try:
+            for proceso in procesos:
+                proceso.join()
+        except KeyboardInterrupt:
+            # Ctrl+C ya llegó a todo el grupo de procesos; solo esperamos que terminen.
+            for proceso in procesos:
+                proceso.join()
+        self.stdout.write(self.style.SUCCESS("Trabajadores detenidos."))
@@ -0,0 +1,85 @@
+import os
+import time
+
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+
+from paneladmin import miniaturas
+from paneladmin.almacenamiento import (
+    CARPETA_TEMPORAL, almacenamiento_deduplicado, carpetas_deduplicadas, contar_referencias,
+)
+from paneladmin.models import ArchivoMedia
+
+
+class Command(BaseCommand):
+    help = (
+        "Recalcula las referencias de los archivos subidos y borra los que quedaron huérfanos "
+        "(sin filas que los usen), junto con sus miniaturas."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help="Solo informa lo que haría.")
+        parser.add_argument(
+            '--gracia', type=int, default=60,
+            help="Minutos de antigüedad mínima para borrar un archivo no registrado (subidas en curso).",
+        )
+
+    def handle(self, *args, **options):
+        self.dry_run = options['dry_run']
+        limite = time.time() - options['gracia'] * 60
+        referencias = contar_referencias()
+        borrados = corregidos = 0
+
+        # 1. Ajustar los contadores y borrar los archivos registrados que ya nadie usa.
+        for archivo in ArchivoMedia.objects.iterator():
+            usos = referencias.get(archivo.nombre, 0)
+            if usos == 0:
+                borrados += self._borrar(archivo.nombre)
+                if not self.dry_run:
+                    archivo.delete()
+            elif usos != archivo.referencias:
+                corregidos += 1
+                if not self.dry_run:
+                    ArchivoMedia.objects.filter(pk=archivo.pk).update(referencias=usos)
+
+        # 2. Archivos en disco que ninguna fila referencia (copias antiguas, subidas revertidas...).
+        registrados = set(ArchivoMedia.objects.values_list('nombre', flat=True))
+        for carpeta in carpetas_deduplicadas():
+            for nombre in self._recorrer(carpeta):
+                if nombre in referencias or nombre in registrados:
+                    continue
+                if os.path.getmtime(almacenamiento_deduplicado.path(nombre)) < limite:
+                    borrados += self._borrar(nombre)
+
+        # 3. Temporales abandonados de subidas interrumpidas.
+        for nombre in self._recorrer(CARPETA_TEMPORAL):
+            if os.path.getmtime(almacenamiento_deduplicado.path(nombre)) < limite:
+                borrados += self._borrar(nombre)
+
+        # 4. Miniaturas cuyo original ya no está en uso.
+        vigentes = {
+            miniaturas.ruta_derivado(nombre, tamano, formato)
+            for nombre in referencias
+            for tamano in miniaturas.TAMANOS
+            for formato in miniaturas.FORMATOS
+        }
+        for nombre in self._recorrer(miniaturas.DIRECTORIO):
+            if nombre not in vigentes:
+                borrados += self._borrar(nombre)
+
+        resumen = f"Archivos borrados: {borrados}. Contadores corregidos: {corregidos}."
+        if self.dry_run:
+            resumen = "[simulación] " + resumen
+        self.stdout.write(self.style.SUCCESS(resumen))
+
+    def _recorrer(self, carpeta):
+        raiz = default_storage.path('')
+        for directorio, _, archivos in os.walk(default_storage.path(carpeta)):
+            for archivo in archivos:
+                yield os.path.relpath(os.path.join(directorio, archivo), raiz).replace(os.sep, '/')
+
+    def _borrar(self, nombre):
+        self.stdout.write(f"Borrando {nombre}")
+        if not self.dry_run:
+            default_storage.delete(nombre)
+        return 1
@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+
+from paneladmin import estadisticas
+
+
+class Command(BaseCommand):
+    help = (
+        "Recalcula las estadísticas de usuario desactualizadas o vencidas, para que los paneles "
+        "no tengan que hacerlo al cargarse. Pensado para cron (p. ej. cada 10 minutos)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--todas', action='store_true',
+            help="Revisa todas las filas, no solo las pendientes (detecta contadores desviados).",
+        )
+        parser.add_argument('--lote', type=int, default=estadisticas.TAMANO_LOTE, help="Usuarios por consulta.")
+
+    def handle(self, *args, **options):
+        revisadas, corregidas = estadisticas.reconciliar(todas=options['todas'], lote=options['lote'])
+        self.stdout.write(self.style.SUCCESS(f"Estadísticas revisadas: {revisadas}; con cambios: {corregidas}."))
@@ -0,0 +1,172 @@
+"""
+Entrega de archivos médicos privados (antecedentes y recetas) con control de acceso.
+
+Pueden ver un archivo:
+- El propio paciente.
+- Un médico que tiene o tuvo una cita con ese paciente, aunque esté archivada
+  (igual que en detalle_paciente_view).
+- El personal administrativo.
+
+Como el almacenamiento deduplica por contenido, un mismo archivo puede estar en
+varias filas; basta con que el usuario tenga acceso a una de ellas.
+
+Después de validar el acceso, la transferencia se delega según
+settings.VITALLIFE_ENVIO_ARCHIVOS:
+
+- 'nginx': cabecera X-Accel-Redirect hacia una location `internal` que apunte
+  a MEDIA_ROOT (VITALLIFE_RUTA_INTERNA_MEDIA).
+- 'apache': cabecera X-Sendfile con la ruta absoluta (mod_xsendfile).
+- 'python' (por defecto): Django envía el archivo. El servidor WSGI puede usar
+  sendfile() gracias a wsgi.file_wrapper, incluso en peticiones por rangos.
+
+En los dos primeros casos el servidor web atiende los rangos (Range) por su cuenta.
+"""
+import mimetypes
+import os
+import re
+
+from django.conf import settings
+from django.db.models import Q
+from django.http import FileResponse, HttpResponse
+from django.utils.http import http_date, parse_http_date_safe
+
+from .almacenamiento import almacenamiento_deduplicado
+
+# Primer segmento del upload_to de los campos privados.
+CARPETAS_PROTEGIDAS = ('antecedentes', 'recetas')
+
+PATRON_RANGO = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+def es_nombre_protegido(nombre):
+    return nombre.split('/', 1)[0] in CARPETAS_PROTEGIDAS and '..' not in nombre.split('/')
+
+
+def puede_ver(usuario, nombre):
+    """True si el usuario puede descargar el archivo indicado."""
+    from usuario.models import Usuario
+    from .models import Cita, CitaArchivada, Receta, RecetaArchivada
+
+    if not usuario.is_authenticated:
+        return False
+    if usuario.is_staff:
+        return True
+
+    pacientes_atendidos = Cita.objects.filter(medico=usuario).values('paciente_id')
+    pacientes_archivo = CitaArchivada.objects.filter(medico=usuario).values('paciente_id')
+    if nombre.startswith('recetas/'):
+        return any(
+            modelo.objects.filter(archivo=nombre).filter(
+                Q(cita__paciente=usuario)
+                | Q(cita__paciente_id__in=pacientes_atendidos)
+                | Q(cita__paciente_id__in=pacientes_archivo)
+            ).exists()
+            for modelo in (Receta, RecetaArchivada)
+        )
+    return Usuario.objects.filter(antecedentes_medicos=nombre).filter(
+        Q(pk=usuario.pk) | Q(pk__in=pacientes_atendidos) | Q(pk__in=pacientes_archivo)
+    ).exists()
+
+
+class TramoArchivo:
+    """
+    Vista de solo lectura de un tramo [inicio, inicio + largo) de un archivo.
+    Expone fileno() y deja el puntero en `inicio`, de modo que servidores como
+    gunicorn pueden enviarlo con sendfile() acotado por Content-Length.
+    """
+
+    def __init__(self, archivo, inicio, largo):
+        self.archivo = archivo
+        self.restante = largo
+        archivo.seek(inicio)
+
+    def read(self, tamano=-1):
+        if self.restante <= 0:
+            return b''
+        if tamano is None or tamano < 0 or tamano > self.restante:
+            tamano = self.restante
+        datos = self.archivo.read(tamano)
+        self.restante -= len(datos)
+        return datos
+
+    def fileno(self):
+        return self.archivo.fileno()
+
+    def close(self):
+        self.archivo.close()
+
+
+def _rango_solicitado(request, tamano, modificado):
+    """
+    (inicio, fin) del rango pedido, None si se debe enviar el archivo completo
+    o False si el rango no es satisfacible. Solo se atiende un rango; pedidos
+    de varios rangos reciben el archivo completo, como permite la RFC 9110.
+    """
+    cabecera = request.headers.get('Range', '')
+    coincidencia = PATRON_RANGO.match(cabecera.strip())
+    if not coincidencia or request.method != 'GET':
+        return None
+
+    if_range = request.headers.get('If-Range')
+    if if_range and parse_http_date_safe(if_range) != modificado:
+        return None
+
+    inicio, fin = coincidencia.groups()
+    if not inicio and not fin:
+        return None
+    if not inicio:
+        # Sufijo: los últimos N bytes.
+        largo = min(int(fin), tamano)
+        if largo == 0:
+            return False
+        return tamano - largo, tamano - 1
+    inicio = int(inicio)
+    fin = min(int(fin), tamano - 1) if fin else tamano - 1
+    if inicio >= tamano or fin < inicio:
+        return False
+    return inicio, fin
+
+
+def respuesta_archivo(request, nombre):
+    """Respuesta que entrega el archivo con el mecanismo configurado."""
+    ruta = almacenamiento_deduplicado.path(nombre)
+    tipo = mimetypes.guess_type(ruta)[0] or 'application/octet-stream'
+    modo = getattr(settings, 'VITALLIFE_ENVIO_ARCHIVOS', 'python')
+
+    if modo == 'nginx':
+        respuesta = HttpResponse(content_type=tipo)
+        prefijo = getattr(settings, 'VITALLIFE_RUTA_INTERNA_MEDIA', '/media-protegida/')
+        respuesta['X-Accel-Redirect'] = prefijo.rstrip('/') + '/' + nombre
+    elif modo == 'apache':
+        respuesta = HttpResponse(content_type=tipo)
+        respuesta['X-Sendfile'] = ruta
+    else:
+        respuesta = _respuesta_python(request, ruta, tipo)
+
+    respuesta['X-Content-Type-Options'] = 'nosniff'
+    respuesta['Cache-Control'] = 'private, max-age=0, must-revalidate'
+    return respuesta
+
+
+def _respuesta_python(request, ruta, tipo):
+    estado = os.stat(ruta)
+    modificado = int(estado.st_mtime)
+    rango = _rango_solicitado(request, estado.st_size, modificado)
+
+    if rango is False:
+        respuesta = HttpResponse(status=416)
+        respuesta['Content-Range'] = f'bytes */{estado.st_size}'
+        return respuesta
+
+    archivo = open(ruta, 'rb')
+    if rango is None:
+        respuesta = FileResponse(archivo, content_type=tipo)
+    else:
+        inicio, fin = rango
+        largo = fin - inicio + 1
+        respuesta = FileResponse(TramoArchivo(archivo, inicio, largo), status=206, content_type=tipo)
+        respuesta['Content-Length'] = largo
+        respuesta['Content-Range'] = f'bytes {inicio}-{fin}/{estado.st_size}'
+    respuesta['Accept-Ranges'] = 'bytes'
+    respuesta['Last-Modified'] = http_date(modificado)
+    return respuesta
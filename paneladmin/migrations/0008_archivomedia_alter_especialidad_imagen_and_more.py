@@ -0,0 +1,39 @@
+# Generated by Django 4.2.30 on 2026-10-18 22:31
+
+from django.db import migrations, models
+import paneladmin.almacenamiento
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('paneladmin', '0007_fichamedica'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivoMedia',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('nombre', models.CharField(max_length=255, unique=True, verbose_name='Ruta')),
+                ('sha256', models.CharField(db_index=True, max_length=64, verbose_name='SHA-256')),
+                ('tamano', models.PositiveBigIntegerField(verbose_name='Tamaño (bytes)')),
+                ('referencias', models.PositiveIntegerField(default=0, verbose_name='Referencias')),
+                ('fecha_creacion', models.DateTimeField(auto_now_add=True, verbose_name='Fecha de creación')),
+            ],
+            options={
+                'verbose_name': 'Archivo media',
+                'verbose_name_plural': 'Archivos media',
+            },
+        ),
+        migrations.AlterField(
+            model_name='especialidad',
+            name='imagen',
+            field=models.ImageField(help_text='Sube una imagen representativa para la especialidad.', storage=paneladmin.almacenamiento.AlmacenamientoDeduplicado(), upload_to='especialidades/', verbose_name='imagen de fondo'),
+        ),
+        migrations.AlterField(
+            model_name='receta',
+            name='archivo',
+            field=models.FileField(storage=paneladmin.almacenamiento.AlmacenamientoDeduplicado(), upload_to='recetas/%Y/%m/%d/', verbose_name='Archivo de receta'),
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 4.2.30 on 2026-10-18 22:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('paneladmin', '0008_archivomedia_alter_especialidad_imagen_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Tarea',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('nombre', models.CharField(max_length=100, verbose_name='Tarea')),
+                ('argumentos', models.JSONField(blank=True, default=dict, verbose_name='Argumentos')),
+                ('clave', models.CharField(db_index=True, max_length=150, verbose_name='Clave')),
+                ('prioridad', models.SmallIntegerField(choices=[(0, 'Baja'), (5, 'Normal'), (10, 'Alta')], default=5, verbose_name='Prioridad')),
+                ('estado', models.CharField(choices=[('PENDIENTE', 'Pendiente'), ('EN_CURSO', 'En curso'), ('COMPLETADA', 'Completada'), ('FALLIDA', 'Fallida')], default='PENDIENTE', max_length=10, verbose_name='Estado')),
+                ('intentos', models.PositiveSmallIntegerField(default=0, verbose_name='Intentos')),
+                ('max_intentos', models.PositiveSmallIntegerField(default=5, verbose_name='Máximo de intentos')),
+                ('ejecutar_desde', models.DateTimeField(verbose_name='Ejecutar desde')),
+                ('trabajador', models.CharField(blank=True, max_length=100, verbose_name='Trabajador')),
+                ('fecha_inicio', models.DateTimeField(blank=True, null=True, verbose_name='Inicio del último intento')),
+                ('fecha_fin', models.DateTimeField(blank=True, null=True, verbose_name='Fecha de término')),
+                ('ultimo_error', models.TextField(blank=True, verbose_name='Último error')),
+                ('fecha_creacion', models.DateTimeField(auto_now_add=True, verbose_name='Fecha de creación')),
+            ],
+            options={
+                'verbose_name': 'Tarea',
+                'verbose_name_plural': 'Tareas',
+                'indexes': [models.Index(fields=['estado', '-prioridad', 'ejecutar_desde'], name='tarea_siguiente_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 4.2.30 on 2026-10-18 22:43
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('paneladmin', '0010_notificacion'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RecordatorioCita',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('tipo', models.CharField(choices=[('24H', '24 horas antes'), ('2H', '2 horas antes')], max_length=3, verbose_name='Tipo')),
+                ('fecha_creacion', models.DateTimeField(auto_now_add=True, verbose_name='Fecha de creación')),
+            ],
+            options={
+                'verbose_name': 'Recordatorio de cita',
+                'verbose_name_plural': 'Recordatorios de citas',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='cita',
+            index=models.Index(fields=['estado', 'fecha_hora'], name='cita_estado_fecha_idx'),
+        ),
+        migrations.AddField(
+            model_name='recordatoriocita',
+            name='cita',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='recordatorios', to='paneladmin.cita', verbose_name='Cita'),
+        ),
+        migrations.AddConstraint(
+            model_name='recordatoriocita',
+            constraint=models.UniqueConstraint(fields=('cita', 'tipo'), name='recordatorio_unico_por_tipo'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.30 on 2026-10-18 22:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('paneladmin', '0011_recordatoriocita'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='cita',
+            name='estado',
+            field=models.CharField(choices=[('RESERVADA', 'Reservada'), ('COMPLETADA', 'Completada'), ('CANCELADA', 'Cancelada'), ('NO_ASISTIO', 'No asistió')], default='RESERVADA', max_length=15, verbose_name='Estado'),
+        ),
+    ]
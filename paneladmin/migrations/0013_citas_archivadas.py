@@ -0,0 +1,71 @@
+# Generated by Django 4.2.30 on 2026-10-18 22:48
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import paneladmin.almacenamiento
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('paneladmin', '0012_cita_no_asistio'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CitaArchivada',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('fecha_hora', models.DateTimeField(verbose_name='Fecha y Hora')),
+                ('motivo', models.TextField(blank=True, verbose_name='Motivo de la consulta')),
+                ('estado', models.CharField(choices=[('RESERVADA', 'Reservada'), ('COMPLETADA', 'Completada'), ('CANCELADA', 'Cancelada'), ('NO_ASISTIO', 'No asistió')], max_length=15, verbose_name='Estado')),
+                ('fecha_archivado', models.DateTimeField(auto_now_add=True, verbose_name='Fecha de archivo')),
+                ('especialidad', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='citas_archivadas', to='paneladmin.especialidad')),
+                ('medico', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='citas_archivadas_como_medico', to=settings.AUTH_USER_MODEL)),
+                ('paciente', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='citas_archivadas_como_paciente', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Cita archivada',
+                'verbose_name_plural': 'Citas archivadas',
+            },
+        ),
+        migrations.CreateModel(
+            name='RecetaArchivada',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('titulo', models.CharField(max_length=200, verbose_name='Título')),
+                ('archivo', models.FileField(storage=paneladmin.almacenamiento.AlmacenamientoDeduplicado(), upload_to='recetas/%Y/%m/%d/', verbose_name='Archivo de receta')),
+                ('indicaciones', models.TextField(blank=True, verbose_name='Indicaciones')),
+                ('fecha_creacion', models.DateTimeField(verbose_name='Fecha de creación')),
+                ('cita', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='recetas', to='paneladmin.citaarchivada', verbose_name='Cita')),
+            ],
+            options={
+                'verbose_name': 'Receta archivada',
+                'verbose_name_plural': 'Recetas archivadas',
+            },
+        ),
+        migrations.CreateModel(
+            name='DiagnosticoArchivado',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('titulo', models.CharField(max_length=200, verbose_name='Título')),
+                ('descripcion', models.TextField(verbose_name='Descripción')),
+                ('fecha_creacion', models.DateTimeField(verbose_name='Fecha de creación')),
+                ('cita', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='diagnostico', to='paneladmin.citaarchivada', verbose_name='Cita')),
+            ],
+            options={
+                'verbose_name': 'Diagnóstico archivado',
+                'verbose_name_plural': 'Diagnósticos archivados',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='citaarchivada',
+            index=models.Index(fields=['paciente', 'fecha_hora'], name='cita_arch_paciente_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='citaarchivada',
+            index=models.Index(fields=['medico', 'paciente', 'fecha_hora'], name='cita_arch_medico_idx'),
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 4.2.30 on 2026-10-18 22:50
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('paneladmin', '0013_citas_archivadas'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EliminacionUsuario',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('descripcion', models.CharField(max_length=300, verbose_name='Usuario eliminado')),
+                ('estado', models.CharField(choices=[('PENDIENTE', 'Pendiente'), ('EN_CURSO', 'En curso'), ('COMPLETADA', 'Completada')], default='PENDIENTE', max_length=10, verbose_name='Estado')),
+                ('etapa', models.CharField(blank=True, max_length=100, verbose_name='Etapa')),
+                ('filas_eliminadas', models.PositiveIntegerField(default=0, verbose_name='Filas eliminadas')),
+                ('fecha_solicitud', models.DateTimeField(auto_now_add=True, verbose_name='Fecha de solicitud')),
+                ('fecha_fin', models.DateTimeField(blank=True, null=True, verbose_name='Fecha de término')),
+                ('solicitada_por', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL, verbose_name='Solicitada por')),
+                ('usuario', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='eliminaciones', to=settings.AUTH_USER_MODEL, verbose_name='Usuario')),
+            ],
+            options={
+                'verbose_name': 'Eliminación de usuario',
+                'verbose_name_plural': 'Eliminaciones de usuarios',
+            },
+        ),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 4.2.30 on 2026-10-18 22:53
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('paneladmin', '0014_eliminacion_usuario'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ImportacionUsuarios',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('nombre_archivo', models.CharField(max_length=255, verbose_name='Archivo')),
+                ('ruta', models.CharField(max_length=500, verbose_name='Ruta del archivo')),
+                ('ruta_errores', models.CharField(blank=True, max_length=500, verbose_name='Ruta del informe de errores')),
+                ('estado', models.CharField(choices=[('PENDIENTE', 'Pendiente'), ('EN_CURSO', 'En curso'), ('COMPLETADA', 'Completada'), ('FALLIDA', 'Fallida')], default='PENDIENTE', max_length=10, verbose_name='Estado')),
+                ('filas_procesadas', models.PositiveIntegerField(default=0, verbose_name='Filas procesadas')),
+                ('creados', models.PositiveIntegerField(default=0, verbose_name='Usuarios creados')),
+                ('con_errores', models.PositiveIntegerField(default=0, verbose_name='Filas con errores')),
+                ('ultimo_error', models.TextField(blank=True, verbose_name='Último error')),
+                ('fecha_creacion', models.DateTimeField(auto_now_add=True, verbose_name='Fecha de creación')),
+                ('fecha_fin', models.DateTimeField(blank=True, null=True, verbose_name='Fecha de término')),
+                ('solicitada_por', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL, verbose_name='Solicitada por')),
+            ],
+            options={
+                'verbose_name': 'Importación de usuarios',
+                'verbose_name_plural': 'Importaciones de usuarios',
+                'ordering': ['-fecha_creacion'],
+            },
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 4.2.30 on 2026-10-18 23:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('paneladmin', '0015_importacion_usuarios'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='cita',
+            index=models.Index(fields=['paciente', 'fecha_hora'], name='cita_paciente_fecha_idx'),
+        ),
+    ]
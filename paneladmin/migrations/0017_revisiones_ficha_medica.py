@@ -0,0 +1,57 @@
+# Generated by Django 4.2.30 on 2026-10-18 23:04
+
+from django.conf import settings
+import django.core.serializers.json
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+CAMPOS = ('altura_cm', 'peso_kg', 'tipo_sangre', 'alergias', 'enfermedades_cronicas')
+
+
+def revision_inicial(apps, schema_editor):
+    # Las fichas existentes parten su historial con su estado actual como instantánea.
+    FichaMedica = apps.get_model('paneladmin', 'FichaMedica')
+    RevisionFichaMedica = apps.get_model('paneladmin', 'RevisionFichaMedica')
+    revisiones = []
+    for ficha in FichaMedica.objects.values('paciente_id', 'ultima_actualizacion', *CAMPOS).iterator():
+        estado = {campo: ficha[campo] for campo in CAMPOS}
+        revisiones.append(RevisionFichaMedica(
+            ficha_id=ficha['paciente_id'], numero=1, fecha=ficha['ultima_actualizacion'],
+            cambios={campo: valor for campo, valor in estado.items() if valor not in (None, '')},
+            instantanea=estado,
+        ))
+    RevisionFichaMedica.objects.bulk_create(revisiones, batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('paneladmin', '0016_cita_paciente_fecha_idx'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RevisionFichaMedica',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('numero', models.PositiveIntegerField(verbose_name='Número')),
+                ('fecha', models.DateTimeField(verbose_name='Fecha')),
+                ('cambios', models.JSONField(encoder=django.core.serializers.json.DjangoJSONEncoder, verbose_name='Cambios')),
+                ('instantanea', models.JSONField(blank=True, encoder=django.core.serializers.json.DjangoJSONEncoder, null=True, verbose_name='Instantánea')),
+                ('autor', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='revisiones_ficha', to=settings.AUTH_USER_MODEL, verbose_name='Autor')),
+                ('ficha', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='revisiones', to='paneladmin.fichamedica', verbose_name='Ficha médica')),
+            ],
+            options={
+                'verbose_name': 'Revisión de ficha médica',
+                'verbose_name_plural': 'Revisiones de fichas médicas',
+                'indexes': [models.Index(fields=['ficha', 'fecha'], name='revision_ficha_fecha_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='revisionfichamedica',
+            constraint=models.UniqueConstraint(fields=('ficha', 'numero'), name='revision_ficha_numero_unica'),
+        ),
+        migrations.RunPython(revision_inicial, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 4.2.30 on 2026-10-18 23:06
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('usuario', '0005_alter_usuario_antecedentes_medicos_and_more'),
+        ('paneladmin', '0017_revisiones_ficha_medica'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EstadisticasUsuario',
+            fields=[
+                ('usuario', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='estadisticas', serialize=False, to=settings.AUTH_USER_MODEL, verbose_name='Usuario')),
+                ('citas_pasadas', models.PositiveIntegerField(default=0, verbose_name='Citas pasadas')),
+                ('citas_proximas', models.PositiveIntegerField(default=0, verbose_name='Citas próximas')),
+                ('pacientes_distintos', models.PositiveIntegerField(default=0, verbose_name='Pacientes distintos')),
+                ('citas_mes', models.PositiveIntegerField(default=0, verbose_name='Citas del mes')),
+                ('cancelaciones_mes', models.PositiveIntegerField(default=0, verbose_name='Cancelaciones del mes')),
+                ('valido_hasta', models.DateTimeField(db_index=True, verbose_name='Válido hasta')),
+                ('desactualizada', models.BooleanField(db_index=True, default=False, verbose_name='Desactualizada')),
+                ('version', models.PositiveIntegerField(default=0, verbose_name='Versión')),
+                ('fecha_calculo', models.DateTimeField(verbose_name='Fecha de cálculo')),
+                ('proxima_cita', models.ForeignKey(blank=True, db_constraint=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='paneladmin.cita', verbose_name='Próxima cita')),
+            ],
+            options={
+                'verbose_name': 'Estadísticas de usuario',
+                'verbose_name_plural': 'Estadísticas de usuarios',
+            },
+        ),
+    ]
@@ -0,0 +1,97 @@
+# Generated by Django 4.2.30 on 2026-10-18 23:09
+
+import re
+import unicodedata
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, Max, Min, Q
+from django.utils import timezone
+import django.db.models.deletion
+
+
+def _normalizar(texto):
+    sin_tildes = ''.join(c for c in unicodedata.normalize('NFKD', texto or '') if not unicodedata.combining(c))
+    return ' '.join(sin_tildes.lower().split())[:255]
+
+
+def poblar_relaciones(apps, schema_editor):
+    # Una fila por par médico-paciente con citas, calculada con una consulta agrupada por tabla.
+    Cita = apps.get_model('paneladmin', 'Cita')
+    CitaArchivada = apps.get_model('paneladmin', 'CitaArchivada')
+    RelacionMedicoPaciente = apps.get_model('paneladmin', 'RelacionMedicoPaciente')
+    Usuario = apps.get_model('usuario', 'Usuario')
+
+    ahora = timezone.now()
+    pasada = Q(fecha_hora__lt=ahora) & ~Q(estado__in=['CANCELADA', 'NO_ASISTIO'])
+    datos = {}
+    for modelo in (Cita, CitaArchivada):
+        agregados = {
+            'primera': Min('fecha_hora'), 'ultima': Max('fecha_hora', filter=pasada), 'visitas': Count('id', filter=pasada),
+        }
+        if modelo is Cita:
+            agregados['proxima'] = Min('fecha_hora', filter=Q(fecha_hora__gte=ahora, estado='RESERVADA'))
+        for fila in modelo.objects.values('medico_id', 'paciente_id').annotate(**agregados).order_by().iterator():
+            par = (fila['medico_id'], fila['paciente_id'])
+            anterior = datos.get(par)
+            if anterior is None:
+                datos[par] = dict(fila, proxima=fila.get('proxima'))
+                continue
+            ultimas = [fecha for fecha in (anterior['ultima'], fila['ultima']) if fecha]
+            anterior['primera'] = min(anterior['primera'], fila['primera'])
+            anterior['ultima'] = max(ultimas) if ultimas else None
+            anterior['visitas'] += fila['visitas']
+
+    pacientes = {
+        fila['id']: fila for fila in Usuario.objects.filter(
+            id__in={paciente_id for _, paciente_id in datos}
+        ).values('id', 'nombre', 'apellido', 'rut').iterator()
+    }
+    relaciones = []
+    for (medico_id, paciente_id), fila in datos.items():
+        paciente = pacientes[paciente_id]
+        relaciones.append(RelacionMedicoPaciente(
+            medico_id=medico_id, paciente_id=paciente_id,
+            primera_cita=fila['primera'], ultima_visita=fila['ultima'], proxima_visita=fila['proxima'],
+            visitas=fila['visitas'],
+            orden=_normalizar(f"{paciente['apellido']} {paciente['nombre']}"),
+            nombre_apellido=_normalizar(f"{paciente['nombre']} {paciente['apellido']}"),
+            rut=re.sub(r'[.\-\s]', '', paciente['rut'] or '').upper(),
+        ))
+    RelacionMedicoPaciente.objects.bulk_create(relaciones, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('paneladmin', '0018_estadisticas_usuario'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RelacionMedicoPaciente',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('primera_cita', models.DateTimeField(verbose_name='Primera cita')),
+                ('ultima_visita', models.DateTimeField(blank=True, null=True, verbose_name='Última visita')),
+                ('proxima_visita', models.DateTimeField(blank=True, null=True, verbose_name='Próxima visita')),
+                ('visitas', models.PositiveIntegerField(default=0, verbose_name='Visitas')),
+                ('orden', models.CharField(max_length=255, verbose_name='Apellido y nombre')),
+                ('nombre_apellido', models.CharField(max_length=255, verbose_name='Nombre y apellido')),
+                ('rut', models.CharField(blank=True, max_length=12, verbose_name='RUT')),
+                ('medico', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='relaciones_como_medico', to=settings.AUTH_USER_MODEL, verbose_name='Médico')),
+                ('paciente', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='relaciones_como_paciente', to=settings.AUTH_USER_MODEL, verbose_name='Paciente')),
+            ],
+            options={
+                'verbose_name': 'Relación médico-paciente',
+                'verbose_name_plural': 'Relaciones médico-paciente',
+                'indexes': [models.Index(fields=['medico', 'orden', 'paciente'], name='relacion_medico_orden_idx'), models.Index(fields=['medico', 'nombre_apellido'], name='relacion_medico_nombre_idx'), models.Index(fields=['medico', 'rut'], name='relacion_medico_rut_idx'), models.Index(fields=['medico', 'proxima_visita'], name='relacion_medico_proxima_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='relacionmedicopaciente',
+            constraint=models.UniqueConstraint(fields=('medico', 'paciente'), name='relacion_medico_paciente_unica'),
+        ),
+        migrations.RunPython(poblar_relaciones, migrations.RunPython.noop),
+    ]
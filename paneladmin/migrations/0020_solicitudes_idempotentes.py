@@ -0,0 +1,41 @@
+# Generated by Django 4.2.30 on 2026-10-18 23:17
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('paneladmin', '0019_relaciones_medico_paciente'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SolicitudIdempotente',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('clave', models.CharField(max_length=64, verbose_name='Clave')),
+                ('ruta', models.CharField(max_length=200, verbose_name='Ruta')),
+                ('huella', models.CharField(max_length=64, verbose_name='Huella')),
+                ('estado_http', models.PositiveSmallIntegerField(blank=True, null=True, verbose_name='Código HTTP')),
+                ('tipo_contenido', models.CharField(blank=True, max_length=100, verbose_name='Tipo de contenido')),
+                ('cuerpo', models.TextField(blank=True, verbose_name='Cuerpo')),
+                ('ubicacion', models.CharField(blank=True, max_length=500, verbose_name='Redirección')),
+                ('fecha_creacion', models.DateTimeField(auto_now_add=True, verbose_name='Fecha de creación')),
+                ('expira_en', models.DateTimeField(verbose_name='Expira en')),
+                ('usuario', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='solicitudes_idempotentes', to=settings.AUTH_USER_MODEL, verbose_name='Usuario')),
+            ],
+            options={
+                'verbose_name': 'Solicitud idempotente',
+                'verbose_name_plural': 'Solicitudes idempotentes',
+                'indexes': [models.Index(fields=['expira_en'], name='solicitud_idem_expira_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='solicitudidempotente',
+            constraint=models.UniqueConstraint(fields=('usuario', 'clave'), name='solicitud_idempotente_unica'),
+        ),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 4.2.30 on 2026-10-18 23:18
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('paneladmin', '0020_solicitudes_idempotentes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReservaTemporal',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fecha_hora', models.DateTimeField(verbose_name='Fecha y Hora')),
+                ('expira_en', models.DateTimeField(verbose_name='Expira en')),
+                ('especialidad', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='paneladmin.especialidad', verbose_name='Especialidad')),
+                ('medico', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='reservas_temporales_como_medico', to=settings.AUTH_USER_MODEL, verbose_name='Médico')),
+                ('paciente', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='reservas_temporales', to=settings.AUTH_USER_MODEL, verbose_name='Paciente')),
+            ],
+            options={
+                'verbose_name': 'Reserva temporal',
+                'verbose_name_plural': 'Reservas temporales',
+                'indexes': [models.Index(fields=['expira_en'], name='reserva_temporal_expira_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='reservatemporal',
+            constraint=models.UniqueConstraint(fields=('medico', 'fecha_hora'), name='reserva_temporal_unica'),
+        ),
+    ]
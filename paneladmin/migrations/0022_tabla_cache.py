@@ -0,0 +1,20 @@
+from django.conf import settings
+from django.core.management import call_command
+from django.db import migrations
+
+
+def crear_tabla_cache(apps, schema_editor):
+    # Solo hace falta si settings.CACHES usa DatabaseCache; con Redis no hace nada.
+    if settings.CACHES['default']['BACKEND'] == 'django.core.cache.backends.db.DatabaseCache':
+        call_command('createcachetable', database=schema_editor.connection.alias, verbosity=0)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('paneladmin', '0021_reservas_temporales'),
+    ]
+
+    operations = [
+        migrations.RunPython(crear_tabla_cache, migrations.RunPython.noop),
+    ]
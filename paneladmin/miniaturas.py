@@ -0,0 +1,114 @@
+"""
+Derivados de imágenes (miniaturas y WebP) para fotos de perfil y especialidades.
+
+Las plantillas muestran avatares de 32-60px y tarjetas de ~400x250px, pero los
+originales pesan varios MB. Para cada imagen se generan versiones de tamaño fijo
+en `miniaturas/<tamaño>/<ruta original>.<formato>` dentro de MEDIA_ROOT:
+
+- Al subir la imagen (señales de Usuario y Especialidad).
+- Bajo demanda, la primera vez que se pide un derivado que aún no existe
+  (vista `miniatura_view`, que lo genera y redirige al archivo).
+- En lote con `python manage.py generar_miniaturas`.
+
+Las plantillas los referencian con el tag `{% miniatura campo 'avatar' %}`.
+"""
+import os
+from io import BytesIO
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.urls import reverse
+from PIL import Image, ImageOps
+
+# nombre -> (ancho, alto). Se recorta al centro para llenar el tamaño exacto.
+# Los tamaños son el doble del tamaño mostrado para pantallas de alta densidad.
+TAMANOS = {
+    'avatar': (80, 80),
+    'avatar_mediano': (120, 120),
+    'avatar_grande': (200, 200),
+    'tarjeta': (800, 500),
+}
+
+FORMATOS = {
+    'webp': ('WEBP', {'quality': 80, 'method': 4}),
+    'jpg': ('JPEG', {'quality': 82, 'optimize': True, 'progressive': True}),
+}
+
+# Solo se generan derivados de estas carpetas (imágenes públicas).
+CARPETAS_PERMITIDAS = ('fotos_perfil/', 'especialidades/')
+
+DIRECTORIO = 'miniaturas'
+
+# Derivados que ya sabemos que existen en disco, para no repetir el stat.
+_existentes = set()
+
+
+def ruta_derivado(nombre, tamano, formato='webp'):
+    base, _ = os.path.splitext(nombre)
+    return f'{DIRECTORIO}/{tamano}/{base}.{formato}'
+
+
+def es_original_valido(nombre):
+    return bool(nombre) and nombre.startswith(CARPETAS_PERMITIDAS) and '..' not in nombre
+
+
+def generar_derivado(nombre, tamano, formato='webp', imagen=None):
+    """Genera (o regenera) un derivado y devuelve su ruta dentro del almacenamiento."""
+    ancho, alto = TAMANOS[tamano]
+    formato_pil, opciones = FORMATOS[formato]
+    if imagen is None:
+        with default_storage.open(nombre, 'rb') as original:
+            imagen = Image.open(original)
+            imagen.load()
+
+    # Respetamos la orientación EXIF de las fotos tomadas con el celular.
+    miniatura = ImageOps.fit(ImageOps.exif_transpose(imagen), (ancho, alto), Image.LANCZOS)
+    if formato_pil == 'JPEG' and miniatura.mode not in ('RGB', 'L'):
+        miniatura = miniatura.convert('RGB')
+    elif miniatura.mode not in ('RGB', 'RGBA', 'L'):
+        miniatura = miniatura.convert('RGBA')
+
+    buffer = BytesIO()
+    miniatura.save(buffer, formato_pil, **opciones)
+
+    ruta = ruta_derivado(nombre, tamano, formato)
+    if default_storage.exists(ruta):
+        default_storage.delete(ruta)
+    default_storage.save(ruta, ContentFile(buffer.getvalue()))
+    _existentes.add(ruta)
+    return ruta
+
+
+def generar_derivados(nombre, formatos=('webp',)):
+    """Genera todos los tamaños de una imagen abriendo el original una sola vez."""
+    if not es_original_valido(nombre):
+        return []
+    with default_storage.open(nombre, 'rb') as original:
+        imagen = Image.open(original)
+        imagen.load()
+    return [
+        generar_derivado(nombre, tamano, formato, imagen=imagen)
+        for tamano in TAMANOS
+        for formato in formatos
+    ]
+
+
+def eliminar_derivados(nombre):
+    for tamano in TAMANOS:
+        for formato in FORMATOS:
+            ruta = ruta_derivado(nombre, tamano, formato)
+            _existentes.discard(ruta)
+            if default_storage.exists(ruta):
+                default_storage.delete(ruta)
+
+
+def url_derivado(nombre, tamano, formato='webp'):
+    """
+    URL del derivado. Si todavía no existe, apunta a la vista que lo genera
+    bajo demanda, de modo que la página nunca espera por el procesamiento.
+    """
+    ruta = ruta_derivado(nombre, tamano, formato)
+    if ruta in _existentes or default_storage.exists(ruta):
+        _existentes.add(ruta)
+        return default_storage.url(ruta)
+    return reverse('miniatura', args=[tamano, formato, nombre])
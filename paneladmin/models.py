@@ -1,11 +1,17 @@
 from django.db import models
 from django.utils.translation import gettext_lazy as _
+from django.core.serializers.json import DjangoJSONEncoder
 from django.conf import settings
+from django.utils import timezone
+from .almacenamiento import almacenamiento_deduplicado
 
 class Especialidad(models.Model):
     nombre = models.CharField(_('nombre'), max_length=100, unique=True)
     descripcion = models.TextField(_('descripción'), blank=True)
-    imagen = models.ImageField(_('imagen de fondo'), upload_to='especialidades/', help_text="Sube una imagen representativa para la especialidad.")
+    imagen = models.ImageField(
+        _('imagen de fondo'), upload_to='especialidades/', storage=almacenamiento_deduplicado,
+        help_text="Sube una imagen representativa para la especialidad."
+    )
 
     class Meta:
         verbose_name = _('especialidad')
@@ -44,6 +50,7 @@ class Cita(models.Model):
         RESERVADA = 'RESERVADA', _('Reservada')
         COMPLETADA = 'COMPLETADA', _('Completada')
         CANCELADA = 'CANCELADA', _('Cancelada')
+        NO_ASISTIO = 'NO_ASISTIO', _('No asistió')
 
     paciente = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='citas_como_paciente')
     medico = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='citas_como_medico')
@@ -56,6 +63,12 @@ class Cita(models.Model):
         verbose_name = _("Cita")
         verbose_name_plural = _("Citas")
         unique_together = ('medico', 'fecha_hora') # Evita que un médico tenga dos citas a la misma hora.
+        indexes = [
+            # Ventanas de tiempo por estado (recordatorios, cierre de citas pasadas).
+            models.Index(fields=['estado', 'fecha_hora'], name='cita_estado_fecha_idx'),
+            # Historial paginado del paciente (paneladmin.archivo_citas.pagina_historial).
+            models.Index(fields=['paciente', 'fecha_hora'], name='cita_paciente_fecha_idx'),
+        ]
 
     def __str__(self):
         return f"Cita de {self.paciente} con Dr. {self.medico.get_full_name()} el {self.fecha_hora.strftime('%d/%m/%Y %H:%M')}"
@@ -97,7 +110,7 @@ class Receta(models.Model):
     """
     cita = models.ForeignKey(Cita, on_delete=models.CASCADE, related_name='recetas', verbose_name=_("Cita"))
     titulo = models.CharField(_("Título"), max_length=200)
-    archivo = models.FileField(_("Archivo de receta"), upload_to='recetas/%Y/%m/%d/')
+    archivo = models.FileField(_("Archivo de receta"), upload_to='recetas/%Y/%m/%d/', storage=almacenamiento_deduplicado)
     indicaciones = models.TextField(_("Indicaciones"), blank=True)
     fecha_creacion = models.DateTimeField(_("Fecha de creación"), auto_now_add=True)
 
@@ -139,4 +152,431 @@ class FichaMedica(models.Model):
     ultima_actualizacion = models.DateTimeField(_("Última actualización"), auto_now=True)
 
     def __str__(self):
-        return f"Ficha Médica de {self.paciente.get_full_name()}"
\ No newline at end of file
+        return f"Ficha Médica de {self.paciente.get_full_name()}"
+
+class RevisionFichaMedica(models.Model):
+    """
+    Cambio de la ficha médica (registro de solo inserción, ver paneladmin.historial_ficha).
+    'cambios' guarda solo los campos que cambiaron, con su valor nuevo; cada
+    INTERVALO_INSTANTANEA revisiones se guarda además el estado completo en
+    'instantanea', para reconstruir la ficha en una fecha sin recorrer todo el historial.
+    """
+    ficha = models.ForeignKey(FichaMedica, on_delete=models.CASCADE, related_name='revisiones', verbose_name=_("Ficha médica"))
+    numero = models.PositiveIntegerField(_("Número"))
+    fecha = models.DateTimeField(_("Fecha"))
+    autor = models.ForeignKey(
+        settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True,
+        related_name='revisiones_ficha', verbose_name=_("Autor")
+    )
+    cambios = models.JSONField(_("Cambios"), encoder=DjangoJSONEncoder)
+    instantanea = models.JSONField(_("Instantánea"), encoder=DjangoJSONEncoder, null=True, blank=True)
+
+    class Meta:
+        verbose_name = _("Revisión de ficha médica")
+        verbose_name_plural = _("Revisiones de fichas médicas")
+        constraints = [
+            models.UniqueConstraint(fields=['ficha', 'numero'], name='revision_ficha_numero_unica'),
+        ]
+        indexes = [
+            models.Index(fields=['ficha', 'fecha'], name='revision_ficha_fecha_idx'),
+        ]
+
+    def __str__(self):
+        return f"Revisión {self.numero} de la ficha del paciente {self.ficha_id}"
+
+class ArchivoMedia(models.Model):
+    """
+    Archivo único guardado en MEDIA_ROOT, direccionado por el hash de su contenido.
+    Varias filas (fotos, antecedentes, recetas) pueden apuntar al mismo archivo;
+    'referencias' cuenta cuántas lo usan para saber cuándo se puede borrar.
+    """
+    nombre = models.CharField(_("Ruta"), max_length=255, unique=True)
+    sha256 = models.CharField(_("SHA-256"), max_length=64, db_index=True)
+    tamano = models.PositiveBigIntegerField(_("Tamaño (bytes)"))
+    referencias = models.PositiveIntegerField(_("Referencias"), default=0)
+    fecha_creacion = models.DateTimeField(_("Fecha de creación"), auto_now_add=True)
+
+    class Meta:
+        verbose_name = _("Archivo media")
+        verbose_name_plural = _("Archivos media")
+
+    def __str__(self):
+        return f"{self.nombre} ({self.referencias} referencias)"
+
+
+class Tarea(models.Model):
+    """
+    Trabajo pendiente de la cola en base de datos (ver paneladmin.cola).
+    Lo ejecuta `python manage.py procesar_tareas` fuera del ciclo de la petición.
+    """
+    class Estado(models.TextChoices):
+        PENDIENTE = 'PENDIENTE', _('Pendiente')
+        EN_CURSO = 'EN_CURSO', _('En curso')
+        COMPLETADA = 'COMPLETADA', _('Completada')
+        FALLIDA = 'FALLIDA', _('Fallida')
+
+    class Prioridad(models.IntegerChoices):
+        BAJA = 0, _('Baja')
+        NORMAL = 5, _('Normal')
+        ALTA = 10, _('Alta')
+
+    nombre = models.CharField(_("Tarea"), max_length=100)
+    argumentos = models.JSONField(_("Argumentos"), default=dict, blank=True)
+    # nombre + hash de los argumentos, para no encolar dos veces la misma tarea pendiente.
+    clave = models.CharField(_("Clave"), max_length=150, db_index=True)
+    prioridad = models.SmallIntegerField(_("Prioridad"), choices=Prioridad.choices, default=Prioridad.NORMAL)
+    estado = models.CharField(_("Estado"), max_length=10, choices=Estado.choices, default=Estado.PENDIENTE)
+    intentos = models.PositiveSmallIntegerField(_("Intentos"), default=0)
+    max_intentos = models.PositiveSmallIntegerField(_("Máximo de intentos"), default=5)
+    ejecutar_desde = models.DateTimeField(_("Ejecutar desde"))
+    trabajador = models.CharField(_("Trabajador"), max_length=100, blank=True)
+    fecha_inicio = models.DateTimeField(_("Inicio del último intento"), null=True, blank=True)
+    fecha_fin = models.DateTimeField(_("Fecha de término"), null=True, blank=True)
+    ultimo_error = models.TextField(_("Último error"), blank=True)
+    fecha_creacion = models.DateTimeField(_("Fecha de creación"), auto_now_add=True)
+
+    class Meta:
+        verbose_name = _("Tarea")
+        verbose_name_plural = _("Tareas")
+        indexes = [
+            # Orden en que el trabajador toma las tareas pendientes.
+            models.Index(fields=['estado', '-prioridad', 'ejecutar_desde'], name='tarea_siguiente_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.nombre} ({self.get_estado_display()})"
+
+
+class Notificacion(models.Model):
+    """
+    Bandeja de salida (outbox) de correos a pacientes. Se escribe en la misma
+    transacción que el cambio de la cita y la vacía paneladmin.notificaciones.
+    """
+    class Estado(models.TextChoices):
+        PENDIENTE = 'PENDIENTE', _('Pendiente')
+        ENVIANDO = 'ENVIANDO', _('Enviando')
+        ENVIADA = 'ENVIADA', _('Enviada')
+        FALLIDA = 'FALLIDA', _('Fallida')
+
+    # Identifica el evento (p. ej. 'cita:12:agendada'): el mismo evento nunca genera dos correos.
+    clave = models.CharField(_("Clave"), max_length=100, unique=True)
+    destinatario = models.EmailField(_("Destinatario"))
+    asunto = models.CharField(_("Asunto"), max_length=200)
+    cuerpo = models.TextField(_("Cuerpo"))
+    estado = models.CharField(_("Estado"), max_length=10, choices=Estado.choices, default=Estado.PENDIENTE)
+    intentos = models.PositiveSmallIntegerField(_("Intentos"), default=0)
+    proximo_intento = models.DateTimeField(_("Próximo intento"), default=timezone.now)
+    reclamada_en = models.DateTimeField(_("Reclamada en"), null=True, blank=True)
+    enviada_en = models.DateTimeField(_("Enviada en"), null=True, blank=True)
+    ultimo_error = models.TextField(_("Último error"), blank=True)
+    fecha_creacion = models.DateTimeField(_("Fecha de creación"), auto_now_add=True)
+
+    class Meta:
+        verbose_name = _("Notificación")
+        verbose_name_plural = _("Notificaciones")
+        indexes = [
+            models.Index(fields=['estado', 'proximo_intento'], name='notificacion_pendiente_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.asunto} -> {self.destinatario} ({self.get_estado_display()})"
+
+
+class RecordatorioCita(models.Model):
+    """
+    Recordatorio ya generado para una cita (24 h o 2 h antes), para no repetirlo.
+    El correo en sí queda en la bandeja de salida (Notificacion).
+    """
+    class Tipo(models.TextChoices):
+        DIA_ANTES = '24H', _('24 horas antes')
+        HORAS_ANTES = '2H', _('2 horas antes')
+
+    cita = models.ForeignKey(Cita, on_delete=models.CASCADE, related_name='recordatorios', verbose_name=_("Cita"))
+    tipo = models.CharField(_("Tipo"), max_length=3, choices=Tipo.choices)
+    fecha_creacion = models.DateTimeField(_("Fecha de creación"), auto_now_add=True)
+
+    class Meta:
+        verbose_name = _("Recordatorio de cita")
+        verbose_name_plural = _("Recordatorios de citas")
+        constraints = [
+            models.UniqueConstraint(fields=['cita', 'tipo'], name='recordatorio_unico_por_tipo'),
+        ]
+
+    def __str__(self):
+        return f"{self.get_tipo_display()} - cita {self.cita_id}"
+
+
+# --- Historial archivado ---
+# Citas cerradas anteriores al horizonte de archivo (ver paneladmin.archivo_citas).
+# Conservan su id y los mismos nombres de campos y relaciones que Cita, Diagnostico
+# y Receta, de modo que las plantillas del historial las muestran sin cambios.
+
+class CitaArchivada(models.Model):
+    id = models.BigIntegerField(primary_key=True)
+    paciente = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='citas_archivadas_como_paciente')
+    medico = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='citas_archivadas_como_medico')
+    especialidad = models.ForeignKey(Especialidad, on_delete=models.CASCADE, related_name='citas_archivadas')
+    fecha_hora = models.DateTimeField(_("Fecha y Hora"))
+    motivo = models.TextField(_("Motivo de la consulta"), blank=True)
+    estado = models.CharField(_("Estado"), max_length=15, choices=Cita.EstadoCita.choices)
+    fecha_archivado = models.DateTimeField(_("Fecha de archivo"), auto_now_add=True)
+
+    archivada = True
+
+    class Meta:
+        verbose_name = _("Cita archivada")
+        verbose_name_plural = _("Citas archivadas")
+        indexes = [
+            models.Index(fields=['paciente', 'fecha_hora'], name='cita_arch_paciente_idx'),
+            models.Index(fields=['medico', 'paciente', 'fecha_hora'], name='cita_arch_medico_idx'),
+        ]
+
+    def __str__(self):
+        return f"Cita archivada de {self.paciente} con Dr. {self.medico.get_full_name()} el {self.fecha_hora.strftime('%d/%m/%Y %H:%M')}"
+
+class DiagnosticoArchivado(models.Model):
+    cita = models.OneToOneField(CitaArchivada, on_delete=models.CASCADE, related_name='diagnostico', verbose_name=_("Cita"))
+    titulo = models.CharField(_("Título"), max_length=200)
+    descripcion = models.TextField(_("Descripción"))
+    fecha_creacion = models.DateTimeField(_("Fecha de creación"))
+
+    class Meta:
+        verbose_name = _("Diagnóstico archivado")
+        verbose_name_plural = _("Diagnósticos archivados")
+
+    def __str__(self):
+        return f"Diagnóstico archivado de la cita {self.cita_id}"
+
+class RecetaArchivada(models.Model):
+    cita = models.ForeignKey(CitaArchivada, on_delete=models.CASCADE, related_name='recetas', verbose_name=_("Cita"))
+    titulo = models.CharField(_("Título"), max_length=200)
+    archivo = models.FileField(_("Archivo de receta"), upload_to='recetas/%Y/%m/%d/', storage=almacenamiento_deduplicado)
+    indicaciones = models.TextField(_("Indicaciones"), blank=True)
+    fecha_creacion = models.DateTimeField(_("Fecha de creación"))
+
+    class Meta:
+        verbose_name = _("Receta archivada")
+        verbose_name_plural = _("Recetas archivadas")
+
+    def __str__(self):
+        return f"Receta archivada '{self.titulo}' de la cita {self.cita_id}"
+
+
+class EliminacionUsuario(models.Model):
+    """
+    Eliminación de un usuario en segundo plano (ver paneladmin.eliminacion_usuarios).
+    El usuario se desactiva al solicitarla y sus datos se borran por lotes.
+    """
+    class Estado(models.TextChoices):
+        PENDIENTE = 'PENDIENTE', _('Pendiente')
+        EN_CURSO = 'EN_CURSO', _('En curso')
+        COMPLETADA = 'COMPLETADA', _('Completada')
+
+    usuario = models.ForeignKey(
+        settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True,
+        related_name='eliminaciones', verbose_name=_("Usuario"),
+    )
+    descripcion = models.CharField(_("Usuario eliminado"), max_length=300)
+    solicitada_por = models.ForeignKey(
+        settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True,
+        related_name='+', verbose_name=_("Solicitada por"),
+    )
+    estado = models.CharField(_("Estado"), max_length=10, choices=Estado.choices, default=Estado.PENDIENTE)
+    etapa = models.CharField(_("Etapa"), max_length=100, blank=True)
+    filas_eliminadas = models.PositiveIntegerField(_("Filas eliminadas"), default=0)
+    fecha_solicitud = models.DateTimeField(_("Fecha de solicitud"), auto_now_add=True)
+    fecha_fin = models.DateTimeField(_("Fecha de término"), null=True, blank=True)
+
+    class Meta:
+        verbose_name = _("Eliminación de usuario")
+        verbose_name_plural = _("Eliminaciones de usuarios")
+
+    def __str__(self):
+        return f"Eliminación de {self.descripcion} ({self.get_estado_display()})"
+
+
+class ImportacionUsuarios(models.Model):
+    """
+    Importación masiva de médicos y pacientes desde un CSV (ver
+    paneladmin.importacion_usuarios). filas_procesadas es el punto de
+    reanudación: las filas anteriores ya quedaron creadas o informadas con error.
+    """
+    class Estado(models.TextChoices):
+        PENDIENTE = 'PENDIENTE', _('Pendiente')
+        EN_CURSO = 'EN_CURSO', _('En curso')
+        COMPLETADA = 'COMPLETADA', _('Completada')
+        FALLIDA = 'FALLIDA', _('Fallida')
+
+    nombre_archivo = models.CharField(_("Archivo"), max_length=255)
+    ruta = models.CharField(_("Ruta del archivo"), max_length=500)
+    ruta_errores = models.CharField(_("Ruta del informe de errores"), max_length=500, blank=True)
+    solicitada_por = models.ForeignKey(
+        settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True,
+        related_name='+', verbose_name=_("Solicitada por"),
+    )
+    estado = models.CharField(_("Estado"), max_length=10, choices=Estado.choices, default=Estado.PENDIENTE)
+    filas_procesadas = models.PositiveIntegerField(_("Filas procesadas"), default=0)
+    creados = models.PositiveIntegerField(_("Usuarios creados"), default=0)
+    con_errores = models.PositiveIntegerField(_("Filas con errores"), default=0)
+    ultimo_error = models.TextField(_("Último error"), blank=True)
+    fecha_creacion = models.DateTimeField(_("Fecha de creación"), auto_now_add=True)
+    fecha_fin = models.DateTimeField(_("Fecha de término"), null=True, blank=True)
+
+    class Meta:
+        verbose_name = _("Importación de usuarios")
+        verbose_name_plural = _("Importaciones de usuarios")
+        ordering = ['-fecha_creacion']
+
+    def __str__(self):
+        return f"{self.nombre_archivo} ({self.get_estado_display()})"
+
+
+class EstadisticasUsuario(models.Model):
+    """
+    Contadores desnormalizados de un usuario para los paneles (ver paneladmin.estadisticas).
+    Los caminos de escritura de citas la marcan como desactualizada; se recalcula
+    al leerla en ese estado o pasado 'valido_hasta', y `reconciliar_estadisticas`
+    recalcula en segundo plano las pendientes.
+    """
+    usuario = models.OneToOneField(
+        settings.AUTH_USER_MODEL, on_delete=models.CASCADE, primary_key=True,
+        related_name='estadisticas', verbose_name=_("Usuario"),
+    )
+    # Como paciente.
+    citas_pasadas = models.PositiveIntegerField(_("Citas pasadas"), default=0)
+    citas_proximas = models.PositiveIntegerField(_("Citas próximas"), default=0)
+    # Sin restricción en la base: el archivo y la purga de usuarios borran citas
+    # sin pasar por el ORM. Nunca se lee una ya pasada (ver 'valido_hasta').
+    proxima_cita = models.ForeignKey(
+        Cita, on_delete=models.SET_NULL, null=True, blank=True, db_constraint=False,
+        related_name='+', verbose_name=_("Próxima cita"),
+    )
+    # Como médico.
+    pacientes_distintos = models.PositiveIntegerField(_("Pacientes distintos"), default=0)
+    citas_mes = models.PositiveIntegerField(_("Citas del mes"), default=0)
+    cancelaciones_mes = models.PositiveIntegerField(_("Cancelaciones del mes"), default=0)
+
+    # Cuándo dejan de valer los contadores que dependen de la hora (la próxima
+    # cita pasa a ser pasada, o cambia el mes).
+    valido_hasta = models.DateTimeField(_("Válido hasta"), db_index=True)
+    desactualizada = models.BooleanField(_("Desactualizada"), default=False, db_index=True)
+    # Se incrementa con cada invalidación: un recálculo que empezó antes no la pisa.
+    version = models.PositiveIntegerField(_("Versión"), default=0)
+    fecha_calculo = models.DateTimeField(_("Fecha de cálculo"))
+
+    class Meta:
+        verbose_name = _("Estadísticas de usuario")
+        verbose_name_plural = _("Estadísticas de usuarios")
+
+    def __str__(self):
+        return f"Estadísticas de {self.usuario_id}"
+
+
+class RelacionMedicoPaciente(models.Model):
+    """
+    Un paciente que tuvo o tiene citas con un médico, con sus fechas de visita
+    (ver paneladmin.pacientes_medico). Se mantiene desde las escrituras de citas
+    y sirve la lista de pacientes del médico con búsqueda y paginación por índice.
+    """
+    medico = models.ForeignKey(
+        settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='relaciones_como_medico',
+        verbose_name=_("Médico"),
+    )
+    paciente = models.ForeignKey(
+        settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='relaciones_como_paciente',
+        verbose_name=_("Paciente"),
+    )
+    primera_cita = models.DateTimeField(_("Primera cita"))
+    ultima_visita = models.DateTimeField(_("Última visita"), null=True, blank=True)
+    proxima_visita = models.DateTimeField(_("Próxima visita"), null=True, blank=True)
+    visitas = models.PositiveIntegerField(_("Visitas"), default=0)
+    # Copias normalizadas (minúsculas, sin tildes) de los datos del paciente para
+    # ordenar y buscar por prefijo sobre índices propios del médico.
+    orden = models.CharField(_("Apellido y nombre"), max_length=255)
+    nombre_apellido = models.CharField(_("Nombre y apellido"), max_length=255)
+    rut = models.CharField(_("RUT"), max_length=12, blank=True)
+
+    class Meta:
+        verbose_name = _("Relación médico-paciente")
+        verbose_name_plural = _("Relaciones médico-paciente")
+        constraints = [
+            models.UniqueConstraint(fields=['medico', 'paciente'], name='relacion_medico_paciente_unica'),
+        ]
+        indexes = [
+            models.Index(fields=['medico', 'orden', 'paciente'], name='relacion_medico_orden_idx'),
+            models.Index(fields=['medico', 'nombre_apellido'], name='relacion_medico_nombre_idx'),
+            models.Index(fields=['medico', 'rut'], name='relacion_medico_rut_idx'),
+            models.Index(fields=['medico', 'proxima_visita'], name='relacion_medico_proxima_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.paciente_id} con el médico {self.medico_id}"
+
+
+class SolicitudIdempotente(models.Model):
+    """
+    Resultado de un POST enviado con Idempotency-Key (ver paneladmin.idempotencia):
+    un reintento con la misma clave recibe esta respuesta sin volver a ejecutarse.
+    Sin estado_http, la solicitud original todavía se está procesando.
+    """
+    usuario = models.ForeignKey(
+        settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='solicitudes_idempotentes',
+        verbose_name=_("Usuario"),
+    )
+    clave = models.CharField(_("Clave"), max_length=64)
+    ruta = models.CharField(_("Ruta"), max_length=200)
+    # SHA-256 de la ruta y los datos enviados: la misma clave con otros datos es un error del cliente.
+    huella = models.CharField(_("Huella"), max_length=64)
+    estado_http = models.PositiveSmallIntegerField(_("Código HTTP"), null=True, blank=True)
+    tipo_contenido = models.CharField(_("Tipo de contenido"), max_length=100, blank=True)
+    cuerpo = models.TextField(_("Cuerpo"), blank=True)
+    ubicacion = models.CharField(_("Redirección"), max_length=500, blank=True)
+    fecha_creacion = models.DateTimeField(_("Fecha de creación"), auto_now_add=True)
+    expira_en = models.DateTimeField(_("Expira en"))
+
+    class Meta:
+        verbose_name = _("Solicitud idempotente")
+        verbose_name_plural = _("Solicitudes idempotentes")
+        constraints = [
+            models.UniqueConstraint(fields=['usuario', 'clave'], name='solicitud_idempotente_unica'),
+        ]
+        indexes = [
+            # Limpieza de las vencidas (paneladmin.idempotencia.limpiar_vencidas).
+            models.Index(fields=['expira_en'], name='solicitud_idem_expira_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.clave} ({self.usuario_id})"
+
+
+class ReservaTemporal(models.Model):
+    """
+    Horario retenido unos minutos para un paciente mientras confirma la cita
+    (ver paneladmin.reservas_temporales). Solo cuenta mientras no vence.
+    """
+    medico = models.ForeignKey(
+        settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='reservas_temporales_como_medico',
+        verbose_name=_("Médico"),
+    )
+    fecha_hora = models.DateTimeField(_("Fecha y Hora"))
+    paciente = models.ForeignKey(
+        settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='reservas_temporales',
+        verbose_name=_("Paciente"),
+    )
+    especialidad = models.ForeignKey(Especialidad, on_delete=models.CASCADE, verbose_name=_("Especialidad"))
+    expira_en = models.DateTimeField(_("Expira en"))
+
+    class Meta:
+        verbose_name = _("Reserva temporal")
+        verbose_name_plural = _("Reservas temporales")
+        constraints = [
+            # Un horario lo retiene un solo paciente a la vez (las vencidas se reemplazan).
+            models.UniqueConstraint(fields=['medico', 'fecha_hora'], name='reserva_temporal_unica'),
+        ]
+        indexes = [
+            # Limpieza de las vencidas (paneladmin.reservas_temporales.limpiar_vencidas).
+            models.Index(fields=['expira_en'], name='reserva_temporal_expira_idx'),
+        ]
+
+    def __str__(self):
+        return f"Horario {self.fecha_hora} de {self.medico_id} retenido por {self.paciente_id}"
@@ -0,0 +1,206 @@
+"""
+Notificaciones por correo con bandeja de salida transaccional (outbox).
+
+Las vistas que cambian una cita llaman a registrar_* dentro de la misma
+transacción: la fila de Notificacion se confirma junto con la cita, o no se
+confirma ninguna. La petición nunca habla con el servidor de correo.
+
+El despachador (despachar_pendientes) vacía la bandeja por lotes:
+
+- Lo encola la cola de tareas al registrar cada notificación, y también se puede
+  ejecutar con `python manage.py despachar_notificaciones`.
+- Reclama un lote con un UPDATE condicional (ENVIANDO) para que dos
+  despachadores nunca envíen la misma fila.
+- Cada correo lleva un Message-ID fijo derivado de la clave del evento, de modo
+  que si un despachador cae después de enviar y antes de marcar la fila, el
+  reenvío se reconoce como duplicado.
+
+El transporte es configurable con VITALLIFE_TRANSPORTE_NOTIFICACIONES; el
+incluido usa EMAIL_BACKEND, así que en desarrollo basta con el backend de
+consola o de archivos de Django.
+"""
+import logging
+from datetime import timedelta
+from functools import lru_cache
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db import connection, transaction
+from django.db.models import F
+from django.template.loader import render_to_string
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .cola import encolar
+
+logger = logging.getLogger(__name__)
+
+TAMANO_LOTE = 50
+MAX_INTENTOS = 8
+
+# Una fila ENVIANDO por más tiempo se considera de un despachador caído.
+TIEMPO_MAXIMO_ENVIO = timedelta(minutes=10)
+
+
+class TransporteCorreo:
+    """Envía las notificaciones con el EMAIL_BACKEND configurado, una conexión por lote."""
+
+    def enviar(self, notificaciones):
+        """Devuelve {id: None si se envió, o el error}."""
+        resultados = {}
+        dominio = getattr(settings, 'VITALLIFE_DOMINIO_CORREO', 'vitallife.cl')
+        with get_connection() as conexion:
+            for notificacion in notificaciones:
+                mensaje = EmailMessage(
+                    subject=notificacion.asunto,
+                    body=notificacion.cuerpo,
+                    from_email=settings.DEFAULT_FROM_EMAIL,
+                    to=[notificacion.destinatario],
+                    headers={'Message-ID': f'<{notificacion.clave}@{dominio}>'},
+                    connection=conexion,
+                )
+                try:
+                    mensaje.send()
+                    resultados[notificacion.id] = None
+                except Exception as error:
+                    resultados[notificacion.id] = repr(error)
+        return resultados
+
+
+@lru_cache(maxsize=None)
+def obtener_transporte():
+    ruta = getattr(settings, 'VITALLIFE_TRANSPORTE_NOTIFICACIONES', 'paneladmin.notificaciones.TransporteCorreo')
+    return import_string(ruta)()
+
+
+def registrar(clave, destinatario, asunto, plantilla, contexto):
+    """
+    Agrega una notificación a la bandeja de salida. Debe llamarse dentro de la
+    transacción que hace el cambio; si el evento ya se registró, no hace nada.
+    """
+    from .models import Notificacion
+
+    if not destinatario:
+        return None
+    notificacion, creada = Notificacion.objects.get_or_create(
+        clave=clave,
+        defaults={
+            'destinatario': destinatario,
+            'asunto': asunto,
+            'cuerpo': render_to_string(plantilla, contexto),
+        },
+    )
+    if creada:
+        encolar('paneladmin.tareas.despachar_notificaciones', unica=True)
+    return notificacion
+
+
+def registrar_lote(mensajes):
+    """
+    Variante de registrar() para muchos eventos a la vez: mensajes es una lista
+    de tuplas (clave, destinatario, asunto, plantilla, contexto). Las claves ya
+    registradas se ignoran.
+    """
+    from .models import Notificacion
+
+    filas = [
+        Notificacion(
+            clave=clave, destinatario=destinatario, asunto=asunto,
+            cuerpo=render_to_string(plantilla, contexto),
+        )
+        for clave, destinatario, asunto, plantilla, contexto in mensajes
+        if destinatario
+    ]
+    if filas:
+        Notificacion.objects.bulk_create(filas, batch_size=500, ignore_conflicts=True)
+        encolar('paneladmin.tareas.despachar_notificaciones', unica=True)
+    return len(filas)
+
+
+def registrar_cita_agendada(cita):
+    return registrar(
+        f'cita-{cita.id}-agendada',
+        cita.paciente.email,
+        f"Confirmación de tu cita de {cita.especialidad.nombre}",
+        'correos/confirmacion_cita.txt',
+        {'cita': cita, 'fecha_hora': timezone.localtime(cita.fecha_hora)},
+    )
+
+
+def registrar_cita_cancelada(cita, por_administracion=False):
+    return registrar(
+        f'cita-{cita.id}-cancelada',
+        cita.paciente.email,
+        f"Tu cita de {cita.especialidad.nombre} fue cancelada",
+        'correos/cancelacion_cita.txt',
+        {
+            'cita': cita,
+            'fecha_hora': timezone.localtime(cita.fecha_hora),
+            'por_administracion': por_administracion,
+        },
+    )
+
+
+def _reclamar_lote(tamano):
+    from .models import Notificacion
+
+    ahora = timezone.now()
+    # Devolvemos a la bandeja lo que quedó a medio enviar.
+    Notificacion.objects.filter(
+        estado=Notificacion.Estado.ENVIANDO, reclamada_en__lt=ahora - TIEMPO_MAXIMO_ENVIO
+    ).update(estado=Notificacion.Estado.PENDIENTE)
+
+    candidatas = Notificacion.objects.filter(
+        estado=Notificacion.Estado.PENDIENTE, proximo_intento__lte=ahora
+    ).order_by('proximo_intento', 'id')
+    with transaction.atomic():
+        if connection.features.has_select_for_update_skip_locked:
+            candidatas = candidatas.select_for_update(skip_locked=True)
+        ids = list(candidatas.values_list('id', flat=True)[:tamano])
+        Notificacion.objects.filter(id__in=ids, estado=Notificacion.Estado.PENDIENTE).update(
+            estado=Notificacion.Estado.ENVIANDO, reclamada_en=ahora, intentos=F('intentos') + 1
+        )
+    # Solo las que este despachador efectivamente reclamó.
+    return list(Notificacion.objects.filter(id__in=ids, estado=Notificacion.Estado.ENVIANDO, reclamada_en=ahora))
+
+
+def despachar_lote(tamano=TAMANO_LOTE):
+    """Envía un lote de la bandeja. Devuelve (enviadas, fallidas)."""
+    from .models import Notificacion
+
+    lote = _reclamar_lote(tamano)
+    if not lote:
+        return 0, 0
+
+    resultados = obtener_transporte().enviar(lote)
+    ahora = timezone.now()
+    enviadas = [notificacion.id for notificacion in lote if resultados.get(notificacion.id, 'sin resultado') is None]
+    Notificacion.objects.filter(id__in=enviadas).update(
+        estado=Notificacion.Estado.ENVIADA, enviada_en=ahora, ultimo_error=''
+    )
+
+    fallidas = 0
+    for notificacion in lote:
+        if notificacion.id in enviadas:
+            continue
+        fallidas += 1
+        error = resultados.get(notificacion.id) or 'El transporte no informó un resultado.'
+        logger.warning("No se pudo enviar la notificación %s: %s", notificacion.clave, error)
+        if notificacion.intentos >= MAX_INTENTOS:
+            cambios = {'estado': Notificacion.Estado.FALLIDA}
+        else:
+            espera = timedelta(minutes=2 ** (notificacion.intentos - 1))
+            cambios = {'estado': Notificacion.Estado.PENDIENTE, 'proximo_intento': ahora + espera}
+        Notificacion.objects.filter(id=notificacion.id).update(ultimo_error=error, **cambios)
+    return len(enviadas), fallidas
+
+
+def despachar_pendientes(tamano=TAMANO_LOTE):
+    """Vacía la bandeja lote por lote. Devuelve (enviadas, fallidas)."""
+    total_enviadas = total_fallidas = 0
+    while True:
+        enviadas, fallidas = despachar_lote(tamano)
+        total_enviadas += enviadas
+        total_fallidas += fallidas
+        if enviadas + fallidas < tamano:
+            return total_enviadas, total_fallidas
@@ -0,0 +1,196 @@
+"""
+Lista de pacientes de cada médico (RelacionMedicoPaciente).
+
+Hay una fila por par médico-paciente con alguna cita, activa o archivada y de
+cualquier estado. Cada fila guarda la primera cita, la última y la próxima
+visita y el número de visitas. Las visitas son citas pasadas sin contar
+canceladas ni inasistencias, como en paneladmin.estadisticas.
+
+- Las señales de Cita y la importación de citas llaman a actualizar_despues()
+  con los pares afectados. Al confirmar la transacción se recalculan con una
+  consulta agrupada por tabla. El cierre de citas vencidas y el archivo no
+  cambian ninguna fila.
+- Los cambios de nombre o RUT del paciente se copian en sus filas (señales de
+  Usuario).
+- Una próxima visita deja de serlo cuando pasa su hora. Por eso pagina()
+  recalcula primero las filas del médico con la próxima visita vencida
+  (índice medico, proxima_visita).
+- pagina() ordena por apellido y nombre con un cursor (orden, paciente_id).
+  Busca por prefijo de apellido, de nombre o de RUT, siempre sobre índices que
+  empiezan por el médico.
+"""
+import base64
+import re
+import unicodedata
+
+from django.db import connections, transaction
+from django.db.models import Count, Max, Min, Q
+from django.utils import timezone
+
+from usuario.validadores import limpiar_rut
+
+TAMANO_PAGINA = 25
+
+# Pares por consulta al recalcular (el filtro es un OR de pares).
+PARES_POR_CONSULTA = 200
+
+CAMPOS_CALCULADOS = ('primera_cita', 'ultima_visita', 'proxima_visita', 'visitas')
+CAMPOS_PACIENTE = ('orden', 'nombre_apellido', 'rut')
+
+PATRON_RUT = re.compile(r'[\d.\-\s]*\d[\d.\-\s]*[kK]?')
+
+
+def normalizar_texto(texto):
+    """Minúsculas, sin tildes y con los espacios colapsados."""
+    sin_tildes = ''.join(
+        caracter for caracter in unicodedata.normalize('NFKD', texto or '') if not unicodedata.combining(caracter)
+    )
+    return ' '.join(sin_tildes.lower().split())
+
+
+def datos_paciente(nombre, apellido, rut):
+    """Copias normalizadas que se guardan en la relación."""
+    return {
+        'orden': normalizar_texto(f'{apellido} {nombre}')[:255],
+        'nombre_apellido': normalizar_texto(f'{nombre} {apellido}')[:255],
+        'rut': limpiar_rut(rut),
+    }
+
+
+def _agrupar(modelo, pares, ahora, con_proxima):
+    from .models import Cita
+
+    filtro = Q()
+    for medico_id, paciente_id in pares:
+        filtro |= Q(medico_id=medico_id, paciente_id=paciente_id)
+    pasada = Q(fecha_hora__lt=ahora) & ~Q(estado__in=[Cita.EstadoCita.CANCELADA, Cita.EstadoCita.NO_ASISTIO])
+    agregados = {
+        'primera_cita': Min('fecha_hora'),
+        'ultima_visita': Max('fecha_hora', filter=pasada),
+        'visitas': Count('id', filter=pasada),
+    }
+    if con_proxima:
+        agregados['proxima_visita'] = Min(
+            'fecha_hora', filter=Q(fecha_hora__gte=ahora, estado=Cita.EstadoCita.RESERVADA)
+        )
+    return modelo.objects.filter(filtro).values('medico_id', 'paciente_id').annotate(**agregados).order_by()
+
+
+def _combinar(actual, archivada):
+    if actual is None:
+        return dict(archivada, proxima_visita=None)
+    ultimas = [fecha for fecha in (actual['ultima_visita'], archivada['ultima_visita']) if fecha]
+    return {
+        'primera_cita': min(actual['primera_cita'], archivada['primera_cita']),
+        'ultima_visita': max(ultimas) if ultimas else None,
+        'proxima_visita': actual['proxima_visita'],
+        'visitas': actual['visitas'] + archivada['visitas'],
+    }
+
+
+def actualizar(pares):
+    """Recalcula las filas de los pares (medico_id, paciente_id); borra las que ya no tienen citas."""
+    from usuario.models import Usuario
+    from .models import Cita, CitaArchivada, RelacionMedicoPaciente
+
+    pares = list({par for par in pares if None not in par})
+    ahora = timezone.now()
+    for inicio in range(0, len(pares), PARES_POR_CONSULTA):
+        bloque = pares[inicio:inicio + PARES_POR_CONSULTA]
+        datos = {}
+        for fila in _agrupar(Cita, bloque, ahora, con_proxima=True):
+            datos[fila.pop('medico_id'), fila.pop('paciente_id')] = fila
+        for fila in _agrupar(CitaArchivada, bloque, ahora, con_proxima=False):
+            par = (fila.pop('medico_id'), fila.pop('paciente_id'))
+            datos[par] = _combinar(datos.get(par), fila)
+
+        sin_citas = Q()
+        for medico_id, paciente_id in set(bloque) - datos.keys():
+            sin_citas |= Q(medico_id=medico_id, paciente_id=paciente_id)
+        if sin_citas:
+            RelacionMedicoPaciente.objects.filter(sin_citas).delete()
+        if not datos:
+            continue
+
+        pacientes = {
+            fila['id']: datos_paciente(fila['nombre'], fila['apellido'], fila['rut'])
+            for fila in Usuario.objects.filter(id__in={paciente_id for _, paciente_id in datos}).values(
+                'id', 'nombre', 'apellido', 'rut'
+            )
+        }
+        relaciones = [
+            RelacionMedicoPaciente(medico_id=medico_id, paciente_id=paciente_id, **valores, **pacientes[paciente_id])
+            for (medico_id, paciente_id), valores in datos.items()
+            if paciente_id in pacientes
+        ]
+        # MySQL no acepta indicar la restricción del upsert; usa la única que choca.
+        conexion = connections[RelacionMedicoPaciente.objects.db]
+        RelacionMedicoPaciente.objects.bulk_create(
+            relaciones, update_conflicts=True,
+            unique_fields=['medico', 'paciente'] if conexion.features.supports_update_conflicts_with_target else None,
+            update_fields=CAMPOS_CALCULADOS + CAMPOS_PACIENTE,
+        )
+
+
+def actualizar_despues(*pares):
+    """Recalcula los pares al confirmar la transacción en curso."""
+    pares = set(pares)
+    if pares:
+        transaction.on_commit(lambda: actualizar(pares))
+
+
+def copiar_datos_paciente(usuario):
+    """Copia el nombre y el RUT (normalizados) del paciente en todas sus relaciones."""
+    from .models import RelacionMedicoPaciente
+
+    RelacionMedicoPaciente.objects.filter(paciente_id=usuario.pk).update(
+        **datos_paciente(usuario.nombre, usuario.apellido, usuario.rut)
+    )
+
+
+def refrescar_vencidas(medico_id):
+    """Recalcula las filas del médico cuya próxima visita ya pasó."""
+    from .models import RelacionMedicoPaciente
+
+    actualizar(RelacionMedicoPaciente.objects.filter(
+        medico_id=medico_id, proxima_visita__lte=timezone.now()
+    ).values_list('medico_id', 'paciente_id'))
+
+
+def codificar_cursor(relacion):
+    return base64.urlsafe_b64encode(f'{relacion.paciente_id}:{relacion.orden}'.encode()).decode()
+
+
+def decodificar_cursor(cursor):
+    """(orden, paciente_id) del cursor; ValueError si no es válido."""
+    paciente_id, orden = base64.urlsafe_b64decode(cursor.encode()).decode().split(':', 1)
+    return orden, int(paciente_id)
+
+
+def pagina(medico, busqueda='', cursor=None, tamano=TAMANO_PAGINA):
+    """
+    Una página de pacientes del médico (relaciones con el paciente precargado),
+    ordenada por apellido y nombre. Devuelve (relaciones, cursor siguiente o None).
+    """
+    from .models import RelacionMedicoPaciente
+
+    refrescar_vencidas(medico.pk)
+    relaciones = RelacionMedicoPaciente.objects.filter(medico=medico)
+
+    busqueda = (busqueda or '').strip()
+    if busqueda and PATRON_RUT.fullmatch(busqueda):
+        relaciones = relaciones.filter(rut__istartswith=limpiar_rut(busqueda))
+    elif busqueda:
+        texto = normalizar_texto(busqueda)
+        # Los valores ya están normalizados: istartswith es un LIKE 'texto%' que usa el índice.
+        relaciones = relaciones.filter(Q(orden__istartswith=texto) | Q(nombre_apellido__istartswith=texto))
+
+    if cursor:
+        orden, paciente_id = decodificar_cursor(cursor)
+        relaciones = relaciones.filter(Q(orden__gt=orden) | Q(orden=orden, paciente_id__gt=paciente_id))
+
+    relaciones = list(relaciones.select_related('paciente').order_by('orden', 'paciente_id')[:tamano + 1])
+    if len(relaciones) <= tamano:
+        return relaciones, None
+    relaciones = relaciones[:tamano]
+    return relaciones, codificar_cursor(relaciones[-1])
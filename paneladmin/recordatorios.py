@@ -0,0 +1,93 @@
+"""
+Recordatorios de citas, 24 y 2 horas antes.
+
+Cada pasada (`python manage.py enviar_recordatorios`, vía cron cada pocos
+minutos) revisa, por cada tipo de recordatorio, solo la ventana de citas
+RESERVADAS cuya hora cae entre (ahora + anticipación - tolerancia) y
+(ahora + anticipación), usando el índice (estado, fecha_hora). Así el costo de
+una pasada depende de las citas de esa ventana y no del tamaño de la tabla.
+
+Las citas se recorren por tramos ordenados por (fecha_hora, id). Por cada tramo,
+en una transacción, se marcan los recordatorios (RecordatorioCita, único por
+cita y tipo) y se dejan los correos en la bandeja de salida, que los envía
+por lotes.
+"""
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from . import notificaciones
+
+# Tipo -> anticipación con la que se envía.
+ANTICIPACION = {
+    '24H': timedelta(hours=24),
+    '2H': timedelta(hours=2),
+}
+
+# Atraso máximo con el que todavía se envía un recordatorio (cubre pasadas
+# perdidas o lentas). Debe ser mayor que el intervalo del cron.
+TOLERANCIA = timedelta(minutes=30)
+
+TAMANO_TRAMO = 500
+
+
+def _ventana(tipo, ahora, tolerancia):
+    hasta = ahora + ANTICIPACION[tipo]
+    return hasta - tolerancia, hasta
+
+
+def _tramos(tipo, desde, hasta, tamano):
+    """Citas pendientes de este recordatorio en la ventana, de a `tamano` por vez."""
+    from .models import Cita
+
+    base = (
+        Cita.objects.filter(estado=Cita.EstadoCita.RESERVADA, fecha_hora__gt=desde, fecha_hora__lte=hasta)
+        .exclude(recordatorios__tipo=tipo)
+        .select_related('paciente', 'medico', 'especialidad')
+        .order_by('fecha_hora', 'id')
+    )
+    ultimo = None
+    while True:
+        consulta = base
+        if ultimo is not None:
+            consulta = consulta.filter(
+                Q(fecha_hora__gt=ultimo.fecha_hora) | Q(fecha_hora=ultimo.fecha_hora, id__gt=ultimo.id)
+            )
+        tramo = list(consulta[:tamano])
+        if not tramo:
+            return
+        yield tramo
+        ultimo = tramo[-1]
+
+
+def _mensaje(cita, tipo):
+    fecha_hora = timezone.localtime(cita.fecha_hora)
+    cuando = 'mañana' if tipo == '24H' else 'hoy'
+    return (
+        f'cita-{cita.id}-recordatorio-{tipo.lower()}',
+        cita.paciente.email,
+        f"Recordatorio: tu cita de {cita.especialidad.nombre} es {cuando} a las {fecha_hora:%H:%M}",
+        'correos/recordatorio_cita.txt',
+        {'cita': cita, 'fecha_hora': fecha_hora, 'cuando': cuando},
+    )
+
+
+def generar(ahora=None, tolerancia=TOLERANCIA, tamano=TAMANO_TRAMO, tipos=None):
+    """Genera los recordatorios que corresponden. Devuelve {tipo: cantidad}."""
+    from .models import RecordatorioCita
+
+    ahora = ahora or timezone.now()
+    generados = {}
+    for tipo in tipos or ANTICIPACION:
+        desde, hasta = _ventana(tipo, ahora, tolerancia)
+        generados[tipo] = 0
+        for tramo in _tramos(tipo, desde, hasta, tamano):
+            with transaction.atomic():
+                RecordatorioCita.objects.bulk_create(
+                    [RecordatorioCita(cita=cita, tipo=tipo) for cita in tramo], ignore_conflicts=True
+                )
+                notificaciones.registrar_lote([_mensaje(cita, tipo) for cita in tramo])
+            generados[tipo] += len(tramo)
+    return generados
@@ -0,0 +1,95 @@
+"""
+Cálculo de los reportes administrativos.
+
+Los números se precalculan en segundo plano (tarea `precalcular_reportes`, que
+se encola cuando cambian las citas) y se guardan en la caché compartida; la
+vista solo los lee. Si aún no hay un cálculo del día, se hace en la petición.
+"""
+from datetime import datetime, time, timedelta
+from typing import NamedTuple
+
+from django.core.cache import cache
+from django.db.models import Count, Q
+from django.utils import timezone
+
+# Horas de trabajo estándar (10:00 a 16:00 -> 7 slots por día)
+HORAS_LABORALES = 7
+
+DIAS_OCUPACION = 30
+
+
+class ConsultasEspecialidad(NamedTuple):
+    nombre: str
+    num_citas: int
+
+
+def _clave(hoy):
+    return f'reportes:admin:{hoy.isoformat()}'
+
+
+def calcular(hoy=None):
+    from usuario.models import Usuario
+    from .models import Especialidad, Cita, CitaArchivada
+
+    hoy = hoy or timezone.now().date()
+
+    # 1. Consultas realizadas por especialidad. Las citas pasadas se cierran como
+    # COMPLETADA o NO_ASISTIO (ver paneladmin.cierre_citas), así que basta un estado.
+    # Se suman las archivadas aparte: dos Count sobre relaciones distintas en la
+    # misma consulta multiplicarían las filas del JOIN.
+    archivadas = dict(
+        CitaArchivada.objects.filter(estado=Cita.EstadoCita.COMPLETADA)
+        .values_list('especialidad_id').annotate(total=Count('id')).order_by()
+    )
+    consultas_por_especialidad = sorted(
+        (
+            ConsultasEspecialidad(nombre, num_citas + archivadas.get(especialidad_id, 0))
+            for especialidad_id, nombre, num_citas in Especialidad.objects.annotate(
+                num_citas=Count('cita', filter=Q(cita__estado=Cita.EstadoCita.COMPLETADA))
+            ).values_list('id', 'nombre', 'num_citas')
+        ),
+        key=lambda consultas: consultas.num_citas,
+        reverse=True,
+    )
+
+    # 2. Porcentaje de ocupación en los últimos 30 días (lunes a viernes): horarios
+    # que quedaron tomados, se haya presentado o no el paciente.
+    fecha_inicio = hoy - timedelta(days=DIAS_OCUPACION)
+    dias_habiles = sum(
+        1 for i in range(DIAS_OCUPACION + 1) if (fecha_inicio + timedelta(days=i)).weekday() < 5
+    )
+    total_slots_posibles = Usuario.objects.filter(role='MEDICO').count() * dias_habiles * HORAS_LABORALES
+
+    inicio = timezone.make_aware(datetime.combine(fecha_inicio, time.min))
+    fin = timezone.make_aware(datetime.combine(hoy + timedelta(days=1), time.min))
+    citas_ocupadas = Cita.objects.filter(
+        estado__in=[Cita.EstadoCita.COMPLETADA, Cita.EstadoCita.NO_ASISTIO, Cita.EstadoCita.RESERVADA],
+        fecha_hora__range=(inicio, fin),
+    ).count()
+
+    # Calculamos el porcentaje. La plantilla se encargará del formato.
+    porcentaje = (citas_ocupadas / total_slots_posibles * 100) if total_slots_posibles > 0 else 0
+
+    return {
+        'consultas_por_especialidad': consultas_por_especialidad,
+        'porcentaje_ocupacion': porcentaje,
+        'citas_ocupadas': citas_ocupadas,
+        'total_slots_posibles': total_slots_posibles,
+        'fecha_inicio': fecha_inicio,
+        'hoy': hoy,
+    }
+
+
+def precalcular():
+    hoy = timezone.now().date()
+    reportes = calcular(hoy)
+    cache.set(_clave(hoy), reportes, 60 * 60 * 24)
+    return reportes
+
+
+def obtener():
+    """Reportes del día, desde la caché si ya fueron calculados."""
+    reportes = cache.get(_clave(timezone.now().date()))
+    if reportes is None:
+        reportes = precalcular()
+    return reportes
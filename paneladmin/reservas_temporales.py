@@ -0,0 +1,165 @@
+"""
+Retención temporal de horarios durante la confirmación de una cita.
+
+Al elegir un horario en seleccionar_horario.html, el paciente lo retiene por
+DURACION (ReservaTemporal) mientras escribe el motivo. Para los demás ese horario
+queda tomado: la disponibilidad lo descuenta, se anuncia por SSE y se avanzan
+los sellos de versión del día. agendar_cita_view convierte la retención en la
+Cita y la borra en la misma transacción.
+
+- Un paciente retiene un horario a la vez: al tomar otro se libera el anterior.
+- Una retención vencida deja de contar aunque siga en la tabla (las lecturas
+  filtran por expira_en) y la reemplaza quien tome ese horario.
+- Al crearla se encola `liberar_reserva_temporal` para su vencimiento, que la
+  borra, avanza los sellos y anuncia el horario libre. `python manage.py
+  liberar_reservas_temporales` (cron) recoge las que quedaron por el índice de
+  expira_en, sin recorrer la tabla.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from . import versiones
+from .cola import encolar
+from .eventos import SLOT_LIBERADO, SLOT_TOMADO, publicar_cambio_horario
+
+TAMANO_LOTE = 500
+
+
+def duracion():
+    return timedelta(minutes=getattr(settings, 'VITALLIFE_MINUTOS_RESERVA_TEMPORAL', 5))
+
+
+def _avisar(tipo, filas):
+    """Al confirmar: sellos médico-día y especialidad-día y anuncio SSE de filas (medico, especialidad_id, fecha_hora)."""
+    if not filas:
+        return
+
+    def avisar():
+        versiones.incrementar(*versiones.claves_citas(
+            (medico.id, especialidad_id, fecha_hora) for medico, especialidad_id, fecha_hora in filas
+        ))
+        for medico, especialidad_id, fecha_hora in filas:
+            publicar_cambio_horario(tipo, medico, especialidad_id, fecha_hora)
+
+    transaction.on_commit(avisar)
+
+
+def _borrar(reservas):
+    """Borra las retenciones y devuelve sus filas (medico, especialidad_id, fecha_hora) para _avisar."""
+    filas = [
+        (reserva.medico, reserva.especialidad_id, reserva.fecha_hora)
+        for reserva in reservas.select_related('medico')
+    ]
+    reservas.delete()
+    return filas
+
+
+def reservar(paciente, medico, fecha_hora):
+    """
+    Retiene el horario para el paciente. Devuelve la ReservaTemporal, o None si
+    no está disponible. Usa la especialidad del médico (como las señales de
+    Cita), no la que envía el cliente, para los sellos y el canal SSE.
+    """
+    from .models import Cita, HorarioBloqueado, ReservaTemporal
+
+    ahora = timezone.now()
+    especialidad_id = medico.especialidad_id
+    if fecha_hora <= ahora or especialidad_id is None or not medico.is_active:
+        # Un médico desactivado tiene la eliminación pendiente (eliminacion_usuarios).
+        return None
+    with transaction.atomic():
+        if (
+            # Una cita cancelada no ocupa el horario (agendar_cita_view la reemplaza).
+            Cita.objects.filter(medico=medico, fecha_hora=fecha_hora).exclude(estado=Cita.EstadoCita.CANCELADA).exists()
+            or HorarioBloqueado.objects.filter(medico=medico, fecha_hora=fecha_hora).exists()
+        ):
+            return None
+        # La retención de este horario se reemplaza si es del mismo paciente (la
+        # renueva) o si venció. Si otro la tiene vigente, no hay ninguna de estas.
+        ReservaTemporal.objects.filter(medico=medico, fecha_hora=fecha_hora).filter(
+            Q(paciente=paciente) | Q(expira_en__lte=ahora)
+        ).delete()
+        try:
+            with transaction.atomic():
+                reserva = ReservaTemporal.objects.create(
+                    medico=medico, fecha_hora=fecha_hora, paciente=paciente, especialidad_id=especialidad_id,
+                    expira_en=ahora + duracion(),
+                )
+        except IntegrityError:
+            # Otro paciente la tiene retenida; la anterior del paciente sigue en pie.
+            return None
+        # Recién ahora se libera la anterior del paciente: retiene un horario a la vez.
+        _avisar(SLOT_LIBERADO, _borrar(ReservaTemporal.objects.filter(paciente=paciente).exclude(id=reserva.id)))
+        encolar('paneladmin.tareas.liberar_reserva_temporal', reserva.id, retraso=duracion())
+        _avisar(SLOT_TOMADO, [(medico, especialidad_id, fecha_hora)])
+    return reserva
+
+
+def liberar(paciente, medico_id, fecha_hora):
+    """El paciente desistió: el horario vuelve a estar disponible."""
+    from .models import ReservaTemporal
+
+    with transaction.atomic():
+        _avisar(SLOT_LIBERADO, _borrar(
+            ReservaTemporal.objects.filter(paciente=paciente, medico_id=medico_id, fecha_hora=fecha_hora)
+        ))
+
+
+def tomada_por_otro(paciente, medico_id, fecha_hora):
+    """True si otro paciente tiene retenido ese horario (y su retención no venció)."""
+    from .models import ReservaTemporal
+
+    return ReservaTemporal.objects.filter(
+        medico_id=medico_id, fecha_hora=fecha_hora, expira_en__gt=timezone.now(),
+    ).exclude(paciente=paciente).exists()
+
+
+def consumir(paciente, medico_id, fecha_hora):
+    """
+    Borra la retención del paciente sobre el horario, una vez creada la Cita en
+    la misma transacción (el horario ya no se anuncia como libre).
+    """
+    from .models import ReservaTemporal
+
+    ReservaTemporal.objects.filter(paciente=paciente, medico_id=medico_id, fecha_hora=fecha_hora).delete()
+
+
+def retenidos(medico_ids, desde, hasta, excepto_paciente=None):
+    """Horarios (medico_id, fecha_hora) retenidos y vigentes en el rango, salvo los del paciente indicado."""
+    from .models import ReservaTemporal
+
+    reservas = ReservaTemporal.objects.filter(
+        medico_id__in=medico_ids, fecha_hora__range=(desde, hasta), expira_en__gt=timezone.now(),
+    )
+    if excepto_paciente is not None:
+        reservas = reservas.exclude(paciente_id=excepto_paciente)
+    return set(reservas.values_list('medico_id', 'fecha_hora'))
+
+
+def vencer(reserva_id):
+    """Libera la retención si ya venció (tarea programada para su vencimiento)."""
+    from .models import ReservaTemporal
+
+    with transaction.atomic():
+        _avisar(SLOT_LIBERADO, _borrar(ReservaTemporal.objects.filter(id=reserva_id, expira_en__lte=timezone.now())))
+
+
+def limpiar_vencidas(lote=TAMANO_LOTE):
+    """Libera por lotes, sobre el índice de expira_en, las retenciones vencidas. Devuelve cuántas."""
+    from .models import ReservaTemporal
+
+    total = 0
+    while True:
+        with transaction.atomic():
+            ids = list(ReservaTemporal.objects.filter(
+                expira_en__lte=timezone.now()
+            ).order_by('expira_en').values_list('id', flat=True)[:lote])
+            filas = _borrar(ReservaTemporal.objects.filter(id__in=ids))
+            _avisar(SLOT_LIBERADO, filas)
+            total += len(filas)
+        if len(ids) < lote:
+            return total
@@ -0,0 +1,248 @@
+from django.db import transaction
+from django.core.files import File
+from django.db.models.signals import post_init, pre_save, post_save, post_delete
+from django.dispatch import receiver
+from django.utils import timezone
+
+from usuario.models import Usuario
+from . import estadisticas, historial_ficha, pacientes_medico, tareas, versiones
+from .almacenamiento import almacenamiento_deduplicado, modelos_deduplicados
+from .cola import encolar
+from .eventos import SLOT_TOMADO, SLOT_LIBERADO, publicar_cambio_horario
+from .models import Especialidad, Cita, HorarioBloqueado, FichaMedica, Diagnostico, Receta
+
+# Campos de un médico que se muestran en el catálogo de horarios.
+CAMPOS_PLANTEL = ('role', 'especialidad_id', 'nombre', 'apellido', 'foto_perfil', 'is_active')
+
+
+def _anunciar(tipo, medico, especialidad_id, fecha_hora):
+    # Solo se anuncia lo que efectivamente quedó guardado.
+    transaction.on_commit(lambda: publicar_cambio_horario(tipo, medico, especialidad_id, fecha_hora))
+
+
+def _invalidar_disponibilidad(medico, especialidad_ids, *fechas_hora):
+    """Avanza los sellos médico-día y especialidad-día afectados al confirmar la transacción."""
+    claves = set()
+    for fecha_hora in fechas_hora:
+        if fecha_hora is None:
+            continue
+        fecha = timezone.localtime(fecha_hora).date()
+        claves.add(versiones.clave_medico_dia(medico.id, fecha))
+        for especialidad_id in especialidad_ids:
+            if especialidad_id is not None:
+                claves.add(versiones.clave_especialidad_dia(especialidad_id, fecha))
+    if claves:
+        transaction.on_commit(lambda: versiones.incrementar(*claves))
+
+
+def _datos_plantel(usuario):
+    # Leemos desde __dict__ para no disparar consultas sobre campos diferidos (.only()).
+    datos = []
+    for campo in CAMPOS_PLANTEL:
+        valor = usuario.__dict__.get(campo)
+        datos.append(getattr(valor, 'name', valor))
+    return tuple(datos)
+
+
+def _datos_busqueda(usuario):
+    # Lo que la lista de pacientes de cada médico copia del paciente.
+    return tuple(usuario.__dict__.get(campo) for campo in ('nombre', 'apellido', 'rut'))
+
+
+def _invalidar_historial(paciente_id):
+    transaction.on_commit(lambda: versiones.incrementar(versiones.clave_paciente(paciente_id)))
+
+
+def _invalidar_catalogo():
+    transaction.on_commit(lambda: versiones.incrementar(versiones.CLAVE_CATALOGO))
+
+
+def _generar_miniaturas(nombre):
+    # Se generan en la cola; si aún no están listas, la vista de miniaturas las crea bajo demanda.
+    encolar(tareas.generar_miniaturas, nombre)
+
+
+def _recalcular_reportes():
+    encolar(tareas.precalcular_reportes, unica=True)
+
+
+@receiver(post_init, sender=Cita)
+def recordar_estado_cita(sender, instance, **kwargs):
+    """Guardamos el estado con el que se cargó la cita para detectar transiciones."""
+    # Leemos desde __dict__ para no disparar consultas sobre campos diferidos (.only()).
+    instance._estado_inicial = instance.__dict__.get('estado')
+    instance._fecha_hora_inicial = instance.__dict__.get('fecha_hora')
+
+
+@receiver(post_save, sender=Cita)
+def cita_guardada(sender, instance, created, **kwargs):
+    estaba_reservada = not created and instance._estado_inicial == Cita.EstadoCita.RESERVADA
+    esta_reservada = instance.estado == Cita.EstadoCita.RESERVADA
+    if esta_reservada and not estaba_reservada:
+        _anunciar(SLOT_TOMADO, instance.medico, instance.especialidad_id, instance.fecha_hora)
+    elif estaba_reservada and not esta_reservada and instance.fecha_hora > timezone.now():
+        # Al cerrar o marcar inasistencia de una cita pasada no se libera ningún horario.
+        _anunciar(SLOT_LIBERADO, instance.medico, instance.especialidad_id, instance.fecha_hora)
+
+    if created or instance._estado_inicial != instance.estado or instance._fecha_hora_inicial != instance.fecha_hora:
+        _invalidar_disponibilidad(
+            instance.medico, {instance.especialidad_id, instance.medico.especialidad_id},
+            instance.fecha_hora, instance._fecha_hora_inicial,
+        )
+        _recalcular_reportes()
+    pacientes_medico.actualizar_despues((instance.medico_id, instance.paciente_id))
+    estadisticas.invalidar(instance.paciente_id, instance.medico_id)
+    _invalidar_historial(instance.paciente_id)
+    instance._estado_inicial = instance.estado
+    instance._fecha_hora_inicial = instance.fecha_hora
+
+
+@receiver(post_delete, sender=Cita)
+def cita_eliminada(sender, instance, **kwargs):
+    if instance.estado == Cita.EstadoCita.RESERVADA:
+        _anunciar(SLOT_LIBERADO, instance.medico, instance.especialidad_id, instance.fecha_hora)
+    _invalidar_disponibilidad(
+        instance.medico, {instance.especialidad_id, instance.medico.especialidad_id}, instance.fecha_hora
+    )
+    _recalcular_reportes()
+    pacientes_medico.actualizar_despues((instance.medico_id, instance.paciente_id))
+    estadisticas.invalidar(instance.paciente_id, instance.medico_id)
+    _invalidar_historial(instance.paciente_id)
+
+
+@receiver(post_save, sender=Diagnostico)
+@receiver(post_delete, sender=Diagnostico)
+@receiver(post_save, sender=Receta)
+@receiver(post_delete, sender=Receta)
+def detalle_cita_modificado(sender, instance, **kwargs):
+    # Las vistas los guardan con la cita ya cargada; si no, una consulta por el paciente.
+    _invalidar_historial(instance.cita.paciente_id)
+
+
+@receiver(post_save, sender=HorarioBloqueado)
+def horario_bloqueado(sender, instance, created, **kwargs):
+    if created:
+        _anunciar(SLOT_TOMADO, instance.medico, instance.medico.especialidad_id, instance.fecha_hora)
+        _invalidar_disponibilidad(instance.medico, {instance.medico.especialidad_id}, instance.fecha_hora)
+
+
+@receiver(post_delete, sender=HorarioBloqueado)
+def horario_desbloqueado(sender, instance, **kwargs):
+    _anunciar(SLOT_LIBERADO, instance.medico, instance.medico.especialidad_id, instance.fecha_hora)
+    _invalidar_disponibilidad(instance.medico, {instance.medico.especialidad_id}, instance.fecha_hora)
+
+
+@receiver(post_init, sender=Especialidad)
+def recordar_imagen_especialidad(sender, instance, **kwargs):
+    imagen = instance.__dict__.get('imagen')
+    instance._imagen_inicial = getattr(imagen, 'name', imagen)
+
+
+@receiver(post_save, sender=Especialidad)
+def especialidad_guardada(sender, instance, **kwargs):
+    _invalidar_catalogo()
+    if instance.imagen and instance.imagen.name != instance._imagen_inicial:
+        _generar_miniaturas(instance.imagen.name)
+    instance._imagen_inicial = instance.imagen.name
+
+
+@receiver(post_delete, sender=Especialidad)
+def especialidad_eliminada(sender, instance, **kwargs):
+    _invalidar_catalogo()
+
+
+@receiver(post_init, sender=Usuario)
+def recordar_datos_plantel(sender, instance, **kwargs):
+    instance._plantel_inicial = _datos_plantel(instance)
+    instance._busqueda_inicial = _datos_busqueda(instance)
+
+
+@receiver(post_save, sender=Usuario)
+def usuario_guardado(sender, instance, created, **kwargs):
+    actual = _datos_plantel(instance)
+    era_medico = instance._plantel_inicial[0] == Usuario.Role.MEDICO
+    es_medico = instance.role == Usuario.Role.MEDICO
+    # Solo nos interesa si el cambio afecta al plantel de médicos (p. ej. no al registrar un login).
+    if (es_medico or era_medico) and (created or actual != instance._plantel_inicial):
+        _invalidar_catalogo()
+
+    indice_foto = CAMPOS_PLANTEL.index('foto_perfil')
+    if actual[indice_foto] and actual[indice_foto] != instance._plantel_inicial[indice_foto]:
+        _generar_miniaturas(actual[indice_foto])
+    instance._plantel_inicial = actual
+
+    busqueda = _datos_busqueda(instance)
+    if not created and busqueda != instance._busqueda_inicial:
+        pacientes_medico.copiar_datos_paciente(instance)
+    instance._busqueda_inicial = busqueda
+
+
+@receiver(post_delete, sender=Usuario)
+def usuario_eliminado(sender, instance, **kwargs):
+    if instance.role == Usuario.Role.MEDICO:
+        _invalidar_catalogo()
+
+
+
+@receiver(post_init, sender=FichaMedica)
+def recordar_ficha(sender, instance, **kwargs):
+    instance._valores_iniciales = historial_ficha.valores(instance)
+
+
+@receiver(post_save, sender=FichaMedica)
+def ficha_guardada(sender, instance, created, **kwargs):
+    historial_ficha.registrar(
+        instance, None if created else instance._valores_iniciales, getattr(instance, '_autor', None)
+    )
+    instance._valores_iniciales = historial_ficha.valores(instance)
+
+# --- Referencias de archivos deduplicados ---
+# Al eliminar una fila o reemplazar su archivo se libera la referencia; el
+# almacenamiento borra el archivo cuando ya nadie lo usa.
+
+def _nombres_archivos(instance):
+    nombres = {}
+    for campo in instance._campos_deduplicados:
+        valor = instance.__dict__.get(campo)
+        nombres[campo] = getattr(valor, 'name', valor) or None
+    return nombres
+
+
+def recordar_archivos(sender, instance, **kwargs):
+    instance._campos_deduplicados = CAMPOS_POR_MODELO[sender]
+    instance._archivos_iniciales = _nombres_archivos(instance)
+
+
+def recordar_subidas(sender, instance, **kwargs):
+    # Campos con un archivo nuevo por guardar: cada guardado suma una referencia,
+    # aunque el contenido resulte idéntico al que la fila ya tenía.
+    instance._campos_subidos = {
+        campo for campo in instance._campos_deduplicados
+        if isinstance(instance.__dict__.get(campo), File)
+        and not getattr(instance.__dict__[campo], '_committed', False)
+    }
+
+
+def liberar_archivos_reemplazados(sender, instance, created, **kwargs):
+    actuales = _nombres_archivos(instance)
+    subidos = getattr(instance, '_campos_subidos', set())
+    for campo, anterior in instance._archivos_iniciales.items():
+        if anterior and (anterior != actuales[campo] or campo in subidos):
+            almacenamiento_deduplicado.liberar(anterior)
+    instance._archivos_iniciales = actuales
+    instance._campos_subidos = set()
+
+
+def liberar_archivos_eliminados(sender, instance, **kwargs):
+    for nombre in _nombres_archivos(instance).values():
+        if nombre:
+            almacenamiento_deduplicado.liberar(nombre)
+
+
+CAMPOS_POR_MODELO = dict(modelos_deduplicados())
+
+for modelo in CAMPOS_POR_MODELO:
+    post_init.connect(recordar_archivos, sender=modelo, dispatch_uid=f'archivos_init_{modelo.__name__}')
+    pre_save.connect(recordar_subidas, sender=modelo, dispatch_uid=f'archivos_pre_save_{modelo.__name__}')
+    post_save.connect(liberar_archivos_reemplazados, sender=modelo, dispatch_uid=f'archivos_save_{modelo.__name__}')
+    post_delete.connect(liberar_archivos_eliminados, sender=modelo, dispatch_uid=f'archivos_delete_{modelo.__name__}')
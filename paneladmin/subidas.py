@@ -0,0 +1,254 @@
+"""
+Validación de archivos subidos mientras llegan, antes de que Django los guarde.
+
+Cada vista que recibe archivos declara con @acepta_subidas a qué campo de
+modelo va cada campo del formulario, y REGLAS fija los límites por campo de
+modelo. En esas vistas SubidaValidadaHandler (settings.FILE_UPLOAD_HANDLERS):
+
+- Rechaza la petición completa, sin leer el cuerpo, si su Content-Length supera
+  VITALLIFE_LIMITE_PETICION_SUBIDA.
+- Revisa los primeros bytes (firma del formato) en vez de confiar en el
+  Content-Type que declara el navegador.
+- Corta la escritura en cuanto el archivo supera el límite de su campo.
+- Escribe directo en MEDIA_ROOT/.subidas calculando el SHA-256 en la misma
+  pasada; al guardar el modelo, AlmacenamientoDeduplicado solo mueve (rename)
+  ese archivo a su ruta definitiva, sin volver a copiarlo ni a leerlo.
+
+Un archivo rechazado llega al formulario como ArchivoRechazado, y
+FormularioConSubidas lo convierte en un error del campo correspondiente. Las
+demás vistas (la importación de usuarios, el admin de Django) y los campos no
+declarados quedan en manos de los handlers por defecto de Django.
+"""
+import hashlib
+import os
+import uuid
+from typing import NamedTuple
+
+from django.conf import settings
+from django.core.exceptions import RequestDataTooBig
+from django.core.files.uploadedfile import UploadedFile
+from django.core.files.uploadhandler import FileUploadHandler, StopFutureHandlers
+
+from .almacenamiento import CARPETA_TEMPORAL
+
+MB = 1024 * 1024
+
+# Formato -> (tipo MIME, firmas posibles al inicio del archivo).
+FIRMAS = {
+    'pdf': ('application/pdf', (b'%PDF-',)),
+    'jpeg': ('image/jpeg', (b'\xff\xd8\xff',)),
+    'png': ('image/png', (b'\x89PNG\r\n\x1a\n',)),
+    'gif': ('image/gif', (b'GIF87a', b'GIF89a')),
+    'webp': ('image/webp', ()),  # RIFF....WEBP, se revisa aparte.
+}
+
+# Bytes necesarios para reconocer cualquiera de las firmas.
+LARGO_FIRMA = 12
+
+
+class Regla(NamedTuple):
+    limite: int
+    formatos: tuple
+    descripcion: str
+
+
+# Campo de modelo ('app.Modelo.campo') -> regla.
+REGLAS = {
+    'usuario.Usuario.foto_perfil': Regla(2 * MB, ('jpeg', 'png', 'gif'), 'La foto de perfil debe ser JPG, PNG o GIF'),
+    'usuario.Usuario.antecedentes_medicos': Regla(5 * MB, ('pdf', 'jpeg', 'png'), 'Los antecedentes deben ser PDF, JPG o PNG'),
+    'paneladmin.Receta.archivo': Regla(10 * MB, ('pdf', 'jpeg', 'png'), 'La receta debe ser PDF, JPG o PNG'),
+    'paneladmin.Especialidad.imagen': Regla(5 * MB, ('jpeg', 'png', 'gif', 'webp'), 'La imagen debe ser JPG, PNG, GIF o WebP'),
+}
+
+
+def acepta_subidas(**campos):
+    """
+    Decorador de vista: campo del formulario -> campo de modelo (el descriptor,
+    p. ej. Receta.archivo, o 'paneladmin.Receta.archivo'). Va por encima de los
+    demás decoradores, porque el handler lo busca en la vista resuelta por la URL.
+    """
+    reglas = {}
+    for nombre, campo in campos.items():
+        if hasattr(campo, 'field'):
+            campo = f'{campo.field.model._meta.label}.{campo.field.name}'
+        reglas[nombre] = REGLAS[campo]
+
+    def decorador(view_func):
+        view_func.reglas_subida = reglas
+        return view_func
+    return decorador
+
+
+def reglas_de(request):
+    """Reglas que declaró la vista de la petición (vacío si no recibe archivos validados)."""
+    vista = getattr(getattr(request, 'resolver_match', None), 'func', None)
+    return getattr(vista, 'reglas_subida', {})
+
+
+def regla_para(reglas, field_name):
+    # Los formularios con prefijo envían, por ejemplo, 'receta-12-archivo'.
+    return reglas.get(field_name.rsplit('-', 1)[-1])
+
+
+def detectar_formato(inicio):
+    if inicio[:4] == b'RIFF' and inicio[8:12] == b'WEBP':
+        return 'webp'
+    for formato, (_, firmas) in FIRMAS.items():
+        if any(inicio.startswith(firma) for firma in firmas):
+            return formato
+    return None
+
+
+def _megas(limite):
+    return f"{limite // MB}MB"
+
+
+class ArchivoSubido(UploadedFile):
+    """
+    Archivo aceptado, ya escrito en la carpeta temporal de MEDIA_ROOT y con su
+    hash calculado. Si nadie lo guarda, se borra al cerrarse con la petición.
+    """
+
+    def __init__(self, ruta, name, content_type, size, sha256):
+        super().__init__(open(ruta, 'rb'), name, content_type, size)
+        self.ruta = ruta
+        self.sha256 = sha256
+
+    def temporary_file_path(self):
+        return self.ruta
+
+    def close(self):
+        try:
+            return self.file.close()
+        finally:
+            if os.path.exists(self.ruta):
+                os.remove(self.ruta)
+
+
+class ArchivoRechazado(UploadedFile):
+    """Marca un archivo descartado durante la subida, con el motivo para el usuario."""
+
+    def __init__(self, name, error_subida):
+        super().__init__(None, name, None, 0)
+        self.error_subida = error_subida
+
+    def close(self):
+        pass
+
+
+class SubidaValidadaHandler(FileUploadHandler):
+
+    def __init__(self, request=None):
+        super().__init__(request)
+        self.reglas = reglas_de(request)
+
+    def handle_raw_input(self, input_data, META, content_length, boundary, encoding=None):
+        if not self.reglas:
+            return None
+        limite = getattr(settings, 'VITALLIFE_LIMITE_PETICION_SUBIDA', 12 * MB)
+        if content_length > limite:
+            # Igual que Django con DATA_UPLOAD_MAX_MEMORY_SIZE: 400 sin leer el cuerpo.
+            raise RequestDataTooBig(f"La petición supera el máximo de {_megas(limite)} para subidas.")
+        return None
+
+    def new_file(self, field_name, *args, **kwargs):
+        super().new_file(field_name, *args, **kwargs)
+        self.regla = regla_para(self.reglas, field_name)
+        if self.regla is None:
+            # Campo sin regla: lo manejan los handlers por defecto de Django.
+            return
+
+        self.error = None
+        self.inicio = b''
+        self.formato = None
+        self.tamano = 0
+        self.digest = hashlib.sha256()
+
+        carpeta = os.path.join(settings.MEDIA_ROOT, CARPETA_TEMPORAL)
+        os.makedirs(carpeta, exist_ok=True)
+        self.ruta = os.path.join(carpeta, uuid.uuid4().hex)
+        self.destino = open(self.ruta, 'wb')
+        raise StopFutureHandlers()
+
+    def receive_data_chunk(self, raw_data, start):
+        if self.regla is None:
+            return raw_data
+        if self.error:
+            # Ya rechazado: se consume el resto sin escribirlo.
+            return None
+
+        self.tamano += len(raw_data)
+        if self.tamano > self.regla.limite:
+            self._rechazar(f"El archivo no puede superar los {_megas(self.regla.limite)}.")
+            return None
+
+        if self.formato is None:
+            self.inicio += raw_data[:LARGO_FIRMA]
+            if len(self.inicio) >= LARGO_FIRMA:
+                self._revisar_formato()
+                if self.error:
+                    return None
+
+        self.digest.update(raw_data)
+        self.destino.write(raw_data)
+        return None
+
+    def file_complete(self, file_size):
+        if self.regla is None:
+            return None
+        if self.formato is None and not self.error:
+            # Archivo más corto que LARGO_FIRMA.
+            self._revisar_formato()
+        if self.error:
+            return ArchivoRechazado(self.file_name, self.error)
+
+        self.destino.close()
+        tipo, _ = FIRMAS[self.formato]
+        return ArchivoSubido(self.ruta, self.file_name, tipo, self.tamano, self.digest.hexdigest())
+
+    def upload_interrupted(self):
+        if getattr(self, 'regla', None) is not None and not self.error:
+            self._descartar()
+
+    def _revisar_formato(self):
+        self.formato = detectar_formato(self.inicio)
+        if self.formato not in self.regla.formatos:
+            self._rechazar(f"{self.regla.descripcion}.")
+
+    def _rechazar(self, mensaje):
+        self.error = mensaje
+        self._descartar()
+
+    def _descartar(self):
+        self.destino.close()
+        if os.path.exists(self.ruta):
+            os.remove(self.ruta)
+
+
+class FormularioConSubidas:
+    """
+    Mixin para formularios con archivos: saca de `files` los ArchivoRechazado
+    (para que el campo no intente procesarlos) y los muestra como errores del campo.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.subidas_rechazadas = {}
+        if not self.files:
+            return
+        for nombre in self.fields:
+            archivo = self.files.get(self.add_prefix(nombre))
+            if isinstance(archivo, ArchivoRechazado):
+                self.subidas_rechazadas[nombre] = archivo.error_subida
+        if self.subidas_rechazadas:
+            self.files = self.files.copy()
+            for nombre in self.subidas_rechazadas:
+                del self.files[self.add_prefix(nombre)]
+
+    def full_clean(self):
+        super().full_clean()
+        if not self.is_bound:
+            return
+        for nombre, mensaje in self.subidas_rechazadas.items():
+            self._errors[nombre] = self.error_class([mensaje])
+            self.cleaned_data.pop(nombre, None)
@@ -0,0 +1,49 @@
+"""
+Tareas en segundo plano de paneladmin (ver paneladmin.cola).
+"""
+from datetime import timedelta
+
+from django.utils import timezone
+
+from . import eliminacion_usuarios, importacion_usuarios, miniaturas, notificaciones, reportes, reservas_temporales
+from .cola import encolar, tarea
+from .models import Notificacion, Tarea
+
+
+@tarea(prioridad=Tarea.Prioridad.ALTA)
+def despachar_notificaciones():
+    notificaciones.despachar_pendientes()
+    # Si quedaron correos esperando un reintento, volvemos cuando toque el primero.
+    siguiente = Notificacion.objects.filter(estado=Notificacion.Estado.PENDIENTE).order_by('proximo_intento').first()
+    if siguiente is not None:
+        encolar(despachar_notificaciones, retraso=max(siguiente.proximo_intento - timezone.now(), timedelta()), unica=True)
+
+
+@tarea(max_intentos=3)
+def generar_miniaturas(nombre):
+    miniaturas.generar_derivados(nombre)
+
+
+@tarea(prioridad=Tarea.Prioridad.BAJA)
+def precalcular_reportes():
+    reportes.precalcular()
+
+
+@tarea
+def purgar_usuario(eliminacion_id):
+    if not eliminacion_usuarios.purgar(eliminacion_id):
+        # Se acabó el tiempo de esta ejecución; seguimos en otra.
+        encolar(purgar_usuario, eliminacion_id)
+
+
+@tarea(max_intentos=3)
+def importar_usuarios(importacion_id):
+    # Por tramos, para no acercarse al tiempo en que la cola da una tarea por abandonada.
+    if not importacion_usuarios.procesar(importacion_id, tiempo=importacion_usuarios.TIEMPO_POR_EJECUCION):
+        encolar(importar_usuarios, importacion_id)
+
+
+@tarea(prioridad=Tarea.Prioridad.ALTA)
+def liberar_reserva_temporal(reserva_id):
+    # Programada para el vencimiento: el horario vuelve a mostrarse libre.
+    reservas_temporales.vencer(reserva_id)
@@ -1,3 +1,566 @@
-from django.test import TestCase
+import io
+import os
+import tempfile
+import time as time_module
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+from itertools import chain, repeat
+from unittest import mock
 
-# Create your tests here.
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.http import JsonResponse
+from django.test import RequestFactory, TestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from usuario.models import Usuario
+from .idempotencia import TIEMPO_PROCESAMIENTO, idempotente
+from .almacenamiento import AlmacenamientoDeduplicado
+from .models import (
+    ArchivoMedia, Cita, EliminacionUsuario, Especialidad, FichaMedica, ImportacionUsuarios, ReservaTemporal,
+    RevisionFichaMedica, SolicitudIdempotente, Tarea,
+)
+from . import (
+    archivo_citas, catalogo, cola, eliminacion_usuarios, historial_ficha, importacion_citas, importacion_usuarios,
+    pacientes_medico, reservas_temporales, versiones,
+)
+
+
+def proximo_horario(dias=3, hora=10):
+    """Un horario laboral (lunes a viernes, 10:00 a 16:00) en el futuro."""
+    fecha = timezone.localdate() + timedelta(days=dias)
+    while fecha.weekday() > 4:
+        fecha += timedelta(days=1)
+    return timezone.make_aware(datetime.combine(fecha, time(hora)))
+
+
+class DatosCitasMixin:
+
+    def setUp(self):
+        super().setUp()
+        # La caché (sellos, catálogo, fragmentos) no se revierte con la transacción de cada prueba.
+        cache.clear()
+        catalogo._memoria.clear()
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.especialidad = Especialidad.objects.create(nombre='Cardiología', descripcion='Corazón')
+        cls.otra_especialidad = Especialidad.objects.create(nombre='Dermatología', descripcion='Piel')
+        cls.medico = Usuario.objects.create_user(
+            email='medico@vitallife.cl', password='clave-segura-1', nombre='Ana', apellido='Soto',
+            role='MEDICO', especialidad=cls.especialidad,
+        )
+        cls.paciente = Usuario.objects.create_user(
+            email='paciente@vitallife.cl', password='clave-segura-1', nombre='Luis', apellido='Pérez',
+        )
+        cls.otro_paciente = Usuario.objects.create_user(
+            email='otro@vitallife.cl', password='clave-segura-1', nombre='Eva', apellido='Rojas',
+        )
+
+    def datos_horario(self, fecha_hora, especialidad=None):
+        return {
+            'medico_id': self.medico.id,
+            'especialidad_id': (especialidad or self.especialidad).id,
+            'fecha_hora': timezone.localtime(fecha_hora).strftime('%Y-%m-%dT%H:%M'),
+        }
+
+
+class ReservasTemporalesTests(DatosCitasMixin, TestCase):
+
+    def test_otro_paciente_no_puede_retener_ni_agendar_el_horario(self):
+        horario = proximo_horario()
+        self.assertIsNotNone(reservas_temporales.reservar(self.paciente, self.medico, horario))
+
+        self.assertIsNone(reservas_temporales.reservar(self.otro_paciente, self.medico, horario))
+        self.assertTrue(reservas_temporales.tomada_por_otro(self.otro_paciente, self.medico.id, horario))
+        self.assertFalse(reservas_temporales.tomada_por_otro(self.paciente, self.medico.id, horario))
+
+        self.client.force_login(self.otro_paciente)
+        respuesta = self.client.post(reverse('usuario:agendar_cita'), self.datos_horario(horario))
+        self.assertEqual(respuesta.status_code, 400)
+        self.assertFalse(Cita.objects.exists())
+
+    def test_usa_la_especialidad_del_medico(self):
+        self.client.force_login(self.paciente)
+        horario = proximo_horario()
+        respuesta = self.client.post(
+            reverse('usuario:retener_horario'), self.datos_horario(horario, especialidad=self.otra_especialidad),
+        )
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertEqual(ReservaTemporal.objects.get().especialidad_id, self.especialidad.id)
+
+    def test_la_retencion_anterior_sigue_si_la_nueva_falla(self):
+        mio, ajeno = proximo_horario(hora=10), proximo_horario(hora=11)
+        reservas_temporales.reservar(self.paciente, self.medico, mio)
+        reservas_temporales.reservar(self.otro_paciente, self.medico, ajeno)
+
+        self.assertIsNone(reservas_temporales.reservar(self.paciente, self.medico, ajeno))
+        self.assertTrue(ReservaTemporal.objects.filter(paciente=self.paciente, fecha_hora=mio).exists())
+
+    def test_un_horario_a_la_vez_y_renovacion(self):
+        primero, segundo = proximo_horario(hora=10), proximo_horario(hora=11)
+        reservas_temporales.reservar(self.paciente, self.medico, primero)
+        reservas_temporales.reservar(self.paciente, self.medico, segundo)
+        self.assertEqual(list(ReservaTemporal.objects.values_list('fecha_hora', flat=True)), [segundo])
+
+        ReservaTemporal.objects.update(expira_en=timezone.now() + timedelta(seconds=5))
+        renovada = reservas_temporales.reservar(self.paciente, self.medico, segundo)
+        self.assertIsNotNone(renovada)
+        self.assertGreater(renovada.expira_en, timezone.now() + timedelta(minutes=1))
+
+    def test_vencida_no_cuenta_y_se_libera(self):
+        horario = proximo_horario()
+        reserva = reservas_temporales.reservar(self.paciente, self.medico, horario)
+
+        reservas_temporales.vencer(reserva.id)
+        self.assertTrue(ReservaTemporal.objects.filter(id=reserva.id).exists())
+
+        ReservaTemporal.objects.update(expira_en=timezone.now() - timedelta(seconds=1))
+        self.assertFalse(reservas_temporales.tomada_por_otro(self.otro_paciente, self.medico.id, horario))
+        self.assertEqual(reservas_temporales.limpiar_vencidas(), 1)
+        self.assertFalse(ReservaTemporal.objects.exists())
+
+    def test_otro_paciente_reemplaza_una_vencida(self):
+        horario = proximo_horario()
+        reservas_temporales.reservar(self.paciente, self.medico, horario)
+        ReservaTemporal.objects.update(expira_en=timezone.now() - timedelta(seconds=1))
+
+        reserva = reservas_temporales.reservar(self.otro_paciente, self.medico, horario)
+        self.assertEqual(reserva.paciente_id, self.otro_paciente.id)
+
+    def test_la_disponibilidad_descuenta_solo_las_ajenas(self):
+        horario = proximo_horario()
+        reservas_temporales.reservar(self.paciente, self.medico, horario)
+        url = reverse('usuario:horarios_json', args=[self.especialidad.id])
+        parametros = {'fecha': timezone.localtime(horario).date().isoformat()}
+
+        def disponible(usuario):
+            self.client.force_login(usuario)
+            horarios = self.client.get(url, parametros).json()['horarios']
+            return timezone.localtime(horario).isoformat() in [h['fecha_hora'] for h in horarios]
+
+        self.assertTrue(disponible(self.paciente))
+        self.assertFalse(disponible(self.otro_paciente))
+
+    def test_agendar_convierte_la_retencion_en_cita(self):
+        horario = proximo_horario()
+        self.client.force_login(self.paciente)
+        self.client.post(reverse('usuario:retener_horario'), self.datos_horario(horario))
+
+        respuesta = self.client.post(reverse('usuario:agendar_cita'), self.datos_horario(horario))
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertTrue(Cita.objects.filter(paciente=self.paciente, fecha_hora=horario).exists())
+        self.assertFalse(ReservaTemporal.objects.exists())
+
+    def test_una_cita_cancelada_no_ocupa_el_horario(self):
+        horario = proximo_horario()
+        Cita.objects.create(
+            paciente=self.paciente, medico=self.medico, especialidad=self.especialidad,
+            fecha_hora=horario, estado=Cita.EstadoCita.CANCELADA,
+        )
+        self.assertIsNotNone(reservas_temporales.reservar(self.otro_paciente, self.medico, horario))
+
+        self.client.force_login(self.otro_paciente)
+        respuesta = self.client.post(reverse('usuario:agendar_cita'), self.datos_horario(horario))
+        self.assertEqual(respuesta.status_code, 200)
+        cita = Cita.objects.get(medico=self.medico, fecha_hora=horario)
+        self.assertEqual((cita.paciente_id, cita.estado), (self.otro_paciente.id, Cita.EstadoCita.RESERVADA))
+
+
+class IdempotenciaTests(DatosCitasMixin, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.llamadas = 0
+        self.estados = []
+
+    def vista(self, request):
+        self.llamadas += 1
+        estado = self.estados.pop(0) if self.estados else 201
+        if isinstance(estado, Exception):
+            raise estado
+        return JsonResponse({'llamada': self.llamadas}, status=estado)
+
+    def enviar(self, clave='clave-1', **datos):
+        request = RequestFactory().post('/agendar/', datos or {'medico_id': '1'}, HTTP_IDEMPOTENCY_KEY=clave)
+        request.user = self.paciente
+        return idempotente(self.vista)(request)
+
+    def test_reintento_recibe_la_respuesta_guardada(self):
+        primera = self.enviar()
+        repetida = self.enviar()
+        self.assertEqual(self.llamadas, 1)
+        self.assertEqual(repetida.status_code, 201)
+        self.assertEqual(repetida.content, primera.content)
+        self.assertEqual(repetida['Idempotent-Replayed'], 'true')
+
+    def test_misma_clave_con_otros_datos_recibe_422(self):
+        self.enviar()
+        self.assertEqual(self.enviar(medico_id='2').status_code, 422)
+        self.assertEqual(self.llamadas, 1)
+
+    def test_en_proceso_recibe_409_hasta_que_se_abandona(self):
+        self.enviar()
+        SolicitudIdempotente.objects.update(estado_http=None, cuerpo='')
+
+        respuesta = self.enviar()
+        self.assertEqual(respuesta.status_code, 409)
+        self.assertEqual(respuesta['Retry-After'], '1')
+        self.assertEqual(self.llamadas, 1)
+
+        # El proceso murió sin guardar la respuesta: pasado el plazo, se reemplaza.
+        SolicitudIdempotente.objects.update(fecha_creacion=timezone.now() - TIEMPO_PROCESAMIENTO - timedelta(seconds=1))
+        self.assertEqual(self.enviar().status_code, 201)
+        self.assertEqual(self.llamadas, 2)
+
+    def test_libera_la_clave_si_la_vista_falla(self):
+        self.estados = [500, RuntimeError('caída'), 201]
+        self.assertEqual(self.enviar().status_code, 500)
+        with self.assertRaises(RuntimeError):
+            self.enviar()
+        self.assertFalse(SolicitudIdempotente.objects.exists())
+        self.assertEqual(self.enviar().status_code, 201)
+        self.assertEqual(self.llamadas, 3)
+
+    def test_reintento_de_agendar_no_duplica_la_cita(self):
+        self.client.force_login(self.paciente)
+        datos = self.datos_horario(proximo_horario())
+        url = reverse('usuario:agendar_cita')
+        primera = self.client.post(url, datos, HTTP_IDEMPOTENCY_KEY='agendar-1')
+        repetida = self.client.post(url, datos, HTTP_IDEMPOTENCY_KEY='agendar-1')
+        self.assertEqual(primera.status_code, 200)
+        self.assertEqual(repetida.content, primera.content)
+        self.assertEqual(Cita.objects.count(), 1)
+
+
+class VersionesTests(TestCase):
+
+    def test_escrituras_en_el_mismo_segundo_dejan_sellos_distintos(self):
+        clave = versiones.clave_paciente(987654)
+        inicial, = versiones.obtener(clave)
+        versiones.incrementar(clave)
+        primero, = versiones.obtener(clave)
+        versiones.incrementar(clave)
+        segundo, = versiones.obtener(clave)
+        self.assertGreater(primero, inicial)
+        self.assertGreater(segundo, primero)
+
+    def test_un_sello_antiguo_avanza_hasta_la_hora_actual(self):
+        clave = versiones.clave_paciente(987655)
+        versiones.cache.set(clave, 1000, timeout=None)
+        versiones.incrementar(clave)
+        self.assertGreaterEqual(versiones.obtener(clave)[0], int(time_module.time()))
+
+
+class ArchivoCitasTests(DatosCitasMixin, TestCase):
+
+    def crear_cita(self, dias, estado=Cita.EstadoCita.COMPLETADA, minutos=0):
+        return Cita.objects.create(
+            paciente=self.paciente, medico=self.medico, especialidad=self.especialidad, estado=estado,
+            fecha_hora=timezone.now() - timedelta(days=dias, minutes=minutos),
+        )
+
+    def recorrer(self, tamano):
+        vistas, cursor = [], None
+        while True:
+            citas, cursor = archivo_citas.pagina_historial(cursor, tamano, paciente=self.paciente)
+            vistas += [cita.id for cita in citas]
+            if cursor is None:
+                return vistas
+
+    def test_el_cursor_recorre_activas_y_archivadas_en_orden(self):
+        recientes = [self.crear_cita(dias) for dias in range(1, 6)]
+        antiguas = [self.crear_cita(dias) for dias in range(400, 405)]
+        self.assertEqual(archivo_citas.archivar(), 5)
+
+        esperadas = [cita.id for cita in recientes + antiguas]
+        self.assertEqual(self.recorrer(tamano=3), esperadas)
+
+    def test_no_salta_lo_archivado_con_un_horizonte_mas_corto(self):
+        # Activas más antiguas que lo archivado (reservas que nunca se cerraron).
+        recientes = [self.crear_cita(1, minutos=i) for i in range(3)]
+        archivada = self.crear_cita(150)
+        viejas = [self.crear_cita(300, estado=Cita.EstadoCita.RESERVADA, minutos=i) for i in range(3)]
+        self.assertEqual(archivo_citas.archivar(dias=90), 1)
+
+        esperadas = [cita.id for cita in recientes + [archivada] + viejas]
+        self.assertEqual(self.recorrer(tamano=4), esperadas)
+
+
+class MedicoPorEliminarTests(DatosCitasMixin, TestCase):
+
+    def test_no_se_lista_ni_se_retiene_ni_se_agenda(self):
+        horario = proximo_horario()
+        self.assertIn(self.medico.id, [medico.id for medico in catalogo.obtener_medicos(self.especialidad.id)])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            eliminacion_usuarios.solicitar(self.medico)
+
+        self.assertNotIn(self.medico.id, [medico.id for medico in catalogo.obtener_medicos(self.especialidad.id)])
+        self.client.force_login(self.paciente)
+        respuesta = self.client.get(
+            reverse('usuario:horarios_json', args=[self.especialidad.id]),
+            {'fecha': timezone.localtime(horario).date().isoformat(), 'medico': self.medico.id},
+        )
+        self.assertEqual(respuesta.json()['horarios'], [])
+        self.assertEqual(self.client.post(reverse('usuario:retener_horario'), self.datos_horario(horario)).status_code, 400)
+        self.assertEqual(self.client.post(reverse('usuario:agendar_cita'), self.datos_horario(horario)).status_code, 400)
+        self.assertIsNone(reservas_temporales.reservar(self.paciente, Usuario.objects.get(id=self.medico.id), horario))
+        self.assertFalse(Cita.objects.exists())
+
+
+class ImportacionCitasTests(DatosCitasMixin, TestCase):
+
+    def importar(self, *filas):
+        rechazos = io.StringIO()
+        archivo = io.StringIO('\n'.join(['paciente,medico,fecha_hora', *filas]) + '\n')
+        resumen = importacion_citas.ImportadorCitas(rechazos).procesar(archivo)
+        return resumen, rechazos.getvalue()
+
+    def test_fechas_anteriores_a_1970_no_confunden_a_los_medicos(self):
+        otro_medico = Usuario.objects.create_user(
+            email='medico2@vitallife.cl', password='clave-segura-1', nombre='Raúl', apellido='Díaz',
+            role='MEDICO', especialidad=self.especialidad,
+        )
+        resumen, rechazos = self.importar(
+            f'{self.paciente.email},{self.medico.email},1965-03-01 10:00',
+            f'{self.otro_paciente.email},{otro_medico.email},1965-03-01 10:00',
+        )
+        self.assertEqual((resumen.creadas, resumen.rechazadas), (2, 0), rechazos)
+
+    def test_choques_dentro_del_archivo_y_con_la_base(self):
+        horarios = {hora: proximo_horario(hora=hora) for hora in (10, 11, 12)}
+        texto = {hora: timezone.localtime(horario).strftime('%Y-%m-%d %H:%M') for hora, horario in horarios.items()}
+        for hora in (11, 12):
+            Cita.objects.create(
+                paciente=self.paciente, medico=self.medico, especialidad=self.especialidad, fecha_hora=horarios[hora],
+            )
+        resumen, rechazos = self.importar(
+            f'{self.paciente.email},{self.medico.email},{texto[10]}',
+            f'{self.otro_paciente.email},{self.medico.email},{texto[10]}',
+            f'{self.paciente.email},{self.medico.email},{texto[11]}',
+            f'{self.otro_paciente.email},{self.medico.email},{texto[12]}',
+        )
+        self.assertEqual((resumen.leidas, resumen.creadas, resumen.rechazadas), (4, 1, 3))
+        self.assertIn('3,Choca con otra fila del archivo', rechazos)
+        self.assertIn('4,Ya importada (misma cita).', rechazos)
+        self.assertIn('5,El médico ya tiene una cita a esa hora.', rechazos)
+        self.assertEqual(Cita.objects.count(), 3)
+
+    def test_el_respaldo_informa_el_error_real_de_la_base(self):
+        importador = importacion_citas.ImportadorCitas(io.StringIO())
+        importador.encabezado = ['paciente', 'medico', 'fecha_hora']
+        horario = proximo_horario()
+        aceptadas = [
+            (numero, {}, Cita(paciente=paciente, medico=self.medico, especialidad=self.especialidad, fecha_hora=horario), None)
+            for numero, paciente in ((2, self.paciente), (3, self.otro_paciente))
+        ]
+        creadas, _, rechazadas = importador._guardar(aceptadas)
+
+        self.assertEqual(creadas, 1)
+        [(numero, _, motivo)] = rechazadas
+        self.assertEqual(numero, 3)
+        self.assertTrue(motivo.startswith('No se pudo guardar la cita: '))
+
+
+class BusquedaUsuariosTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = Usuario.objects.create_user(
+            email='admin@vitallife.cl', password='clave-segura-1', nombre='Sara', apellido='Mena', is_staff=True,
+        )
+        cls.buscado = Usuario.objects.create_user(
+            email='buscado@vitallife.cl', password='clave-segura-1', nombre='Juan', apellido='Lagos', rut='12.345.678-5',
+        )
+        cls.otro = Usuario.objects.create_user(
+            email='otro@vitallife.cl', password='clave-segura-1', nombre='Rosa', apellido='Vega', rut='11.111.111-1',
+        )
+
+    def buscar(self, texto):
+        self.client.force_login(self.admin)
+        respuesta = self.client.get(reverse('paneladmin:lista_usuarios'), {'q': texto})
+        return [usuario.id for usuario in respuesta.context['usuarios']]
+
+    def test_rut_completo_encuentra_la_ficha(self):
+        for texto in ('12.345.678-5', '12345678-5', '123456785', '012.345.678-5'):
+            self.assertEqual(self.buscar(texto), [self.buscado.id], texto)
+
+    def test_prefijo_del_rut(self):
+        self.assertEqual(self.buscar('12.345'), [self.buscado.id])
+        self.assertEqual(self.buscar('11.1'), [self.otro.id])
+
+
+class ColaTests(TestCase):
+    NOMBRE = 'pruebas.tarea_de_prueba'
+
+    def test_un_trabajador_por_tarea_y_recuperacion_de_abandonadas(self):
+        tarea = cola.encolar(self.NOMBRE, 1)
+        reclamada = cola.reclamar_siguiente('trabajador-1', nombres=[self.NOMBRE])
+        self.assertEqual((reclamada.id, reclamada.estado, reclamada.intentos), (tarea.id, Tarea.Estado.EN_CURSO, 1))
+        self.assertIsNone(cola.reclamar_siguiente('trabajador-2', nombres=[self.NOMBRE]))
+
+        # Todavía dentro del plazo: no se recupera.
+        self.assertEqual(cola.recuperar_abandonadas(), 0)
+        Tarea.objects.filter(id=tarea.id).update(
+            fecha_inicio=timezone.now() - cola.TIEMPO_MAXIMO_EJECUCION - timedelta(seconds=1)
+        )
+        self.assertEqual(cola.recuperar_abandonadas(), 1)
+
+        recuperada = cola.reclamar_siguiente('trabajador-2', nombres=[self.NOMBRE])
+        self.assertEqual((recuperada.id, recuperada.trabajador, recuperada.intentos), (tarea.id, 'trabajador-2', 2))
+
+
+class AlmacenamientoDeduplicadoTests(TestCase):
+
+    def setUp(self):
+        directorio = tempfile.TemporaryDirectory()
+        self.addCleanup(directorio.cleanup)
+        self.almacenamiento = AlmacenamientoDeduplicado(location=directorio.name)
+
+    def test_el_archivo_se_borra_al_quedar_sin_referencias(self):
+        nombre = self.almacenamiento.save('recetas/receta.pdf', ContentFile(b'contenido'))
+        self.assertEqual(self.almacenamiento.save('recetas/copia.pdf', ContentFile(b'contenido')), nombre)
+        self.assertEqual(ArchivoMedia.objects.get(nombre=nombre).referencias, 2)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.almacenamiento.liberar(nombre)
+        self.assertEqual(ArchivoMedia.objects.get(nombre=nombre).referencias, 1)
+        self.assertTrue(self.almacenamiento.exists(nombre))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.almacenamiento.liberar(nombre)
+        self.assertFalse(ArchivoMedia.objects.filter(nombre=nombre).exists())
+        self.assertFalse(self.almacenamiento.exists(nombre))
+
+
+class PurgaUsuarioTests(DatosCitasMixin, TestCase):
+
+    def test_la_purga_sigue_donde_quedo(self):
+        for hora in range(10, 15):
+            Cita.objects.create(
+                paciente=self.paciente, medico=self.medico, especialidad=self.especialidad,
+                fecha_hora=proximo_horario(hora=hora) - timedelta(days=30), estado=Cita.EstadoCita.COMPLETADA,
+            )
+        eliminacion = eliminacion_usuarios.solicitar(self.paciente)
+
+        # Se acaba el tiempo después del primer lote.
+        with mock.patch.object(eliminacion_usuarios, 'time') as reloj:
+            reloj.monotonic.side_effect = chain([0, 0], repeat(1))
+            self.assertFalse(eliminacion_usuarios.purgar(eliminacion.id, lote=2, tiempo=0.5))
+        eliminacion.refresh_from_db()
+        self.assertEqual((eliminacion.estado, eliminacion.filas_eliminadas), (EliminacionUsuario.Estado.EN_CURSO, 2))
+        self.assertEqual(Cita.objects.filter(paciente=self.paciente).count(), 3)
+
+        self.assertTrue(eliminacion_usuarios.purgar(eliminacion.id, lote=2))
+        eliminacion.refresh_from_db()
+        self.assertEqual((eliminacion.estado, eliminacion.filas_eliminadas), (EliminacionUsuario.Estado.COMPLETADA, 6))
+        self.assertFalse(Usuario.objects.filter(id=self.paciente.id).exists())
+        self.assertFalse(Cita.objects.exists())
+
+
+class ImportacionUsuariosTests(TestCase):
+
+    def setUp(self):
+        directorio = tempfile.TemporaryDirectory()
+        self.addCleanup(directorio.cleanup)
+        self.ruta = os.path.join(directorio.name, 'usuarios.csv')
+        with open(self.ruta, 'w', encoding='utf-8') as archivo:
+            archivo.write(
+                'nombre,apellido,email\n'
+                'Ana,Uno,ana@vitallife.cl\n'
+                'Beto,Dos,no-es-correo\n'
+                'Carla,Tres,carla@vitallife.cl\n'
+                'Dario,Cuatro,\n'
+            )
+
+    def test_reanudar_no_repite_los_errores(self):
+        importacion = importacion_usuarios.crear(self.ruta)
+
+        # El proceso se corta dentro de la transacción del primer lote.
+        with self.captureOnCommitCallbacks(execute=True):
+            with mock.patch.object(importacion_usuarios, 'F', side_effect=RuntimeError('corte')):
+                with self.assertRaises(RuntimeError):
+                    importacion_usuarios.procesar(importacion.id, procesos=1, lote=2)
+        importacion.refresh_from_db()
+        self.assertEqual(importacion.filas_procesadas, 0)
+        self.assertFalse(os.path.exists(importacion.ruta_errores))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertTrue(importacion_usuarios.procesar(importacion.id, procesos=1, lote=2))
+        importacion.refresh_from_db()
+        self.assertEqual((importacion.filas_procesadas, importacion.creados, importacion.con_errores), (4, 2, 2))
+        with open(importacion.ruta_errores, encoding='utf-8') as archivo:
+            filas = [linea.split(',', 1)[0] for linea in archivo.read().splitlines()]
+        self.assertEqual(filas, ['fila', '3', '5'])
+        self.assertEqual(Usuario.objects.filter(email__in=['ana@vitallife.cl', 'carla@vitallife.cl']).count(), 2)
+
+
+class HistorialFichaTests(DatosCitasMixin, TestCase):
+
+    def test_estado_en_a_ambos_lados_de_una_instantanea(self):
+        ficha = FichaMedica.objects.create(paciente=self.paciente, peso_kg=70, alergias='Penicilina')
+        for peso in range(71, 95):
+            ficha.peso_kg = peso
+            if peso == 90:
+                ficha.tipo_sangre = FichaMedica.TipoSangre.O_POS
+            ficha.save()
+        # Revisión n en el minuto n, para consultar instantes exactos.
+        inicio = timezone.now() - timedelta(days=1)
+        for revision in RevisionFichaMedica.objects.filter(ficha=ficha):
+            RevisionFichaMedica.objects.filter(id=revision.id).update(fecha=inicio + timedelta(minutes=revision.numero))
+
+        self.assertEqual(RevisionFichaMedica.objects.filter(ficha=ficha).count(), 25)
+        self.assertEqual(
+            list(RevisionFichaMedica.objects.filter(ficha=ficha, instantanea__isnull=False).values_list('numero', flat=True)),
+            [1, 1 + historial_ficha.INTERVALO_INSTANTANEA],
+        )
+        self.assertIsNone(historial_ficha.estado_en(self.paciente.id, inicio))
+        for numero in (1, 19, 20, 21, 22, 25):
+            estado = historial_ficha.estado_en(self.paciente.id, inicio + timedelta(minutes=numero))
+            self.assertEqual(estado['peso_kg'], Decimal(69 + numero), numero)
+            self.assertEqual(estado['alergias'], 'Penicilina')
+            self.assertEqual(estado['tipo_sangre'], 'O+' if numero >= 21 else '', numero)
+
+
+class PacientesMedicoTests(DatosCitasMixin, TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.pacientes = [cls.paciente, cls.otro_paciente]
+        for nombre, apellido, rut in (('Bruno', 'Álvarez', '12.345.678-5'), ('Ana', 'Alvarez', ''), ('Carla', 'Núñez', '')):
+            cls.pacientes.append(Usuario.objects.create_user(
+                email=f'{nombre.lower()}@vitallife.cl', password='clave-segura-1', nombre=nombre, apellido=apellido,
+                rut=rut or None,
+            ))
+
+    def setUp(self):
+        super().setUp()
+        with self.captureOnCommitCallbacks(execute=True):
+            for dias, paciente in enumerate(self.pacientes, start=1):
+                Cita.objects.create(
+                    paciente=paciente, medico=self.medico, especialidad=self.especialidad,
+                    fecha_hora=timezone.now() - timedelta(days=dias), estado=Cita.EstadoCita.COMPLETADA,
+                )
+
+    def apellidos(self, busqueda='', tamano=2):
+        vistos, cursor = [], None
+        while True:
+            relaciones, cursor = pacientes_medico.pagina(self.medico, busqueda, cursor, tamano=tamano)
+            vistos += [f'{relacion.paciente.apellido} {relacion.paciente.nombre}' for relacion in relaciones]
+            if cursor is None:
+                return vistos
+
+    def test_el_cursor_recorre_todos_en_orden(self):
+        self.assertEqual(
+            self.apellidos(),
+            ['Alvarez Ana', 'Álvarez Bruno', 'Núñez Carla', 'Pérez Luis', 'Rojas Eva'],
+        )
+
+    def test_busqueda_por_apellido_nombre_y_rut(self):
+        self.assertEqual(self.apellidos('alva', tamano=1), ['Alvarez Ana', 'Álvarez Bruno'])
+        self.assertEqual(self.apellidos('Eva Ro'), ['Rojas Eva'])
+        self.assertEqual(self.apellidos('12.345'), ['Álvarez Bruno'])
+        self.assertEqual(self.apellidos('nunez'), ['Núñez Carla'])
@@ -11,8 +11,11 @@ urlpatterns = [
     path('especialidades/editar/<int:pk>/', views.editar_especialidad_view, name='editar_especialidad'), # Nueva
     path('especialidades/eliminar/<int:pk>/', views.eliminar_especialidad_view, name='eliminar_especialidad'), # Nueva
     path('usuarios/', views.lista_usuarios_view, name='lista_usuarios'),
+    path('usuarios/rut/', views.buscar_rut_view, name='buscar_rut'),
     path('usuarios/editar/<int:pk>/', views.editar_usuario_view, name='editar_usuario'),
     path('usuarios/eliminar/<int:pk>/', views.eliminar_usuario_view, name='eliminar_usuario'),
+    path('usuarios/importar/', views.importar_usuarios_view, name='importar_usuarios'),
+    path('usuarios/importar/<int:pk>/errores/', views.errores_importacion_view, name='errores_importacion'),
     # URLs para gestionar citas
     path('citas/', views.lista_citas_view, name='lista_citas'),
     path('citas/cancelar/<int:cita_id>/', views.admin_cancelar_cita_view, name='admin_cancelar_cita'),
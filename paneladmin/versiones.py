@@ -0,0 +1,129 @@
+"""
+Sellos de versión para respuestas condicionales (ETag / Last-Modified).
+
+Cada sello es un entero (segundos epoch) guardado en la caché compartida que
+se incrementa atómicamente en cada escritura relevante (ver paneladmin.signals):
+
+- catálogo: especialidades y su plantel de médicos.
+- especialidad-día: disponibilidad de una especialidad en una fecha.
+- médico-día: disponibilidad de un médico en una fecha.
+- paciente: citas, diagnósticos y recetas de un paciente (API v1).
+- usuario: citas de un usuario, como paciente o médico (paneles de inicio;
+  lo avanza estadisticas.invalidar).
+
+Las vistas arman su ETag solo a partir de estos sellos, por lo que pueden
+responder 304 sin consultar el ORM.
+"""
+import hashlib
+import time
+from datetime import date, datetime, timedelta, timezone as dt_timezone
+
+from django.core.cache import cache
+from django.utils import timezone
+
+CLAVE_CATALOGO = 'version:catalogo'
+
+
+def clave_especialidad_dia(especialidad_id, fecha):
+    return f'version:especialidad:{especialidad_id}:{fecha.isoformat()}'
+
+
+def clave_medico_dia(medico_id, fecha):
+    return f'version:medico:{medico_id}:{fecha.isoformat()}'
+
+
+def clave_paciente(paciente_id):
+    return f'version:paciente:{paciente_id}'
+
+
+def clave_usuario(usuario_id):
+    return f'version:usuario:{usuario_id}'
+
+
+def claves_citas(filas):
+    """Sellos médico-día y especialidad-día de filas (medico_id, especialidad_id, fecha_hora)."""
+    claves = set()
+    for medico_id, especialidad_id, fecha_hora in filas:
+        fecha = timezone.localtime(fecha_hora).date()
+        claves.add(clave_medico_dia(medico_id, fecha))
+        claves.add(clave_especialidad_dia(especialidad_id, fecha))
+    return claves
+
+
+def incrementar(*claves):
+    """
+    Avanza los sellos indicados con el incremento atómico de la caché: dos
+    escrituras en el mismo segundo, aun desde procesos distintos, dejan sellos
+    distintos. Cada sello queda además en al menos la hora actual para que
+    Last-Modified avance.
+    """
+    ahora = int(time.time())
+    for clave in claves:
+        cache.add(clave, ahora - 1, timeout=None)
+        try:
+            sello = cache.incr(clave)
+        except ValueError:
+            # Desalojada entre add() e incr(): cualquier valor nuevo sirve.
+            cache.set(clave, ahora, timeout=None)
+            continue
+        if sello < ahora:
+            cache.incr(clave, ahora - sello)
+
+
+def obtener(*claves):
+    """
+    Devuelve los sellos en el mismo orden de las claves. Un sello ausente
+    (caché reiniciada o desalojada) se inicializa con la hora actual, lo que
+    obliga a los clientes a descargar de nuevo la respuesta.
+    """
+    sellos = cache.get_many(claves)
+    faltantes = [clave for clave in claves if clave not in sellos]
+    if faltantes:
+        ahora = int(time.time())
+        for clave in faltantes:
+            cache.add(clave, ahora, timeout=None)
+        sellos.update(cache.get_many(faltantes))
+    return [sellos.get(clave, int(time.time())) for clave in claves]
+
+
+def etag(*partes):
+    """ETag débil a partir de los sellos y de cualquier otro dato que afecte la respuesta."""
+    return 'W/"%s"' % hashlib.md5('|'.join(str(parte) for parte in partes).encode()).hexdigest()
+
+
+def token_csrf(request):
+    """
+    Token CSRF de la sesión, para el ETag de las páginas con formularios: rota al
+    iniciar sesión y una copia anterior de la página haría fallar sus POST con 403.
+    """
+    return request.META.get('CSRF_COOKIE', '')
+
+
+def mensajes_pendientes(request):
+    """
+    True si hay mensajes flash por mostrar. Esa página no puede responderse con
+    304 (las funciones de ETag y Last-Modified devuelven None): se perderían.
+    """
+    from django.contrib.messages import get_messages
+
+    # len() no marca los mensajes como leídos; recorrerlos sí.
+    return bool(get_messages(request))
+
+
+def como_fecha(sello):
+    return datetime.fromtimestamp(sello, tz=dt_timezone.utc)
+
+
+def hora_actual():
+    """Sello de la hora en curso: los horarios de hoy cambian de estado al pasar cada hora."""
+    return int(timezone.now().replace(minute=0, second=0, microsecond=0).timestamp())
+
+
+def sellos_semana_medico(medico_id, fecha_base):
+    """Sellos médico-día de lunes a viernes de la semana de fecha_base."""
+    lunes = fecha_base - timedelta(days=fecha_base.weekday())
+    dias = [lunes + timedelta(days=i) for i in range(5)]
+    sellos = obtener(*(clave_medico_dia(medico_id, dia) for dia in dias))
+    if date.today() in dias:
+        sellos.append(hora_actual())
+    return sellos
@@ -1,15 +1,28 @@
+import os
+import uuid
+
 from django.shortcuts import render, redirect, get_object_or_404
 from django.urls import reverse
 from django.contrib.auth.decorators import login_required, user_passes_test
 from django.contrib import messages
 from django.utils import timezone
+from django.db import transaction
 from datetime import datetime, timedelta
-from django.http import JsonResponse
-from django.db.models import Count, Q
+from django.http import FileResponse, JsonResponse, Http404
+from django.core.exceptions import PermissionDenied
+from django.core.files.storage import default_storage
+from PIL import UnidentifiedImageError
+from django.views.decorators.cache import cache_control
+from django.views.decorators.http import condition
 from usuario.models import Usuario
-from django.db.models import Q
-from .models import Especialidad, Cita, HorarioBloqueado
-from .forms import EspecialidadForm, AdminUsuarioEditForm
+from usuario.validadores import limpiar_rut, normalizar_rut
+from django.db.models import Exists, OuterRef, Q
+from .models import Especialidad, Cita, EliminacionUsuario, HorarioBloqueado, ImportacionUsuarios
+from . import eliminacion_usuarios, importacion_usuarios, media_protegida, miniaturas, notificaciones, reportes, versiones
+from .cola import encolar
+from .idempotencia import idempotente
+from .subidas import acepta_subidas
+from .forms import EspecialidadForm, AdminUsuarioEditForm, ImportarUsuariosForm
 
 def es_staff(user):
     """
@@ -46,6 +59,7 @@ def lista_especialidades_view(request):
     especialidades = Especialidad.objects.all().order_by('nombre')
     return render(request, 'lista_especialidades.html', {'especialidades': especialidades})
 
+@acepta_subidas(imagen=Especialidad.imagen)
 @login_required
 @user_passes_test(es_staff, login_url='usuario:login')
 def crear_especialidad_view(request):
@@ -59,6 +73,7 @@ def crear_especialidad_view(request):
         form = EspecialidadForm()
     return render(request, 'form_especialidad.html', {'form': form, 'titulo': 'Crear Nueva Especialidad'})
 
+@acepta_subidas(imagen=Especialidad.imagen)
 @login_required
 @user_passes_test(es_staff, login_url='usuario:login')
 def editar_especialidad_view(request, pk):
@@ -88,14 +103,24 @@ def eliminar_especialidad_view(request, pk):
 @user_passes_test(es_staff, login_url='usuario:login')
 def lista_usuarios_view(request):
     # Excluimos al superusuario de la lista
-    queryset = Usuario.objects.filter(is_superuser=False).order_by('nombre')
+    eliminaciones_en_curso = EliminacionUsuario.objects.filter(
+        usuario=OuterRef('pk'),
+        estado__in=[EliminacionUsuario.Estado.PENDIENTE, EliminacionUsuario.Estado.EN_CURSO],
+    )
+    queryset = Usuario.objects.filter(is_superuser=False).annotate(
+        eliminandose=Exists(eliminaciones_en_curso)
+    ).order_by('nombre')
 
     # Búsqueda
     query = request.GET.get('q')
     if query:
-        queryset = queryset.filter(
-            Q(nombre__icontains=query) | Q(apellido__icontains=query) | Q(email__icontains=query)
-        )
+        filtro = Q(nombre__icontains=query) | Q(apellido__icontains=query) | Q(email__icontains=query)
+        rut = limpiar_rut(query).lstrip('0')
+        if rut[:-1].isdigit():
+            # El RUT completo ('12.345.678-5') se busca en su forma canónica, que lleva guion;
+            # lo escrito sin guion, como prefijo. Ambos usan el índice único de la columna.
+            filtro |= Q(rut=normalizar_rut(rut)) | Q(rut__istartswith=rut)
+        queryset = queryset.filter(filtro)
 
     # Filtro por rol
     role_filter = request.GET.get('role')
@@ -109,6 +134,26 @@ def lista_usuarios_view(request):
     }
     return render(request, 'lista_usuarios.html', context)
 
+@login_required
+@user_passes_test(es_staff, login_url='usuario:login')
+def buscar_rut_view(request):
+    """Búsqueda por RUT para el mesón (JSON): la ficha exacta o los RUT que empiezan con lo escrito."""
+    exacto, usuarios = Usuario.objects.buscar_por_rut(request.GET.get('rut', ''))
+    return JsonResponse({
+        'exacto': exacto,
+        'resultados': [
+            {
+                'id': usuario.id,
+                'nombre': usuario.get_full_name(),
+                'email': usuario.email,
+                'rut': usuario.rut,
+                'rol': usuario.get_role_display(),
+                'url': reverse('paneladmin:editar_usuario', args=[usuario.id]),
+            }
+            for usuario in usuarios
+        ],
+    })
+
 @login_required
 @user_passes_test(es_staff, login_url='usuario:login')
 def editar_usuario_view(request, pk):
@@ -134,12 +179,51 @@ def editar_usuario_view(request, pk):
 def eliminar_usuario_view(request, pk):
     usuario = get_object_or_404(Usuario, pk=pk, is_superuser=False)
     if request.method == 'POST':
-        nombre_usuario = usuario.get_full_name()
-        usuario.delete()
-        messages.success(request, f'El usuario "{nombre_usuario}" ha sido eliminado.')
+        # Se desactiva ahora y sus datos se borran en segundo plano (ver paneladmin.eliminacion_usuarios).
+        eliminacion_usuarios.solicitar(usuario, solicitada_por=request.user)
+        messages.success(
+            request,
+            f'El usuario "{usuario.get_full_name()}" fue desactivado. Sus datos se están eliminando en segundo plano.'
+        )
         return redirect('paneladmin:lista_usuarios')
     return render(request, 'confirmar_eliminar_usuario.html', {'usuario_a_eliminar': usuario})
 
+@login_required
+@user_passes_test(es_staff, login_url='usuario:login')
+def importar_usuarios_view(request):
+    if request.method == 'POST':
+        form = ImportarUsuariosForm(request.POST, request.FILES)
+        if form.is_valid():
+            archivo = form.cleaned_data['archivo_csv']
+            directorio = importacion_usuarios.directorio_importaciones()
+            os.makedirs(directorio, exist_ok=True)
+            ruta = os.path.join(directorio, f'{uuid.uuid4().hex}.csv')
+            with open(ruta, 'wb') as destino:
+                for trozo in archivo.chunks():
+                    destino.write(trozo)
+            with transaction.atomic():
+                importacion = importacion_usuarios.crear(ruta, archivo.name, solicitada_por=request.user)
+                encolar('paneladmin.tareas.importar_usuarios', importacion.id)
+            messages.success(request, f'Se recibió "{archivo.name}". La importación se procesa en segundo plano.')
+            return redirect('paneladmin:importar_usuarios')
+    else:
+        form = ImportarUsuariosForm()
+
+    context = {
+        'form': form,
+        'importaciones': ImportacionUsuarios.objects.select_related('solicitada_por')[:20],
+    }
+    return render(request, 'importar_usuarios.html', context)
+
+@login_required
+@user_passes_test(es_staff, login_url='usuario:login')
+def errores_importacion_view(request, pk):
+    importacion = get_object_or_404(ImportacionUsuarios, pk=pk)
+    if not importacion.ruta_errores or not os.path.exists(importacion.ruta_errores):
+        raise Http404("Esta importación no tiene errores registrados.")
+    nombre = f'errores_{os.path.splitext(importacion.nombre_archivo)[0]}.csv'
+    return FileResponse(open(importacion.ruta_errores, 'rb'), as_attachment=True, filename=nombre, content_type='text/csv')
+
 @user_passes_test(lambda u: u.is_staff)
 def lista_citas_view(request):
     queryset = Cita.objects.all().select_related('paciente', 'medico', 'especialidad').order_by('-fecha_hora')
@@ -165,17 +249,44 @@ def lista_citas_view(request):
     return render(request, 'lista_citas.html', context)
 
 @user_passes_test(lambda u: u.is_staff)
+@idempotente
 def admin_cancelar_cita_view(request, cita_id):
     cita = get_object_or_404(Cita, id=cita_id)
     if request.method == 'POST':
-        cita.estado = Cita.EstadoCita.CANCELADA
-        cita.save()
+        with transaction.atomic():
+            cita.estado = Cita.EstadoCita.CANCELADA
+            cita.save()
+            notificaciones.registrar_cita_cancelada(cita, por_administracion=True)
         messages.success(request, 'La cita ha sido cancelada con éxito.')
         return redirect('paneladmin:lista_citas')
     
-    return render(request, 'admin_confirmar_cancelar_cita.html', {'cita': cita})
+    return render(request, 'admin_confirmar_cancelar_cita.html', {'cita': cita, 'clave_idempotencia': uuid.uuid4().hex})
+
+def _sellos_semana_doctor(request, doctor_id):
+    fecha_base_str = request.GET.get('fecha', datetime.today().strftime('%Y-%m-%d'))
+    try:
+        fecha_base = datetime.strptime(fecha_base_str, '%Y-%m-%d').date()
+    except (ValueError, TypeError):
+        fecha_base = datetime.today().date()
+    return versiones.sellos_semana_medico(doctor_id, fecha_base)
+
+def _etag_semana_doctor(request, doctor_id=None):
+    # La lista de selección de médicos no usa respuestas condicionales.
+    if doctor_id is None or versiones.mensajes_pendientes(request):
+        return None
+    return versiones.etag(
+        'admin-semana-medico', doctor_id, *_sellos_semana_doctor(request, doctor_id),
+        request.user.pk, versiones.token_csrf(request),
+    )
+
+def _modificacion_semana_doctor(request, doctor_id=None):
+    if doctor_id is None or versiones.mensajes_pendientes(request):
+        return None
+    return versiones.como_fecha(max(_sellos_semana_doctor(request, doctor_id)))
 
 @user_passes_test(lambda u: u.is_staff)
+@cache_control(private=True, no_cache=True)
+@condition(etag_func=_etag_semana_doctor, last_modified_func=_modificacion_semana_doctor)
 def admin_gestionar_horarios_view(request, doctor_id=None):
     if doctor_id is None:
         # Si no hay ID de doctor, mostramos la lista para seleccionar uno
@@ -272,47 +383,40 @@ def admin_desbloquear_horario_view(request):
 def reportes_administrativos_view(request):
     """
     Vista para mostrar reportes y estadísticas al personal administrativo.
+    Los números los precalcula la cola de tareas (ver paneladmin.reportes).
     """
-    # 1. Número de consultas por especialidad (citas completadas o reservadas)
-    consultas_por_especialidad = Especialidad.objects.annotate(
-        num_citas=Count('cita', filter=Q(cita__estado__in=[Cita.EstadoCita.RESERVADA, Cita.EstadoCita.COMPLETADA]))
-    ).order_by('-num_citas')
-
-    # 2. Porcentaje de ocupación
-    # Definimos el rango de fechas para el cálculo (ej. últimos 30 días)
-    hoy = timezone.now().date()
-    fecha_inicio = hoy - timedelta(days=30)
-    
-    medicos = Usuario.objects.filter(role='MEDICO')
-    total_slots_posibles = 0
-    
-    # Horas de trabajo estándar (10:00 a 16:00 -> 7 slots por día)
-    horas_laborales_count = 7 
-    
-    # Calcular el total de slots disponibles en los últimos 30 días
-    dias_habiles = 0
-    for i in range(31):
-        dia = fecha_inicio + timedelta(days=i)
-        if dia.weekday() < 5: # Lunes a Viernes
-            dias_habiles += 1
-    
-    total_slots_posibles = medicos.count() * dias_habiles * horas_laborales_count if medicos.exists() else 0
+    context = reportes.obtener()
+    return render(request, 'reportes_administrativos.html', context)
 
-    # Citas ocupadas en el mismo período
-    citas_ocupadas = Cita.objects.filter(
-        fecha_hora__range=(fecha_inicio, hoy + timedelta(days=1)),
-        estado__in=[Cita.EstadoCita.RESERVADA, Cita.EstadoCita.COMPLETADA]
-    ).count()
 
-    # Calculamos el porcentaje. La plantilla se encargará del formato.
-    porcentaje_float = (citas_ocupadas / total_slots_posibles * 100) if total_slots_posibles > 0 else 0
+def miniatura_view(request, tamano, formato, nombre):
+    """
+    Genera bajo demanda un derivado que todavía no existe y redirige al archivo.
+    Las siguientes páginas ya apuntan directo al derivado en MEDIA_URL.
+    """
+    if tamano not in miniaturas.TAMANOS or formato not in miniaturas.FORMATOS:
+        raise Http404("Tamaño o formato no soportado.")
+    if not miniaturas.es_original_valido(nombre) or not default_storage.exists(nombre):
+        raise Http404("La imagen no existe.")
 
-    context = {
-        'consultas_por_especialidad': consultas_por_especialidad,
-        'porcentaje_ocupacion': porcentaje_float,
-        'citas_ocupadas': citas_ocupadas,
-        'total_slots_posibles': total_slots_posibles,
-        'fecha_inicio': fecha_inicio,
-        'hoy': hoy,
-    }
-    return render(request, 'reportes_administrativos.html', context)
+    ruta = miniaturas.ruta_derivado(nombre, tamano, formato)
+    if not default_storage.exists(ruta):
+        try:
+            miniaturas.generar_derivado(nombre, tamano, formato)
+        except (OSError, UnidentifiedImageError):
+            # Si el original no se puede procesar, servimos el original tal cual.
+            return redirect(default_storage.url(nombre))
+    return redirect(default_storage.url(ruta))
+
+
+@login_required
+def media_protegida_view(request, nombre):
+    """
+    Entrega antecedentes médicos y recetas solo al paciente, a sus médicos y al
+    personal. El envío en sí lo hace el servidor web cuando está configurado.
+    """
+    if not media_protegida.es_nombre_protegido(nombre) or not default_storage.exists(nombre):
+        raise Http404("El archivo no existe.")
+    if not media_protegida.puede_ver(request.user, nombre):
+        raise PermissionDenied("No tienes permiso para ver este archivo.")
+    return media_protegida.respuesta_archivo(request, nombre)
@@ -0,0 +1,39 @@
+// Paginación "Cargar más" por cursor, compartida por las listas largas.
+//
+// El contenedor del botón lleva:
+//   data-cargar-mas  selector de la lista donde se agregan los resultados
+//   data-url         vista que devuelve {html, siguiente}
+//   data-cursor      cursor de la página siguiente
+// La página siguiente se pide al pulsar el botón o al acercarse al final de la lista.
+document.addEventListener('DOMContentLoaded', function () {
+    document.querySelectorAll('[data-cargar-mas]').forEach(function (siguiente) {
+        const lista = document.querySelector(siguiente.dataset.cargarMas);
+        let cargando = false;
+        let observador = null;
+
+        function cargarMas() {
+            if (cargando || !siguiente.dataset.cursor) return;
+            cargando = true;
+            const url = new URL(siguiente.dataset.url, window.location.href);
+            url.searchParams.set('cursor', siguiente.dataset.cursor);
+            fetch(url, {headers: {'X-Requested-With': 'XMLHttpRequest'}})
+                .then(respuesta => respuesta.ok ? respuesta.json() : Promise.reject())
+                .then(datos => {
+                    lista.insertAdjacentHTML('beforeend', datos.html);
+                    if (datos.siguiente) {
+                        siguiente.dataset.cursor = datos.siguiente;
+                    } else {
+                        siguiente.remove();
+                        if (observador) observador.disconnect();
+                    }
+                })
+                .finally(() => { cargando = false; });
+        }
+
+        siguiente.querySelector('button').addEventListener('click', cargarMas);
+        if ('IntersectionObserver' in window) {
+            observador = new IntersectionObserver(entradas => { if (entradas[0].isIntersecting) cargarMas(); }, {rootMargin: '200px'});
+            observador.observe(siguiente);
+        }
+    });
+});
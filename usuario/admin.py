@@ -26,5 +26,5 @@ class UsuarioAdmin(BaseUserAdmin):
     add_fieldsets = (
         (None, {'fields': ('email', 'nombre', 'apellido', 'password', 'password2')}),
     )
-    search_fields = ('email', 'nombre', 'apellido')
+    search_fields = ('email', 'nombre', 'apellido', 'rut')
     ordering = ('email',)
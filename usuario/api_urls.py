@@ -0,0 +1,12 @@
+from django.urls import path
+from . import views
+
+app_name = 'api_v1'
+
+urlpatterns = [
+    path('especialidades/', views.api_especialidades_view, name='especialidades'),
+    path('especialidades/<int:especialidad_id>/medicos/', views.api_medicos_view, name='medicos'),
+    path('especialidades/<int:especialidad_id>/horarios/', views.api_horarios_view, name='horarios'),
+    path('citas/', views.api_citas_view, name='citas'),
+    path('citas/<int:cita_id>/', views.api_cita_view, name='cita'),
+]
@@ -1,12 +1,13 @@
 from django import forms
 from django.utils.translation import gettext_lazy as _
 from paneladmin.models import Diagnostico, Receta, Especialidad, FichaMedica
-from datetime import date
+from paneladmin.subidas import FormularioConSubidas
 from django.core.exceptions import ValidationError
 from .models import Usuario
+from .validadores import normalizar_rut, validar_mayor_de_edad, validar_rut, validar_telefono
 from django.contrib.auth.forms import UserCreationForm, AuthenticationForm
 
-class RegistroUsuarioForm(UserCreationForm):
+class RegistroUsuarioForm(FormularioConSubidas, UserCreationForm):
     class Meta(UserCreationForm.Meta):
         model = Usuario
         fields = ('nombre', 'apellido', 'email', 'rut', 'fecha_nacimiento', 'telefono', 'foto_perfil', 'antecedentes_medicos')
@@ -32,54 +33,21 @@ class RegistroUsuarioForm(UserCreationForm):
 
     def clean_rut(self):
         rut = self.cleaned_data.get('rut')
-        if not rut:
-            return rut
-
-        rut = rut.upper().replace(".", "").replace("-", "")
-        if len(rut) < 2:
-            raise forms.ValidationError("RUT inválido.")
-
-        cuerpo = rut[:-1]
-        dv = rut[-1]
-
-        if not cuerpo.isdigit():
-            raise forms.ValidationError("El cuerpo del RUT debe contener solo números.")
-
-        try:
-            suma = 0
-            multiplo = 2
-            for r in reversed(cuerpo):
-                suma += int(r) * multiplo
-                multiplo = multiplo + 1 if multiplo < 7 else 2
-            
-            resto = suma % 11
-            dv_calculado = str(11 - resto)
-            if dv_calculado == '11': dv_calculado = '0'
-            if dv_calculado == '10': dv_calculado = 'K'
-
-            if dv != dv_calculado:
-                raise forms.ValidationError("El RUT ingresado no es válido (dígito verificador incorrecto).")
-        except Exception:
-            raise forms.ValidationError("Error al validar el RUT. Por favor, verifica el formato.")
-
-        return self.cleaned_data['rut']
+        if rut:
+            validar_rut(rut)
+            rut = normalizar_rut(rut)
+        return rut
 
     def clean_fecha_nacimiento(self):
         fecha_nacimiento = self.cleaned_data.get('fecha_nacimiento')
         if fecha_nacimiento:
-            today = date.today()
-            # Se considera mayor de edad si ya cumplió los 18 años.
-            age = today.year - fecha_nacimiento.year - ((today.month, today.day) < (fecha_nacimiento.month, fecha_nacimiento.day))
-            if age < 18:
-                raise forms.ValidationError("Debes ser mayor de 18 años para registrarte.")
+            validar_mayor_de_edad(fecha_nacimiento)
         return fecha_nacimiento
 
     def clean_telefono(self):
         telefono = self.cleaned_data.get('telefono')
-        if telefono and not telefono.isdigit():
-            raise forms.ValidationError("El número de teléfono solo debe contener dígitos.")
-        if telefono and not (7 <= len(telefono) <= 15):
-            raise forms.ValidationError("El número de teléfono debe tener entre 7 y 15 dígitos.")
+        if telefono:
+            validar_telefono(telefono)
         return telefono
 
     def clean_foto_perfil(self):
@@ -122,7 +90,7 @@ class DiagnosticoForm(forms.ModelForm):
             'descripcion': _('Descripción'),
         }
 
-class RecetaForm(forms.ModelForm):
+class RecetaForm(FormularioConSubidas, forms.ModelForm):
     class Meta:
         model = Receta
         fields = ['titulo', 'archivo', 'indicaciones']
@@ -137,7 +105,7 @@ class RecetaForm(forms.ModelForm):
             'indicaciones': _('Indicaciones (opcional)'),
         }
 
-class PerfilUsuarioForm(forms.ModelForm):
+class PerfilUsuarioForm(FormularioConSubidas, forms.ModelForm):
     """
     Formulario para que los usuarios editen su propia información de perfil.
     """
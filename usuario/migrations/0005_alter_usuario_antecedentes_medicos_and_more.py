@@ -0,0 +1,24 @@
+# Generated by Django 4.2.30 on 2026-10-18 22:31
+
+from django.db import migrations, models
+import paneladmin.almacenamiento
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('usuario', '0004_usuario_last_failed_login_usuario_login_attempts'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='usuario',
+            name='antecedentes_medicos',
+            field=models.FileField(blank=True, null=True, storage=paneladmin.almacenamiento.AlmacenamientoDeduplicado(), upload_to='antecedentes/', verbose_name='antecedentes médicos'),
+        ),
+        migrations.AlterField(
+            model_name='usuario',
+            name='foto_perfil',
+            field=models.ImageField(blank=True, null=True, storage=paneladmin.almacenamiento.AlmacenamientoDeduplicado(), upload_to='fotos_perfil/', verbose_name='foto de perfil'),
+        ),
+    ]
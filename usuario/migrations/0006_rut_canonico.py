@@ -0,0 +1,42 @@
+# Generated by Django 4.2.30 on 2026-10-18 23:10
+
+from django.db import migrations
+import usuario.models
+
+
+def _canonico(rut):
+    limpio = rut.upper().replace('.', '').replace('-', '').replace(' ', '')
+    if len(limpio) < 2 or not limpio[:-1].isdigit() or not (limpio[-1].isdigit() or limpio[-1] == 'K'):
+        return rut
+    return f"{limpio[:-1].lstrip('0') or '0'}-{limpio[-1]}"
+
+
+def normalizar_ruts(apps, schema_editor):
+    # Los RUT guardados tal como se escribieron pasan a la forma canónica. Si dos
+    # filas quedan con el mismo RUT, la segunda se deja como estaba (la
+    # restricción única lo impediría) para que un administrador la revise.
+    Usuario = apps.get_model('usuario', 'Usuario')
+    usados = set(Usuario.objects.exclude(rut=None).values_list('rut', flat=True))
+    for id, rut in Usuario.objects.exclude(rut=None).exclude(rut='').order_by('id').values_list('id', 'rut').iterator():
+        canonico = _canonico(rut)
+        if canonico == rut or canonico in usados:
+            continue
+        Usuario.objects.filter(id=id).update(rut=canonico)
+        usados.discard(rut)
+        usados.add(canonico)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('usuario', '0005_alter_usuario_antecedentes_medicos_and_more'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='usuario',
+            name='rut',
+            field=usuario.models.RutField(blank=True, max_length=12, null=True, unique=True, verbose_name='RUT'),
+        ),
+        migrations.RunPython(normalizar_ruts, migrations.RunPython.noop),
+    ]
@@ -1,7 +1,32 @@
 from django.contrib.auth.models import AbstractBaseUser, PermissionsMixin, BaseUserManager
+from django.core.exceptions import ValidationError
 from django.db import models
 from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
+from paneladmin.almacenamiento import almacenamiento_deduplicado
+from .validadores import limpiar_rut, normalizar_rut, validar_rut
+
+
+class RutField(models.CharField):
+    """
+    RUT guardado siempre en forma canónica (ver validadores.normalizar_rut), sea
+    cual sea el camino: formularios y admin (to_python, antes de revisar que sea
+    único) y save() o bulk_create() (pre_save). Como CharField.get_prep_value pasa
+    por to_python, los filtros y update() también comparan con la forma canónica.
+    """
+    default_validators = [validar_rut]
+
+    def to_python(self, value):
+        value = super().to_python(value)
+        return normalizar_rut(value) if value else value
+
+    def pre_save(self, model_instance, add):
+        value = getattr(model_instance, self.attname)
+        if value:
+            value = normalizar_rut(value)
+            setattr(model_instance, self.attname, value)
+        return value
+
 
 # --- Lógica para crear usuarios (necesaria para el modelo personalizado) ---
 class UsuarioManager(BaseUserManager):
@@ -19,6 +44,26 @@ class UsuarioManager(BaseUserManager):
         user.save(using=self._db)
         return user
 
+    def buscar_por_rut(self, texto, limite=10):
+        """
+        Usuarios por RUT para el mesón: (exacto, [usuarios]). Con un RUT completo y
+        válido busca esa fila; si no, los RUT que empiezan con lo escrito. Ambas
+        consultas usan el índice único de la columna.
+        """
+        limpio = limpiar_rut(texto)
+        if not limpio:
+            return False, []
+        try:
+            validar_rut(limpio)
+        except ValidationError:
+            pass
+        else:
+            exactos = list(self.filter(rut=normalizar_rut(limpio))[:1])
+            if exactos:
+                return True, exactos
+        # LIKE 'prefijo%' (el cuerpo no tiene puntos ni ceros a la izquierda).
+        return False, list(self.filter(rut__istartswith=limpio.lstrip('0')).order_by('rut')[:limite])
+
     def create_superuser(self, email, nombre, apellido, password=None, **extra_fields):
         extra_fields.setdefault('is_staff', True)
         extra_fields.setdefault('is_superuser', True)
@@ -46,7 +91,7 @@ class Usuario(AbstractBaseUser, PermissionsMixin):
         unique=True,
         help_text=_('El correo electrónico se usará para iniciar sesión.')
     )
-    rut = models.CharField(_('RUT'), max_length=12, unique=True, null=True, blank=True)
+    rut = RutField(_('RUT'), max_length=12, unique=True, null=True, blank=True)
     fecha_nacimiento = models.DateField(_("fecha de nacimiento"), blank=True, null=True)
     telefono = models.CharField(_('número de teléfono'), max_length=15, blank=True)
     
@@ -64,10 +109,13 @@ class Usuario(AbstractBaseUser, PermissionsMixin):
         verbose_name=_('especialidad'),
         help_text=_('Asignar solo si el rol es Médico.')
     )
-    foto_perfil = models.ImageField(_('foto de perfil'), upload_to='fotos_perfil/', null=True, blank=True)
+    foto_perfil = models.ImageField(
+        _('foto de perfil'), upload_to='fotos_perfil/', storage=almacenamiento_deduplicado, null=True, blank=True
+    )
     antecedentes_medicos = models.FileField(
         _('antecedentes médicos'), 
         upload_to='antecedentes/', 
+        storage=almacenamiento_deduplicado,
         blank=True, 
         null=True
     )
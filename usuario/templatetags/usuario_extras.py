@@ -1,4 +1,5 @@
 from django import template
+from paneladmin.miniaturas import url_derivado
 
 register = template.Library()
 
@@ -11,4 +12,16 @@ def get_item(dictionary, key):
     try:
         return dictionary[key]
     except (KeyError, IndexError):
-        return None
\ No newline at end of file
+        return None
+
+@register.simple_tag
+def miniatura(imagen, tamano='avatar', formato='webp'):
+    """
+    URL de la versión reducida de una imagen subida (foto de perfil o imagen de
+    especialidad). Acepta un campo de archivo o directamente su ruta.
+    Usage: <img src="{% miniatura user.foto_perfil 'avatar' %}">
+    """
+    nombre = getattr(imagen, 'name', imagen)
+    if not nombre:
+        return ''
+    return url_derivado(nombre, tamano, formato)
@@ -1,3 +1,38 @@
+from django.core.cache import cache
 from django.test import TestCase
+from django.urls import reverse
 
-# Create your tests here.
+from paneladmin.models import Especialidad
+from .models import Usuario
+
+
+class PanelEnCacheTests(TestCase):
+    """Con el fragmento en caché, la portada solo lee la sesión y el usuario."""
+
+    @classmethod
+    def setUpTestData(cls):
+        especialidad = Especialidad.objects.create(nombre='Cardiología', descripcion='Corazón')
+        cls.paciente = Usuario.objects.create_user(
+            email='paciente@vitallife.cl', password='clave-segura-1', nombre='Luis', apellido='Pérez',
+        )
+        cls.medico = Usuario.objects.create_user(
+            email='medico@vitallife.cl', password='clave-segura-1', nombre='Ana', apellido='Soto',
+            role='MEDICO', especialidad=especialidad,
+        )
+
+    def setUp(self):
+        cache.clear()
+
+    def comprobar_acierto(self, usuario, nombre_url):
+        self.client.force_login(usuario)
+        url = reverse(nombre_url)
+        self.assertEqual(self.client.get(url).status_code, 200)
+        with self.assertNumQueries(2):
+            respuesta = self.client.get(url)
+        self.assertEqual(respuesta.status_code, 200)
+
+    def test_panel_del_paciente(self):
+        self.comprobar_acierto(self.paciente, 'usuario:panel_inicio')
+
+    def test_panel_del_medico(self):
+        self.comprobar_acierto(self.medico, 'usuario:medico_inicio')
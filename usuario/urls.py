@@ -10,8 +10,11 @@ urlpatterns = [
     path('panel/', views.panel_inicio_view, name='panel_inicio'),
     path('seleccionar-especialidad/', views.seleccionar_especialidad_view, name='seleccionar_especialidad'),
     path('seleccionar-horario/<int:especialidad_id>/', views.seleccionar_horario_view, name='seleccionar_horario'),
+    path('seleccionar-horario/<int:especialidad_id>/eventos/', views.eventos_horario_view, name='eventos_horario'),
     path('perfil/', views.perfil_view, name='perfil'),
     path('perfil/editar/', views.editar_perfil_view, name='editar_perfil'),
+    path('perfil/historial/', views.historial_citas_view, name='historial_citas'),
+    path('perfil/historial/<int:cita_id>/', views.detalle_historial_cita_view, name='detalle_historial_cita'),
     path('cita/<int:cita_id>/', views.detalle_cita_view, name='detalle_cita'),
     path('cita/cancelar/<int:cita_id>/', views.cancelar_cita_view, name='cancelar_cita'),
     path('medico/inicio/', views.medico_inicio_view, name='medico_inicio'),
@@ -20,8 +23,18 @@ urlpatterns = [
     path('medico/horarios/bloquear/', views.bloquear_horario_view, name='bloquear_horario'),
     path('medico/horarios/desbloquear/', views.desbloquear_horario_view, name='desbloquear_horario'),
     path('agendar-cita/', views.agendar_cita_view, name='agendar_cita'),
+    path('agendar-cita/retener/', views.retener_horario_view, name='retener_horario'),
+    path('agendar-cita/soltar/', views.soltar_horario_view, name='soltar_horario'),
+    path('api/especialidades/', views.especialidades_json_view, name='especialidades_json'),
+    path('api/horarios/<int:especialidad_id>/', views.horarios_json_view, name='horarios_json'),
 
     # --- NUEVAS URLS PARA GESTIÓN DE PACIENTES ---
     path('medico/pacientes/', views.lista_pacientes_view, name='lista_pacientes'),
+    path('medico/pacientes/buscar/', views.buscar_pacientes_view, name='buscar_pacientes'),
     path('medico/pacientes/<int:paciente_id>/', views.detalle_paciente_view, name='detalle_paciente'),
+    path('medico/pacientes/<int:paciente_id>/citas/', views.citas_paciente_view, name='citas_paciente'),
+    path('medico/pacientes/<int:paciente_id>/citas/<int:cita_id>/', views.cita_paciente_view, name='cita_paciente'),
+    path('medico/pacientes/<int:paciente_id>/ficha/', views.ficha_paciente_view, name='ficha_paciente'),
+    path('medico/pacientes/<int:paciente_id>/ficha/tendencia/', views.tendencia_ficha_view, name='tendencia_ficha'),
+    path('medico/pacientes/<int:paciente_id>/ficha/historial/', views.ficha_en_fecha_view, name='ficha_en_fecha'),
 ]
\ No newline at end of file
@@ -0,0 +1,70 @@
+"""
+Validaciones de datos de usuario compartidas entre los formularios y la
+importación masiva (paneladmin.importacion_usuarios).
+"""
+from datetime import date
+
+from django.core.exceptions import ValidationError
+
+
+def digito_verificador(cuerpo):
+    """Dígito verificador (módulo 11) del cuerpo numérico de un RUT."""
+    suma = 0
+    multiplo = 2
+    for digito in reversed(cuerpo):
+        suma += int(digito) * multiplo
+        multiplo = multiplo + 1 if multiplo < 7 else 2
+
+    dv = str(11 - suma % 11)
+    if dv == '11':
+        return '0'
+    if dv == '10':
+        return 'K'
+    return dv
+
+
+def limpiar_rut(rut):
+    """El RUT sin puntos, guion ni espacios y con la K en mayúscula (p. ej. '123456785')."""
+    return (rut or '').upper().replace(".", "").replace("-", "").replace(" ", "")
+
+
+def normalizar_rut(rut):
+    """
+    Forma canónica con la que se guarda el RUT: cuerpo sin puntos ni ceros a la
+    izquierda, guion y dígito verificador en mayúscula ('12.345.678-k' -> '12345678-K').
+    Lo que no tiene forma de RUT se devuelve sin cambios (para que la validación lo rechace).
+    """
+    limpio = limpiar_rut(rut)
+    if len(limpio) < 2 or not limpio[:-1].isdigit() or not (limpio[-1].isdigit() or limpio[-1] == 'K'):
+        return rut
+    return f"{limpio[:-1].lstrip('0') or '0'}-{limpio[-1]}"
+
+
+def validar_rut(rut):
+    """Revisa el formato y el dígito verificador; acepta puntos y guion."""
+    rut = limpiar_rut(rut)
+    if len(rut) < 2:
+        raise ValidationError("RUT inválido.")
+
+    cuerpo = rut[:-1]
+    dv = rut[-1]
+
+    if not cuerpo.isdigit():
+        raise ValidationError("El cuerpo del RUT debe contener solo números.")
+    if dv != digito_verificador(cuerpo):
+        raise ValidationError("El RUT ingresado no es válido (dígito verificador incorrecto).")
+
+
+def validar_telefono(telefono):
+    if not telefono.isdigit():
+        raise ValidationError("El número de teléfono solo debe contener dígitos.")
+    if not (7 <= len(telefono) <= 15):
+        raise ValidationError("El número de teléfono debe tener entre 7 y 15 dígitos.")
+
+
+def validar_mayor_de_edad(fecha_nacimiento, hoy=None):
+    hoy = hoy or date.today()
+    # Se considera mayor de edad si ya cumplió los 18 años.
+    edad = hoy.year - fecha_nacimiento.year - ((hoy.month, hoy.day) < (fecha_nacimiento.month, fecha_nacimiento.day))
+    if edad < 18:
+        raise ValidationError("Debes ser mayor de 18 años para registrarte.")
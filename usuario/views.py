@@ -1,14 +1,32 @@
+import asyncio
+import json
+import uuid
+from asgiref.sync import sync_to_async
 from django.shortcuts import render, redirect, get_object_or_404
+from django.template.loader import render_to_string
 from django.contrib import messages
 from django.contrib.auth import authenticate, login
 from django.contrib.auth.decorators import login_required
+from django.db import IntegrityError, transaction
 from django.db.models import Prefetch
 from django.core.exceptions import PermissionDenied
-from django.http import JsonResponse, Http404
+from django.http import JsonResponse, Http404, HttpResponse, StreamingHttpResponse
+from django.core.handlers.asgi import ASGIRequest
 from django.utils import timezone
+from django.utils.functional import SimpleLazyObject
+from django.views.decorators.cache import cache_control
+from django.views.decorators.gzip import gzip_page
+from django.views.decorators.http import condition, require_safe
 from django.db.models import Count, Q
 from .forms import RegistroUsuarioForm, LoginForm, DiagnosticoForm, RecetaForm, PerfilUsuarioForm, FichaMedicaForm
-from paneladmin.models import Especialidad, Cita, HorarioBloqueado, FichaMedica
+from paneladmin.models import Especialidad, Cita, HorarioBloqueado, FichaMedica, Receta
+from paneladmin import (
+    api, archivo_citas, catalogo, estadisticas, historial_ficha, notificaciones, pacientes_medico, reservas_temporales,
+    versiones,
+)
+from paneladmin.eventos import canal_horarios, obtener_broker
+from paneladmin.idempotencia import idempotente
+from paneladmin.subidas import acepta_subidas
 from .models import Usuario
 from datetime import date, datetime, timedelta
 
@@ -18,6 +36,7 @@ def inicio(request):
         return redirect('usuario:panel_inicio')
     return render(request, 'inicio.html')
 
+@acepta_subidas(foto_perfil=Usuario.foto_perfil, antecedentes_medicos=Usuario.antecedentes_medicos)
 def registro_view(request):
     # También es buena práctica redirigir si intentan registrarse ya logueados.
     if request.user.is_authenticated:
@@ -74,10 +93,79 @@ def login_view(request):
 
     return render(request, 'login.html', {'form': form})
 
+# --- RESPUESTAS CONDICIONALES (ETag / Last-Modified) ---
+# Las funciones siguientes solo leen sellos de versión desde la caché, por lo que
+# una revalidación sin cambios se responde con 304 sin tocar el ORM.
+
+def _identidad_usuario(request):
+    # La barra de navegación muestra datos del usuario y las páginas incrustan el
+    # token CSRF, así que forman parte del ETag.
+    user = request.user
+    return (user.pk, user.nombre, user.foto_perfil.name, user.is_staff, versiones.token_csrf(request))
+
+def _version_panel(request):
+    # Clave de los fragmentos en caché de los paneles de inicio: cambia con las
+    # citas del usuario (estadisticas.invalidar) y cada hora, que es cuando empiezan
+    # las citas y cambian los conteos de pasadas, próximas y de hoy.
+    version, = versiones.obtener(versiones.clave_usuario(request.user.pk))
+    return f'{version}-{versiones.hora_actual()}'
+
+def _fecha_solicitada(request):
+    fecha_str = request.GET.get('fecha', date.today().strftime('%Y-%m-%d'))
+    try:
+        fecha = datetime.strptime(fecha_str, '%Y-%m-%d').date()
+    except (ValueError, TypeError):
+        fecha = date.today()
+    # No permitir seleccionar fechas pasadas: si la fecha es pasada, forzamos a que sea hoy.
+    return max(fecha, date.today())
+
+def _sellos_horarios(request, especialidad_id):
+    fecha = _fecha_solicitada(request)
+    sellos = versiones.obtener(
+        versiones.CLAVE_CATALOGO, versiones.clave_especialidad_dia(especialidad_id, fecha)
+    )
+    if fecha == date.today():
+        # Los horarios de hoy desaparecen a medida que pasan las horas.
+        sellos.append(versiones.hora_actual())
+    return fecha, sellos
+
+def _etag_catalogo(request, *args, **kwargs):
+    if versiones.mensajes_pendientes(request):
+        return None
+    return versiones.etag('catalogo', *versiones.obtener(versiones.CLAVE_CATALOGO), *_identidad_usuario(request))
+
+def _etag_catalogo_json(request, *args, **kwargs):
+    return versiones.etag('catalogo-json', *versiones.obtener(versiones.CLAVE_CATALOGO))
+
+def _modificacion_catalogo(request, *args, **kwargs):
+    if versiones.mensajes_pendientes(request):
+        return None
+    return versiones.como_fecha(*versiones.obtener(versiones.CLAVE_CATALOGO))
+
+def _etag_horarios(request, especialidad_id):
+    if versiones.mensajes_pendientes(request):
+        return None
+    fecha, sellos = _sellos_horarios(request, especialidad_id)
+    return versiones.etag(
+        'horarios', especialidad_id, fecha, request.GET.get('medico'), *sellos, *_identidad_usuario(request)
+    )
+
+def _etag_horarios_json(request, especialidad_id):
+    fecha, sellos = _sellos_horarios(request, especialidad_id)
+    return versiones.etag('horarios-json', especialidad_id, fecha, request.GET.get('medico'), request.user.pk, *sellos)
+
+def _modificacion_horarios(request, especialidad_id):
+    if versiones.mensajes_pendientes(request):
+        return None
+    fecha, sellos = _sellos_horarios(request, especialidad_id)
+    return versiones.como_fecha(max(sellos))
+
 @login_required
+@cache_control(private=True, no_cache=True)
+@condition(etag_func=_etag_catalogo, last_modified_func=_modificacion_catalogo)
 def seleccionar_especialidad_view(request):
     """Esta es la nueva vista principal para el usuario logueado."""
-    especialidades = Especialidad.objects.all()
+    especialidades = catalogo.obtener_especialidades()
     context = {
         'especialidades': especialidades
     }
@@ -93,44 +181,53 @@ def panel_inicio_view(request):
         return redirect('usuario:medico_inicio')
     # Para todos los demás roles (USUARIO, ADMIN), mostrar el panel de usuario principal.
     
-    now = timezone.now()
-    
-    # Buscar la próxima cita del usuario
-    proxima_cita = Cita.objects.filter(
-        paciente=request.user,
-        fecha_hora__gte=now,
-        estado='RESERVADA'
-    ).select_related('medico', 'especialidad').order_by('fecha_hora').first()
-
-    # Contar las citas pasadas para mostrar un dato interesante
-    citas_pasadas_count = Cita.objects.filter(
-        paciente=request.user,
-        fecha_hora__lt=now
-    ).count()
+    # Contadores desnormalizados: una fila en lugar de agregar citas en cada carga.
+    # Solo se leen si el fragmento del panel no está en caché (ver panel_inicio.html).
+    stats = SimpleLazyObject(lambda: estadisticas.obtener(request.user))
 
     context = {
-        'proxima_cita': proxima_cita,
-        'citas_pasadas_count': citas_pasadas_count,
+        'proxima_cita': lambda: stats.proxima_cita,
+        'citas_pasadas_count': lambda: stats.citas_pasadas,
+        'citas_proximas_count': lambda: stats.citas_proximas,
+        'version_panel': _version_panel(request),
     }
     return render(request, 'panel_inicio.html', context)
 
 @login_required
 def perfil_view(request):
-    # Obtener todas las citas del paciente, ordenadas de más reciente a más antigua.
-    # Usamos prefetch_related para cargar diagnósticos y recetas de forma eficiente.
-    citas_paciente = Cita.objects.filter(paciente=request.user).order_by('-fecha_hora').prefetch_related(
-        'diagnostico', 'recetas', 'medico', 'especialidad'
-    )
+    # Solo la primera página del historial (incluidas las archivadas); el resto se
+    # carga al hacer scroll desde historial_citas_view.
+    citas_paciente, siguiente = archivo_citas.pagina_historial(paciente=request.user)
 
     # Obtener la ficha médica del usuario para mostrarla en el perfil.
     ficha_medica = FichaMedica.objects.filter(paciente=request.user).first()
 
     context = {
         'citas': citas_paciente,
+        'siguiente': siguiente,
         'ficha_medica': ficha_medica,
     }
     return render(request, 'perfil.html', context)
 
+@login_required
+def historial_citas_view(request):
+    """Página siguiente del historial del paciente (scroll infinito en perfil.html)."""
+    try:
+        citas, siguiente = archivo_citas.pagina_historial(request.GET.get('cursor'), paciente=request.user)
+    except (ValueError, OverflowError):
+        return JsonResponse({'error': 'Cursor inválido.'}, status=400)
+    html = render_to_string('parciales/historial_citas.html', {'citas': citas}, request=request)
+    return JsonResponse({'html': html, 'siguiente': siguiente})
+
+@login_required
+def detalle_historial_cita_view(request, cita_id):
+    """Diagnóstico y recetas de una cita del historial, al expandirla."""
+    cita = archivo_citas.obtener_cita(cita_id, paciente=request.user)
+    if cita is None:
+        raise Http404("La cita no existe.")
+    return render(request, 'parciales/detalle_historial_cita.html', {'cita': cita})
+
+@acepta_subidas(foto_perfil=Usuario.foto_perfil, antecedentes_medicos=Usuario.antecedentes_medicos)
 @login_required
 def editar_perfil_view(request):
     if request.method == 'POST':
@@ -154,11 +251,10 @@ def detalle_cita_view(request, cita_id):
     # MEJORA DE SEGURIDAD: Añadimos 'paciente=request.user' al filtro.
     # Esto asegura que un usuario solo pueda ver sus propias citas.
     # Si intenta acceder a una URL de una cita ajena, recibirá un error 404.
-    cita = get_object_or_404(
-        Cita.objects.select_related('medico', 'especialidad', 'diagnostico').prefetch_related('recetas'),
-        id=cita_id,
-        paciente=request.user
-    )
+    # Si la cita ya pasó al archivo histórico se busca ahí (conserva su id).
+    cita = archivo_citas.obtener_cita(cita_id, paciente=request.user)
+    if cita is None:
+        raise Http404("La cita no existe.")
 
     context = {
         'cita': cita,
@@ -167,6 +263,7 @@ def detalle_cita_view(request, cita_id):
     return render(request, 'detalle_cita.html', context)
 
 @login_required
+@idempotente
 def cancelar_cita_view(request, cita_id):
     cita = get_object_or_404(Cita, id=cita_id, paciente=request.user)
 
@@ -176,93 +273,189 @@ def cancelar_cita_view(request, cita_id):
         return redirect('usuario:detalle_cita', cita_id=cita.id)
 
     if request.method == 'POST':
-        cita.estado = Cita.EstadoCita.CANCELADA
-        cita.save()
+        with transaction.atomic():
+            cita.estado = Cita.EstadoCita.CANCELADA
+            cita.save()
+            notificaciones.registrar_cita_cancelada(cita)
         messages.success(request, 'Tu cita ha sido cancelada con éxito.')
         return redirect('usuario:perfil')
 
     context = {
-        'cita': cita
+        'cita': cita,
+        # Un doble envío del formulario recibe la misma respuesta (ver paneladmin.idempotencia).
+        'clave_idempotencia': uuid.uuid4().hex,
     }
     return render(request, 'confirmar_cancelar_cita.html', context)
 
-@login_required
-def seleccionar_horario_view(request, especialidad_id):
-    especialidad = get_object_or_404(Especialidad, id=especialidad_id)
-    medicos = Usuario.objects.filter(role='MEDICO', especialidad=especialidad)
-
-    # Obtener filtros del request
-    medico_id_str = request.GET.get('medico')
-    fecha_str = request.GET.get('fecha', date.today().strftime('%Y-%m-%d'))
-    
-    try:
-        fecha_seleccionada = datetime.strptime(fecha_str, '%Y-%m-%d').date()
-    except (ValueError, TypeError):
-        fecha_seleccionada = date.today()
-
-    # --- VERIFICACIÓN: No permitir seleccionar fechas pasadas ---
-    if fecha_seleccionada < date.today():
-        # Si la fecha es pasada, forzamos a que sea hoy.
-        fecha_seleccionada = date.today()
-
-    # Filtrar médicos si se seleccionó uno
-    medicos_a_consultar = medicos
-    if medico_id_str and medico_id_str != 'todos':
-        medicos_a_consultar = medicos.filter(id=medico_id_str)
+def _calcular_horarios_disponibles(medicos, fecha, paciente_id=None):
+    """
+    Devuelve los horarios libres de los médicos indicados (registros del
+    catálogo) en la fecha, ordenados por hora y luego por médico. Los retenidos
+    por otro paciente mientras confirma su cita cuentan como tomados.
+    """
+    # --- VERIFICACIÓN: No generar horarios para fines de semana (Sábado=5, Domingo=6) ---
+    if not medicos or fecha.weekday() >= 5:
+        return []
+    medico_ids = [medico.id for medico in medicos]
 
     # Horas de trabajo estándar
     horas_laborales = [datetime.strptime(f"{h}:00", "%H:%M").time() for h in range(10, 17)] # 10:00 a 16:00
 
     # --- CORRECCIÓN CLAVE: Consultar por rango de fecha/hora ---
     # Creamos el inicio y fin del día seleccionado, conscientes de la zona horaria.
-    start_of_day = timezone.make_aware(datetime.combine(fecha_seleccionada, datetime.min.time()))
-    end_of_day = timezone.make_aware(datetime.combine(fecha_seleccionada, datetime.max.time()))
+    start_of_day = timezone.make_aware(datetime.combine(fecha, datetime.min.time()))
+    end_of_day = timezone.make_aware(datetime.combine(fecha, datetime.max.time()))
 
     # Obtener citas y bloqueos
     citas_reservadas = Cita.objects.filter(
-        medico__in=medicos_a_consultar,
+        medico_id__in=medico_ids,
         fecha_hora__range=(start_of_day, end_of_day),
         estado=Cita.EstadoCita.RESERVADA  # Solo contar citas reservadas
     )
 
     bloqueos = HorarioBloqueado.objects.filter(
-        medico__in=medicos_a_consultar,
+        medico_id__in=medico_ids,
         fecha_hora__range=(start_of_day, end_of_day)
     )
 
     horas_no_disponibles_utc = {*citas_reservadas.values_list("fecha_hora", flat=True), *bloqueos.values_list("fecha_hora", flat=True)}
+    retenidos = reservas_temporales.retenidos(medico_ids, start_of_day, end_of_day, excepto_paciente=paciente_id)
 
     now = timezone.now()
     # Generar horarios
     horarios_disponibles = []
-    # --- VERIFICACIÓN: No generar horarios para fines de semana (Sábado=5, Domingo=6) ---
-    if fecha_seleccionada.weekday() < 5:
-        # Iterar sobre cada médico para encontrar la primera hora disponible para cada uno
-        for medico in medicos_a_consultar:
-            for hora in horas_laborales:
-                # Hacemos que la fecha/hora sea consciente de la zona horaria actual
-                fecha_hora_slot = timezone.make_aware(
-                    datetime.combine(fecha_seleccionada, hora)
-                )
-                # --- NUEVA VERIFICACIÓN: No mostrar horarios que ya pasaron ---
-                if fecha_hora_slot > now and fecha_hora_slot not in horas_no_disponibles_utc:
-                    horarios_disponibles.append({
-                        'medico': medico,
-                        'fecha_hora': fecha_hora_slot
-                    })
+    # Iterar sobre cada médico para encontrar la primera hora disponible para cada uno
+    for medico in medicos:
+        for hora in horas_laborales:
+            # Hacemos que la fecha/hora sea consciente de la zona horaria actual
+            fecha_hora_slot = timezone.make_aware(
+                datetime.combine(fecha, hora)
+            )
+            # --- NUEVA VERIFICACIÓN: No mostrar horarios que ya pasaron ---
+            if (
+                fecha_hora_slot > now and fecha_hora_slot not in horas_no_disponibles_utc
+                and (medico.id, fecha_hora_slot) not in retenidos
+            ):
+                horarios_disponibles.append({
+                    'medico': medico,
+                    'fecha_hora': fecha_hora_slot
+                })
 
     # Ordenar por hora y luego por médico
     horarios_disponibles.sort(key=lambda x: (x['fecha_hora'], x['medico'].get_full_name()))
+    return horarios_disponibles
+
+def _especialidad_y_medicos(especialidad_id, medico_id_str):
+    """
+    Lee la especialidad y su plantel desde el catálogo en caché (sin consultas en
+    régimen estable) y aplica el filtro de médico, si se seleccionó uno.
+    """
+    especialidad = catalogo.obtener_especialidad(especialidad_id)
+    if especialidad is None:
+        raise Http404("La especialidad no existe.")
+    medicos = catalogo.obtener_medicos(especialidad_id)
+
+    medicos_a_consultar = medicos
+    if medico_id_str and medico_id_str != 'todos':
+        medicos_a_consultar = [medico for medico in medicos if str(medico.id) == medico_id_str]
+    return especialidad, medicos, medicos_a_consultar
+
+@login_required
+@cache_control(private=True, no_cache=True)
+@condition(etag_func=_etag_horarios, last_modified_func=_modificacion_horarios)
+def seleccionar_horario_view(request, especialidad_id):
+    # Obtener filtros del request
+    medico_id_str = request.GET.get('medico')
+    fecha_seleccionada = _fecha_solicitada(request)
+    especialidad, medicos, medicos_a_consultar = _especialidad_y_medicos(especialidad_id, medico_id_str)
 
     context = {
         'especialidad': especialidad,
         'medicos': medicos,
-        'horarios': horarios_disponibles,
+        'horarios': _calcular_horarios_disponibles(medicos_a_consultar, fecha_seleccionada, request.user.pk),
         'fecha_seleccionada': fecha_seleccionada,
         'medico_seleccionado_id': medico_id_str,
     }
     return render(request, 'seleccionar_horario.html', context)
 
+# --- API JSON (catálogo y disponibilidad) ---
+
+@login_required
+@cache_control(private=True, no_cache=True)
+@condition(etag_func=_etag_catalogo_json, last_modified_func=_modificacion_catalogo)
+def especialidades_json_view(request):
+    especialidades = [
+        {
+            'id': especialidad.id,
+            'nombre': especialidad.nombre,
+            'descripcion': especialidad.descripcion,
+            'imagen': especialidad.imagen_url or None,
+        }
+        for especialidad in catalogo.obtener_especialidades()
+    ]
+    return JsonResponse({'especialidades': especialidades})
+
+@login_required
+@cache_control(private=True, no_cache=True)
+@condition(etag_func=_etag_horarios_json, last_modified_func=_modificacion_horarios)
+def horarios_json_view(request, especialidad_id):
+    especialidad, _, medicos = _especialidad_y_medicos(especialidad_id, request.GET.get('medico'))
+    fecha = _fecha_solicitada(request)
+
+    horarios = [
+        {
+            'medico_id': horario['medico'].id,
+            'medico_nombre': horario['medico'].get_full_name(),
+            'fecha_hora': timezone.localtime(horario['fecha_hora']).isoformat(),
+        }
+        for horario in _calcular_horarios_disponibles(medicos, fecha, request.user.pk)
+    ]
+    return JsonResponse({'especialidad_id': especialidad.id, 'fecha': fecha.isoformat(), 'horarios': horarios})
+
+async def eventos_horario_view(request, especialidad_id):
+    """
+    Canal Server-Sent Events con los horarios que se toman o liberan para una
+    especialidad y fecha. Requiere servir la aplicación por ASGI (VitalLife.asgi).
+    """
+    es_autenticado = await sync_to_async(lambda: request.user.is_authenticated)()
+    if not es_autenticado:
+        return HttpResponse(status=401)
+
+    # Bajo WSGI no podemos mantener la conexión abierta sin bloquear un worker.
+    # Un 204 le indica a EventSource que no vuelva a intentar conectarse.
+    if not isinstance(request, ASGIRequest):
+        return HttpResponse(status=204)
+
+    try:
+        fecha = datetime.strptime(request.GET.get('fecha', ''), '%Y-%m-%d').date()
+    except ValueError:
+        fecha = date.today()
+
+    canal = canal_horarios(especialidad_id, fecha)
+    broker = obtener_broker()
+
+    async def flujo():
+        suscripcion = broker.suscribir(canal)
+        try:
+            yield 'retry: 5000\n\n'
+            while True:
+                try:
+                    evento = await asyncio.wait_for(suscripcion.siguiente(), timeout=15)
+                except asyncio.TimeoutError:
+                    # Comentario SSE para mantener viva la conexión a través de proxies.
+                    yield ': ping\n\n'
+                    continue
+                yield f"event: {evento['tipo']}\ndata: {json.dumps(evento)}\n\n"
+        finally:
+            broker.cancelar(canal, suscripcion)
+
+    response = StreamingHttpResponse(flujo(), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    # Evita que nginx acumule el flujo en su buffer.
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
 
 # --- VISTAS PARA MÉDICOS ---
 
@@ -284,14 +477,16 @@ def role_required(*roles):
 @role_required('MEDICO')
 def medico_inicio_view(request):
     today = timezone.now().date()
-    citas_hoy_count = Cita.objects.filter(
-        medico=request.user, 
-        fecha_hora__date=today,
-        estado__in=[Cita.EstadoCita.RESERVADA, Cita.EstadoCita.COMPLETADA]
-    ).count()
-    
+    # Se cuenta solo si el fragmento no está en caché (ver medico_inicio.html).
+    def citas_hoy_count():
+        return Cita.objects.filter(
+            medico=request.user,
+            fecha_hora__date=today,
+        ).exclude(estado=Cita.EstadoCita.CANCELADA).count()
+
     context = {
         'citas_hoy_count': citas_hoy_count,
+        'version_panel': _version_panel(request),
     }
     return render(request, 'medico_inicio.html', context)
 
@@ -307,29 +502,30 @@ def medico_dashboard_view(request):
     citas_hoy = Cita.objects.filter(
         medico=request.user, 
         fecha_hora__date=today,
-        estado__in=[Cita.EstadoCita.RESERVADA, Cita.EstadoCita.COMPLETADA]
-    ).select_related('paciente').order_by('fecha_hora')
+    ).exclude(estado=Cita.EstadoCita.CANCELADA).select_related('paciente').order_by('fecha_hora')
 
     # Próxima cita del día (o futura)
     proxima_cita = Cita.objects.filter(
         medico=request.user,
+        estado=Cita.EstadoCita.RESERVADA,
         fecha_hora__gte=now
     ).select_related('paciente').order_by('fecha_hora').first()
 
-    # Estadísticas
-    total_pacientes = Cita.objects.filter(medico=request.user).values('paciente').distinct().count()
+    # Estadísticas (contadores desnormalizados, ver paneladmin.estadisticas)
+    stats = estadisticas.obtener(request.user)
     
     # Citas de la semana (lista completa)
     citas_semana = Cita.objects.filter(
         medico=request.user, 
         fecha_hora__date__range=[start_of_week, end_of_week],
-        estado__in=[Cita.EstadoCita.RESERVADA, Cita.EstadoCita.COMPLETADA]
-    ).select_related('paciente').order_by('fecha_hora')
+    ).exclude(estado=Cita.EstadoCita.CANCELADA).select_related('paciente').order_by('fecha_hora')
 
     context = {
         'citas_hoy_count': citas_hoy.count(),
         'proxima_cita': proxima_cita,
-        'total_pacientes': total_pacientes,
+        'total_pacientes': stats.pacientes_distintos,
+        'citas_mes_count': stats.citas_mes,
+        'cancelaciones_mes_count': stats.cancelaciones_mes,
         'citas_semana_count': citas_semana.count(),
         'citas_hoy': citas_hoy,
         'citas_semana': citas_semana,
@@ -337,14 +533,30 @@ def medico_dashboard_view(request):
     
     return render(request, 'medico_dashboard.html', context)
 
-@login_required
-@role_required('MEDICO')
-def gestionar_horarios_view(request):
+def _fecha_base_semana(request):
     fecha_base_str = request.GET.get('fecha', date.today().strftime('%Y-%m-%d'))
     try:
-        fecha_base = datetime.strptime(fecha_base_str, '%Y-%m-%d').date()
+        return datetime.strptime(fecha_base_str, '%Y-%m-%d').date()
     except (ValueError, TypeError):
-        fecha_base = date.today()
+        return date.today()
+
+def _etag_semana_medico(request):
+    if versiones.mensajes_pendientes(request):
+        return None
+    sellos = versiones.sellos_semana_medico(request.user.pk, _fecha_base_semana(request))
+    return versiones.etag('semana-medico', *sellos, *_identidad_usuario(request))
+
+def _modificacion_semana_medico(request):
+    if versiones.mensajes_pendientes(request):
+        return None
+    return versiones.como_fecha(max(versiones.sellos_semana_medico(request.user.pk, _fecha_base_semana(request))))
+
+@login_required
+@role_required('MEDICO')
+@cache_control(private=True, no_cache=True)
+@condition(etag_func=_etag_semana_medico, last_modified_func=_modificacion_semana_medico)
+def gestionar_horarios_view(request):
+    fecha_base = _fecha_base_semana(request)
 
     # Lunes de la semana actual
     start_of_week = fecha_base - timedelta(days=fecha_base.weekday())
@@ -365,8 +577,7 @@ def gestionar_horarios_view(request):
     citas_qs = Cita.objects.filter(
         medico=request.user,
         fecha_hora__range=(start_of_week_dt, end_of_week_dt),
-        estado__in=[Cita.EstadoCita.RESERVADA, Cita.EstadoCita.COMPLETADA]
-    ).select_related('paciente') # Traemos citas reservadas y completadas
+    ).exclude(estado=Cita.EstadoCita.CANCELADA).select_related('paciente') # Reservadas, completadas e inasistencias
 
     # Creamos un diccionario para buscar citas fácilmente por fecha y hora
     citas_lookup = {cita.fecha_hora: cita for cita in citas_qs}
@@ -400,8 +611,11 @@ def gestionar_horarios_view(request):
                 slot_info['paciente'] = cita.paciente
                 slot_info['cita_id'] = cita.id
                 slot_info['motivo'] = cita.motivo
-                # Si la cita ya pasó, la marcamos como 'completada' visualmente
-                if fecha_hora_slot < now:
+                if cita.estado == Cita.EstadoCita.NO_ASISTIO:
+                    slot_info['estado'] = 'no_asistio'
+                # Una cita reservada que ya pasó se muestra completada aunque el
+                # cierre periódico (manage.py completar_citas) aún no la marque.
+                elif cita.estado == Cita.EstadoCita.COMPLETADA or fecha_hora_slot < now:
                     slot_info['estado'] = 'completada'
                 else:
                     slot_info['estado'] = 'reservado'
@@ -442,59 +656,126 @@ def desbloquear_horario_view(request):
         return JsonResponse({'status': 'ok', 'accion': 'desbloqueado'})
     return JsonResponse({'status': 'error'}, status=400)
 
+def _horario_solicitado(request):
+    """(médico, especialidad, fecha_hora) enviados por POST; ValueError si no son válidos."""
+    try:
+        medico = Usuario.objects.get(id=request.POST.get('medico_id'), role='MEDICO', is_active=True)
+        especialidad = Especialidad.objects.get(id=request.POST.get('especialidad_id'))
+        # Convertimos el string ISO a un objeto datetime.
+        # Esto es crucial para que Django lo maneje correctamente con la zona horaria.
+        fecha_hora = timezone.datetime.fromisoformat(request.POST.get('fecha_hora'))
+    except (Usuario.DoesNotExist, Especialidad.DoesNotExist, ValueError, TypeError):
+        raise ValueError("Los datos de la cita no son válidos.")
+    if timezone.is_naive(fecha_hora):
+        fecha_hora = timezone.make_aware(fecha_hora)
+    return medico, especialidad, fecha_hora
+
 @login_required
+def retener_horario_view(request):
+    """Retiene el horario elegido mientras el paciente confirma (ver paneladmin.reservas_temporales)."""
+    if request.method != 'POST':
+        return JsonResponse({'status': 'error', 'message': 'Método no permitido'}, status=405)
+    try:
+        medico, _, fecha_hora = _horario_solicitado(request)
+    except ValueError as error:
+        return JsonResponse({'status': 'error', 'message': str(error)}, status=400)
+    reserva = reservas_temporales.reservar(request.user, medico, fecha_hora)
+    if reserva is None:
+        return JsonResponse({'status': 'error', 'message': 'Lo sentimos, este horario ya no está disponible.'}, status=409)
+    return JsonResponse({
+        'status': 'ok',
+        'expira_en': timezone.localtime(reserva.expira_en).isoformat(),
+        'minutos': int(reservas_temporales.duracion().total_seconds() // 60),
+    })
+
+@login_required
+def soltar_horario_view(request):
+    """El paciente cerró la confirmación sin agendar: el horario vuelve a quedar libre."""
+    if request.method != 'POST':
+        return JsonResponse({'status': 'error', 'message': 'Método no permitido'}, status=405)
+    try:
+        medico, _, fecha_hora = _horario_solicitado(request)
+    except ValueError as error:
+        return JsonResponse({'status': 'error', 'message': str(error)}, status=400)
+    reservas_temporales.liberar(request.user, medico.id, fecha_hora)
+    return JsonResponse({'status': 'ok'})
+
+@login_required
+@idempotente
 def agendar_cita_view(request):
     if request.method == 'POST':
-        medico_id = request.POST.get('medico_id')
-        especialidad_id = request.POST.get('especialidad_id')
-        fecha_hora_str = request.POST.get('fecha_hora')
         motivo = request.POST.get('motivo', '')
-
         try:
-            medico = Usuario.objects.get(id=medico_id, role='MEDICO')
-            especialidad = Especialidad.objects.get(id=especialidad_id)
-            
-            # Convertimos el string ISO a un objeto datetime.
-            # Esto es crucial para que Django lo maneje correctamente con la zona horaria.
-            fecha_hora = timezone.datetime.fromisoformat(fecha_hora_str)
-
-            # Doble verificación para evitar agendar en un horario ya ocupado (race condition)
-            # La forma más segura de verificar es comparar el objeto datetime consciente de la zona horaria directamente.
-            if Cita.objects.filter(medico=medico, fecha_hora=fecha_hora).exists() or \
-               HorarioBloqueado.objects.filter(medico=medico, fecha_hora=fecha_hora).exists():
-                return JsonResponse({'status': 'error', 'message': 'Lo sentimos, este horario ya no está disponible.'}, status=400)
-            
-            nueva_cita = Cita.objects.create(
-                paciente=request.user,
-                medico=medico,
-                especialidad=especialidad,
-                fecha_hora=fecha_hora,
-                motivo=motivo
-            )
-
-            # Opcional: Enviar correo de confirmación aquí.
+            medico, especialidad, fecha_hora = _horario_solicitado(request)
+        except ValueError as error:
+            return JsonResponse({'status': 'error', 'message': str(error)}, status=400)
+
+        no_disponible = JsonResponse({'status': 'error', 'message': 'Lo sentimos, este horario ya no está disponible.'}, status=400)
+        # Doble verificación para evitar agendar en un horario ya ocupado (race condition)
+        # La forma más segura de verificar es comparar el objeto datetime consciente de la zona horaria directamente.
+        # También está ocupado si otro paciente lo tiene retenido mientras confirma.
+        # Una cita cancelada no ocupa el horario, como en la disponibilidad.
+        citas_en_horario = Cita.objects.filter(medico=medico, fecha_hora=fecha_hora)
+        if citas_en_horario.exclude(estado=Cita.EstadoCita.CANCELADA).exists() or \
+           HorarioBloqueado.objects.filter(medico=medico, fecha_hora=fecha_hora).exists() or \
+           reservas_temporales.tomada_por_otro(request.user, medico.id, fecha_hora):
+            return no_disponible
 
-            return JsonResponse({
-                'status': 'ok', 
-                'message': '¡Tu cita ha sido agendada con éxito! Serás redirigido a tu panel.',
-                'cita_id': nueva_cita.id
-            })
-        except Exception as e:
-            return JsonResponse({'status': 'error', 'message': f'Ocurrió un error al agendar la cita: {e}'}, status=500)
+        try:
+            with transaction.atomic():
+                # La cancelada conserva la clave única (medico, fecha_hora): se borra para crear la nueva.
+                citas_en_horario.filter(estado=Cita.EstadoCita.CANCELADA).delete()
+                nueva_cita = Cita.objects.create(
+                    paciente=request.user,
+                    medico=medico,
+                    especialidad=especialidad,
+                    fecha_hora=fecha_hora,
+                    motivo=motivo
+                )
+                # La retención del paciente (si la tenía) se convierte en la cita.
+                reservas_temporales.consumir(request.user, medico.id, fecha_hora)
+                # El correo se registra en la bandeja de salida y se envía fuera de la petición.
+                notificaciones.registrar_cita_agendada(nueva_cita)
+        except IntegrityError:
+            # Otro paciente lo tomó entre la verificación y el INSERT (medico, fecha_hora es único).
+            return no_disponible
+
+        return JsonResponse({
+            'status': 'ok', 
+            'message': '¡Tu cita ha sido agendada con éxito! Serás redirigido a tu panel.',
+            'cita_id': nueva_cita.id
+        })
     return JsonResponse({'status': 'error', 'message': 'Método no permitido'}, status=405)
 
 @login_required
 @role_required('MEDICO')
 def lista_pacientes_view(request):
-    # Obtener IDs de pacientes únicos que tienen citas con el médico actual
-    paciente_ids = Cita.objects.filter(medico=request.user).values_list('paciente_id', flat=True).distinct()
-    pacientes = Usuario.objects.filter(id__in=paciente_ids).order_by('apellido', 'nombre')
-    
+    # Una página de la lista (con fechas de visita), buscable por nombre o RUT;
+    # el resto se carga con buscar_pacientes_view.
+    busqueda = request.GET.get('q', '').strip()
+    relaciones, siguiente = pacientes_medico.pagina(request.user, busqueda)
+
     context = {
-        'pacientes': pacientes
+        'relaciones': relaciones,
+        'siguiente': siguiente,
+        'busqueda': busqueda,
     }
     return render(request, 'lista_pacientes.html', context)
 
+@login_required
+@role_required('MEDICO')
+def buscar_pacientes_view(request):
+    """Página siguiente de la lista de pacientes (scroll infinito en lista_pacientes.html)."""
+    try:
+        relaciones, siguiente = pacientes_medico.pagina(
+            request.user, request.GET.get('q', ''), request.GET.get('cursor')
+        )
+    except ValueError:
+        return JsonResponse({'error': 'Cursor inválido.'}, status=400)
+    html = render_to_string('parciales/lista_pacientes.html', {'relaciones': relaciones}, request=request)
+    return JsonResponse({'html': html, 'siguiente': siguiente})
+
+@acepta_subidas(archivo=Receta.archivo)
 @login_required
 @role_required('MEDICO')
 def detalle_paciente_view(request, paciente_id):
@@ -502,7 +783,7 @@ def detalle_paciente_view(request, paciente_id):
     paciente = get_object_or_404(Usuario, id=paciente_id)
 
     # Verificación de seguridad: El médico solo puede ver pacientes con los que tiene o ha tenido una cita.
-    if not Cita.objects.filter(medico=request.user, paciente=paciente).exists():
+    if not archivo_citas.existe_relacion(request.user, paciente):
         raise PermissionDenied("No tienes permiso para ver los detalles de este paciente.")
 
     # Manejar la subida de formularios
@@ -512,6 +793,7 @@ def detalle_paciente_view(request, paciente_id):
         if 'submit_ficha' in request.POST:
             # Usamos get_or_create para manejar el caso de que la ficha aún no exista.
             ficha, created = FichaMedica.objects.get_or_create(paciente=paciente)
+            ficha._autor = request.user  # queda en la revisión del historial de la ficha
             ficha_form = FichaMedicaForm(request.POST, instance=ficha)
             if ficha_form.is_valid():
                 ficha_form.save()
@@ -540,6 +822,15 @@ def detalle_paciente_view(request, paciente_id):
                     messages.success(request, 'Diagnóstico guardado con éxito.')
                     return redirect('usuario:detalle_paciente', paciente_id=paciente.id)
 
+            if 'submit_inasistencia' in request.POST:
+                if cita.fecha_hora > timezone.now() or cita.estado == Cita.EstadoCita.CANCELADA:
+                    messages.error(request, "Solo se puede registrar la inasistencia de una cita que ya pasó.")
+                else:
+                    cita.estado = Cita.EstadoCita.NO_ASISTIO
+                    cita.save(update_fields=['estado'])
+                    messages.success(request, 'Se registró la inasistencia del paciente.')
+                return redirect('usuario:detalle_paciente', paciente_id=paciente.id)
+
             if 'submit_receta' in request.POST:
                 receta_form = RecetaForm(request.POST, request.FILES, prefix=f'receta-{cita.id}')
                 if receta_form.is_valid():
@@ -549,29 +840,215 @@ def detalle_paciente_view(request, paciente_id):
                     messages.success(request, 'Receta subida con éxito.')
                     return redirect('usuario:detalle_paciente', paciente_id=paciente.id)
 
-    # Obtener historial de citas con este médico, ordenadas de más reciente a más antigua
-    citas = Cita.objects.filter(medico=request.user, paciente=paciente).order_by('-fecha_hora').prefetch_related(
-        'diagnostico', 'recetas'
+    # Solo la primera página del historial, sin diagnósticos, recetas ni
+    # formularios: la ficha y cada cita se cargan al abrirlas (ver
+    # citas_paciente_view, cita_paciente_view y ficha_paciente_view).
+    citas, siguiente = archivo_citas.pagina_historial(medico=request.user, paciente=paciente)
+
+    context = {
+        'paciente': paciente,
+        'citas': citas,
+        'siguiente': siguiente,
+    }
+    return render(request, 'detalle_paciente.html', context)
+
+@login_required
+@role_required('MEDICO')
+def citas_paciente_view(request, paciente_id):
+    """Página siguiente del historial del paciente con el médico (detalle_paciente.html)."""
+    try:
+        citas, siguiente = archivo_citas.pagina_historial(
+            request.GET.get('cursor'), medico=request.user, paciente_id=paciente_id
+        )
+    except (ValueError, OverflowError):
+        return JsonResponse({'error': 'Cursor inválido.'}, status=400)
+    html = render_to_string(
+        'parciales/citas_paciente.html', {'citas': citas, 'paciente_id': paciente_id}, request=request
     )
+    return JsonResponse({'html': html, 'siguiente': siguiente})
 
-    # Para cada cita, si no tiene diagnóstico, le adjuntamos un formulario nuevo.
-    # Hacemos lo mismo para las recetas. Esto evita conflictos de ID en el HTML.
-    for cita in citas:
+@login_required
+@role_required('MEDICO')
+def cita_paciente_view(request, paciente_id, cita_id):
+    """Diagnóstico, recetas y sus formularios para una cita, al abrirla en detalle_paciente.html."""
+    # Filtrar por médico ya verifica la relación con el paciente.
+    cita = archivo_citas.obtener_cita(cita_id, medico=request.user, paciente_id=paciente_id)
+    if cita is None:
+        raise Http404("La cita no existe.")
+
+    # Las archivadas son de solo lectura, igual que las de más de 24 horas.
+    es_antigua = getattr(cita, 'archivada', False) or cita.fecha_hora < timezone.now() - timedelta(days=1)
+    context = {
+        'cita': cita,
+        'paciente_id': paciente_id,
+        'es_antigua': es_antigua,
+        'now': timezone.now(),
+    }
+    if not es_antigua:
         if not hasattr(cita, 'diagnostico'):
-            cita.diagnostico_form = DiagnosticoForm(prefix=f'diag-{cita.id}')
-        cita.receta_form = RecetaForm(prefix=f'receta-{cita.id}')
-        # --- LÓGICA PARA LA PLANTILLA ---
-        # Añadimos un atributo para saber si la cita tiene más de 24h de antigüedad
-        cita.es_antigua = cita.fecha_hora < timezone.now() - timedelta(days=1)
+            context['diagnostico_form'] = DiagnosticoForm(prefix=f'diag-{cita.id}')
+        context['receta_form'] = RecetaForm(prefix=f'receta-{cita.id}')
+    return render(request, 'parciales/cita_paciente.html', context)
 
-    # Obtener la ficha médica o crear una instancia de formulario vacía si no existe.
-    ficha_medica = FichaMedica.objects.filter(paciente=paciente).first()
-    ficha_form = FichaMedicaForm(instance=ficha_medica)
+@login_required
+@role_required('MEDICO')
+def ficha_paciente_view(request, paciente_id):
+    """Formulario de la ficha médica del paciente, al abrirla en detalle_paciente.html."""
+    paciente = get_object_or_404(Usuario, id=paciente_id)
+    if not archivo_citas.existe_relacion(request.user, paciente):
+        raise PermissionDenied("No tienes permiso para ver los detalles de este paciente.")
 
+    ficha_medica = FichaMedica.objects.filter(paciente=paciente).first()
     context = {
         'paciente': paciente,
-        'citas': citas,
-        'ficha_form': ficha_form,
-        'now': timezone.now(), # Pasamos la fecha actual a la plantilla
+        'ficha_form': FichaMedicaForm(instance=ficha_medica),
+        'tendencia': historial_ficha.tendencia(paciente.id) if ficha_medica else None,
     }
-    return render(request, 'detalle_paciente.html', context)
\ No newline at end of file
+    return render(request, 'parciales/ficha_paciente.html', context)
+
+@login_required
+@role_required('MEDICO')
+def tendencia_ficha_view(request, paciente_id):
+    """Evolución de peso y altura del paciente, desde el historial de la ficha."""
+    if not archivo_citas.existe_relacion(request.user, paciente_id):
+        raise PermissionDenied("No tienes permiso para ver los detalles de este paciente.")
+
+    puntos = historial_ficha.tendencia(paciente_id)
+    return JsonResponse({
+        campo: [{'fecha': fecha.isoformat(), 'valor': valor} for fecha, valor in valores]
+        for campo, valores in puntos.items()
+    })
+
+@login_required
+@role_required('MEDICO')
+def ficha_en_fecha_view(request, paciente_id):
+    """Ficha médica del paciente tal como estaba en ?fecha=AAAA-MM-DD (al final de ese día)."""
+    if not archivo_citas.existe_relacion(request.user, paciente_id):
+        raise PermissionDenied("No tienes permiso para ver los detalles de este paciente.")
+    try:
+        fecha = date.fromisoformat(request.GET.get('fecha', ''))
+    except ValueError:
+        return JsonResponse({'error': 'Fecha inválida (use AAAA-MM-DD).'}, status=400)
+
+    limite = timezone.make_aware(datetime.combine(fecha + timedelta(days=1), datetime.min.time()))
+    estado = historial_ficha.estado_en(paciente_id, limite - timedelta(microseconds=1))
+    return JsonResponse({'fecha': fecha.isoformat(), 'ficha': estado})
+
+
+# --- API JSON v1 (aplicación móvil) ---
+# Solo lectura y con la misma sesión que el sitio. Las respuestas van sin espacios,
+# comprimidas con gzip y con ETag armado solo desde sellos de versión (un 304 no
+# toca el ORM). Los parámetros que cambian la respuesta (campos, cursor, tamano)
+# forman parte del ETag.
+
+def _api_login_required(view_func):
+    # Un cliente de la API espera un 401, no la redirección al formulario de login.
+    def _wrapped_view(request, *args, **kwargs):
+        if not request.user.is_authenticated:
+            return _respuesta_api({'error': 'Autenticación requerida.'}, status=401)
+        return view_func(request, *args, **kwargs)
+    return _wrapped_view
+
+def _respuesta_api(datos, status=200):
+    return JsonResponse(datos, status=status, json_dumps_params={'separators': (',', ':'), 'ensure_ascii': False})
+
+def _parametros_api(request):
+    return tuple(request.GET.get(parametro) for parametro in ('campos', 'cursor', 'tamano'))
+
+def _etag_api_catalogo(request, especialidad_id=None):
+    return versiones.etag(
+        'api-catalogo', especialidad_id, *_parametros_api(request), *versiones.obtener(versiones.CLAVE_CATALOGO)
+    )
+
+def _etag_api_horarios(request, especialidad_id):
+    fecha, sellos = _sellos_horarios(request, especialidad_id)
+    return versiones.etag(
+        'api-horarios', especialidad_id, fecha, request.GET.get('medico'), request.user.pk, *_parametros_api(request), *sellos
+    )
+
+def _sellos_paciente(request):
+    # Las citas incluyen nombres de médicos y especialidades: también cuenta el catálogo.
+    return versiones.obtener(versiones.clave_paciente(request.user.pk), versiones.CLAVE_CATALOGO)
+
+def _etag_api_citas(request, cita_id=None):
+    return versiones.etag('api-citas', request.user.pk, cita_id, *_parametros_api(request), *_sellos_paciente(request))
+
+def _modificacion_api_citas(request, cita_id=None):
+    return versiones.como_fecha(max(_sellos_paciente(request)))
+
+@_api_login_required
+@require_safe
+@gzip_page
+@cache_control(private=True, no_cache=True)
+@condition(etag_func=_etag_api_catalogo, last_modified_func=_modificacion_catalogo)
+def api_especialidades_view(request):
+    try:
+        campos = api.elegir_campos(request.GET.get('campos'), api.ESPECIALIDAD)
+    except ValueError as error:
+        return _respuesta_api({'error': str(error)}, status=400)
+    return _respuesta_api({'especialidades': api.serializar(catalogo.obtener_especialidades(), api.ESPECIALIDAD, campos)})
+
+@_api_login_required
+@require_safe
+@gzip_page
+@cache_control(private=True, no_cache=True)
+@condition(etag_func=_etag_api_catalogo, last_modified_func=_modificacion_catalogo)
+def api_medicos_view(request, especialidad_id):
+    if catalogo.obtener_especialidad(especialidad_id) is None:
+        return _respuesta_api({'error': 'La especialidad no existe.'}, status=404)
+    try:
+        campos = api.elegir_campos(request.GET.get('campos'), api.MEDICO)
+    except ValueError as error:
+        return _respuesta_api({'error': str(error)}, status=400)
+    return _respuesta_api({'medicos': api.serializar(catalogo.obtener_medicos(especialidad_id), api.MEDICO, campos)})
+
+@_api_login_required
+@require_safe
+@gzip_page
+@cache_control(private=True, no_cache=True)
+@condition(etag_func=_etag_api_horarios, last_modified_func=_modificacion_horarios)
+def api_horarios_view(request, especialidad_id):
+    try:
+        campos = api.elegir_campos(request.GET.get('campos'), api.HORARIO)
+        _, _, medicos = _especialidad_y_medicos(especialidad_id, request.GET.get('medico'))
+    except ValueError as error:
+        return _respuesta_api({'error': str(error)}, status=400)
+    except Http404:
+        return _respuesta_api({'error': 'La especialidad no existe.'}, status=404)
+    fecha = _fecha_solicitada(request)
+    horarios = _calcular_horarios_disponibles(medicos, fecha, request.user.pk)
+    return _respuesta_api({'fecha': fecha.isoformat(), 'horarios': api.serializar(horarios, api.HORARIO, campos)})
+
+@_api_login_required
+@require_safe
+@gzip_page
+@cache_control(private=True, no_cache=True)
+@condition(etag_func=_etag_api_citas, last_modified_func=_modificacion_api_citas)
+def api_citas_view(request):
+    """Historial del paciente (activas y archivadas), de la más reciente a la más antigua."""
+    try:
+        campos = api.elegir_campos(request.GET.get('campos'), api.CITA)
+        tamano = api.elegir_tamano(request.GET.get('tamano'))
+    except ValueError as error:
+        return _respuesta_api({'error': str(error)}, status=400)
+    try:
+        citas, siguiente = api.pagina_citas(request.user, campos, request.GET.get('cursor'), tamano)
+    except (ValueError, OverflowError):
+        return _respuesta_api({'error': 'Cursor inválido.'}, status=400)
+    return _respuesta_api({'citas': citas, 'siguiente': siguiente})
+
+@_api_login_required
+@require_safe
+@gzip_page
+@cache_control(private=True, no_cache=True)
+@condition(etag_func=_etag_api_citas, last_modified_func=_modificacion_api_citas)
+def api_cita_view(request, cita_id):
+    """Una cita del paciente con su diagnóstico y sus recetas."""
+    try:
+        campos = api.elegir_campos(request.GET.get('campos'), api.DETALLE_CITA)
+    except ValueError as error:
+        return _respuesta_api({'error': str(error)}, status=400)
+    cita = api.detalle_cita(request.user, cita_id, campos)
+    if cita is None:
+        return _respuesta_api({'error': 'La cita no existe.'}, status=404)
+    return _respuesta_api({'cita': cita})
\ No newline at end of file